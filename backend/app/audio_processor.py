@@ -1,91 +1,424 @@
 
 import librosa
 import numpy as np
+import soundfile as sf
 from scipy.signal import find_peaks
-from typing import Dict, List
+from typing import Callable, Dict, Iterator, List, Optional
+import os
+import tempfile
 import time
+import warnings
+
+from app.cache import FeatureCache
+from app.correlation import (
+    coarse_to_fine_correlation, feature_similarity, find_correlation_peaks, iter_normalized_cross_correlation,
+    normalized_cross_correlation
+)
+from app.decoded_audio import RESAMPLERS, DecodedAudio, native_sample_rate
+from app.detections import DETECTION_METHODS, detections_array, merge_detections, merged_to_dicts, select_top_k
+from app.encoding import envelope
+from app.fingerprint import extract_landmarks
+from app.metrics import Timings
+from app.profiler import SamplingProfiler
+from app.streaming import StreamingDetector, read_blocks
+
+# Called as progress(stage, payload) after each pipeline stage finishes
+ProgressCallback = Callable[[str, Dict], None]
+
+# A detection stage maps (pattern, target) to a result with a "detections" list
+DetectionStage = Callable[[DecodedAudio, DecodedAudio], Dict]
+
+# In adaptive mode, a correlation peak this strong makes the feature-based stages redundant
+ADAPTIVE_CONFIDENCE = 0.8
+
+# Correlation peak picking: minimum NCC score, and minimum spacing as a fraction of the pattern
+CORRELATION_MIN_SCORE = 0.3
+CORRELATION_MIN_SPACING = 0.3
+
+# Coarse-to-fine search needs this many decimated pattern samples to find candidates reliably
+COARSE_MIN_PATTERN_SAMPLES = 256
+
+# Analysis rate when none is configured. Lower rates (16 or 8 kHz) cut decode, correlation and
+# feature time for speech and jingles; sample_rate=None analyzes at each target's own rate
+SAMPLE_RATE = 22050
+
+# Combining: detections within MERGE_WINDOW_SECONDS of each other form one group, and the
+# TOP_K most confident groups are returned. Method weights scale each method's confidence;
+# the feature-based methods localize less precisely than correlation
+MERGE_WINDOW_SECONDS = 0.5
+TOP_K = 10
+METHOD_WEIGHTS = {"correlation": 1.0, "chroma": 0.7, "spectral": 0.5}
 
 class AudioProcessor:
-    def detect_pattern(self, pattern_path: str, target_path: str) -> Dict:
+    def __init__(self, cache: Optional[FeatureCache] = None, coarse_min_seconds: float = 600.0,
+                 coarse_decimation: int = 8, coarse_threshold: float = 0.2,
+                 profile_slow_seconds: float = 0.0, profile_dir: str = "profiles",
+                 sample_rate: Optional[int] = SAMPLE_RATE, resampler: str = "soxr_hq"):
+        # Shared decode/feature cache; None disables caching
+        self.cache = cache
+        # Rate both files are resampled to; None keeps the target's rate and resamples only the pattern
+        if resampler not in RESAMPLERS:
+            raise ValueError(f"Unknown resampler: {resampler}. Available: {', '.join(RESAMPLERS)}")
+        self.sample_rate = sample_rate
+        self.resampler = resampler
+        # detect_pattern calls slower than this dump a sampling profile to profile_dir; 0 disables it
+        self.profile_slow_seconds = profile_slow_seconds
+        self.profile_dir = profile_dir
+        # Targets at least this long use the two-phase correlation search; 0 disables it
+        self.coarse_min_seconds = coarse_min_seconds
+        self.coarse_decimation = coarse_decimation
+        self.coarse_threshold = coarse_threshold
+        # Detection stages in pipeline order, keyed by the method name they report
+        stages = {
+            "correlation": self.correlation_stage,
+            "chroma": self.chroma_stage,
+            "spectral": self.spectral_stage
+        }
+        self.stages: Dict[str, DetectionStage] = {method: stages[method] for method in DETECTION_METHODS}
+        self.method_weights: Dict[str, float] = dict(METHOD_WEIGHTS)
+    
+    def register_stage(self, method: str, stage: DetectionStage, weight: float = 1.0):
+        """Add a detection stage, run after the existing ones, with its confidence weight when combining"""
+        self.stages[method] = stage
+        self.method_weights[method] = weight
+    
+    def analysis_rate(self, target_path: str) -> int:
+        """The configured analysis rate, or the target's own rate when none is configured"""
+        return self.sample_rate or native_sample_rate(target_path)
+    
+    @property
+    def live_sample_rate(self) -> int:
+        """Rate for live input, which has no file to take a native rate from"""
+        return self.sample_rate or SAMPLE_RATE
+    
+    def detect_pattern(self, pattern_path: str, target_path: str,
+                       progress: Optional[ProgressCallback] = None,
+                       methods: Optional[List[str]] = None, adaptive: bool = False,
+                       top_k: int = TOP_K, merge_window: float = MERGE_WINDOW_SECONDS) -> Dict:
         """
         Enhanced pattern detection with multiple methods
+        
+        The result carries a ``timings`` block: seconds per stage (decode, each
+        detection method, combine) and the decoded sizes of both inputs.
         """
         print(f"🎵 Loading audio files...")
         start_time = time.time()
+        timings = Timings()
+        profiler = SamplingProfiler() if self.profile_slow_seconds > 0 else None
+        if profiler:
+            profiler.start()
         
         try:
-            # Load with optimal sample rate
-            target_sr = 22050
+            with timings.span("decode"):
+                target_sr = self.analysis_rate(target_path)
+                print("📥 Loading pattern audio...")
+                pattern = DecodedAudio.from_file(pattern_path, target_sr, cache=self.cache, resampler=self.resampler)
+                print("📥 Loading target audio...")
+                target = DecodedAudio.from_file(target_path, target_sr, cache=self.cache, resampler=self.resampler)
+            for name, audio in (("pattern", pattern), ("target", target)):
+                timings.sizes[f"{name}_samples"] = len(audio.samples)
+                timings.sizes[f"{name}_frames"] = 1 + len(audio.samples) // audio.hop_length
             
-            print("📥 Loading pattern audio...")
-            pattern_audio, pattern_sr = librosa.load(pattern_path, sr=target_sr)
-            print("📥 Loading target audio...")
-            target_audio, target_sr = librosa.load(target_path, sr=target_sr)
-            
-            print(f"✅ Audio loaded - Pattern: {len(pattern_audio)/pattern_sr:.2f}s, Target: {len(target_audio)/target_sr:.2f}s")
-            
-            # Convert to mono if stereo
-            if len(pattern_audio.shape) > 1:
-                pattern_audio = np.mean(pattern_audio, axis=1)
-            if len(target_audio.shape) > 1:
-                target_audio = np.mean(target_audio, axis=1)
+            print(f"✅ Audio loaded - Pattern: {pattern.duration:.2f}s, Target: {target.duration:.2f}s")
+            if progress:
+                progress("load", {"pattern_duration": pattern.duration, "target_duration": target.duration})
             
-            # Normalize audio
-            pattern_audio = pattern_audio / (np.max(np.abs(pattern_audio)) + 1e-8)
-            target_audio = target_audio / (np.max(np.abs(target_audio)) + 1e-8)
-            
-            # Method 1: Standard cross-correlation
-            print("🔍 Method 1: Cross-correlation...")
-            correlation_results = self.cross_correlation_detection(target_audio, pattern_audio, target_sr)
-            
-            # Method 2: Chroma feature matching (for musical similarity)
-            print("🎼 Method 2: Chroma feature analysis...")
-            chroma_results = self.chroma_feature_detection(pattern_path, target_path, target_sr)
+            combined_results = self.analyze(
+                pattern, target, progress, methods, adaptive, timings, top_k, merge_window
+            )
             
-            # Method 3: Spectral contrast (for timbre matching)
-            print("🎵 Method 3: Spectral analysis...")
-            spectral_results = self.spectral_contrast_detection(pattern_path, target_path, target_sr)
+            processing_time = time.time() - start_time
+            print(f"✅ Analysis completed in {processing_time:.2f} seconds")
             
-            # Combine results
-            print("🔄 Combining detection methods...")
+        except Exception as e:
+            print(f"❌ Audio processing error: {str(e)}")
+            raise Exception(f"Audio processing failed: {str(e)}")
+        finally:
+            if profiler:
+                profiler.stop()
+        
+        if profiler and processing_time >= self.profile_slow_seconds:
+            timings.profile = profiler.dump(self.profile_dir, f"detect_pattern_{processing_time:.1f}s")
+            print(f"🐢 Slow analysis profiled to {timings.profile}")
+        
+        combined_results["timings"] = timings.to_dict()
+        return combined_results
+    
+    def select_methods(self, methods: Optional[List[str]] = None) -> List[str]:
+        """Requested detection methods in pipeline order; all of them when none are given"""
+        if not methods:
+            return list(self.stages)
+        unknown = [method for method in methods if method not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown detection method(s): {', '.join(unknown)}")
+        return [method for method in self.stages if method in methods]
+    
+    def analyze(self, pattern: DecodedAudio, target: DecodedAudio,
+                progress: Optional[ProgressCallback] = None,
+                methods: Optional[List[str]] = None, adaptive: bool = False,
+                timings: Optional[Timings] = None, top_k: int = TOP_K,
+                merge_window: float = MERGE_WINDOW_SECONDS) -> Dict:
+        """
+        Run the selected detection stages on already-decoded audio and combine them.
+
+        With ``adaptive``, stages after correlation are skipped once correlation
+        has found a peak scoring at least ``ADAPTIVE_CONFIDENCE``. Skipped and
+        unselected stages still report progress, marked ``skipped``. Stage and
+        combine times are added to ``timings`` when given.
+        """
+        selected = self.select_methods(methods)
+        timings = timings or Timings()
+        results = {}
+        
+        for method, stage in self.stages.items():
+            if method in selected and not (adaptive and self._correlation_is_confident(results)):
+                with timings.span(method):
+                    results[method] = stage(pattern, target)
+                if progress:
+                    progress(method, {"detections": results[method]["detections"]})
+            else:
+                if method in selected:
+                    print(f"⏩ Skipping {method}: correlation is already confident")
+                if progress:
+                    progress(method, {"skipped": True})
+        
+        # Combine results
+        print("🔄 Combining detection methods...")
+        with timings.span("combine"):
             combined_results = self.combine_detection_methods(
-                correlation_results, 
-                chroma_results, 
-                spectral_results,
-                target_audio,
-                pattern_audio,  # FIX: Added pattern_audio
-                target_sr
+                results, target.samples, pattern.samples, target.sr, top_k, merge_window
             )
+        if progress:
+            progress("combine", {"detection_count": combined_results["detection_count"]})
+        
+        return combined_results
+    
+    @staticmethod
+    def _correlation_is_confident(results: Dict[str, Dict]) -> bool:
+        detections = results.get("correlation", {}).get("detections", [])
+        return any(d["confidence"] >= ADAPTIVE_CONFIDENCE for d in detections)
+    
+    def correlation_stage(self, pattern: DecodedAudio, target: DecodedAudio) -> Dict:
+        # Method 1: Standard cross-correlation
+        if self.use_coarse_search(len(pattern.samples), len(target.samples), target.sr):
+            print(f"🔍 Method 1: Cross-correlation (coarse-to-fine, 1/{self.coarse_decimation} rate)...")
+            return self.coarse_to_fine_detection(target.samples, pattern.samples, target.sr)
+        print("🔍 Method 1: Cross-correlation...")
+        # The spectrum is padded to this target's length, so it is not worth a cache entry
+        return self.cross_correlation_detection(target.samples, pattern.samples, target.sr)
+    
+    def use_coarse_search(self, pattern_length: int, target_length: int, sr: int) -> bool:
+        return (
+            self.coarse_min_seconds > 0
+            and target_length >= self.coarse_min_seconds * sr
+            and pattern_length // self.coarse_decimation >= COARSE_MIN_PATTERN_SAMPLES
+        )
+    
+    def chroma_stage(self, pattern: DecodedAudio, target: DecodedAudio) -> Dict:
+        # Method 2: Chroma feature matching (for musical similarity)
+        print("🎼 Method 2: Chroma feature analysis...")
+        return self.chroma_feature_detection(pattern.chroma, target.chroma, target.sr, target.hop_length)
+    
+    def spectral_stage(self, pattern: DecodedAudio, target: DecodedAudio) -> Dict:
+        # Method 3: Spectral contrast (for timbre matching)
+        print("🎵 Method 3: Spectral analysis...")
+        return self.spectral_contrast_detection(
+            pattern.spectral_contrast, target.spectral_contrast, target.sr, target.hop_length
+        )
+    
+    def warm_up(self):
+        """
+        Run the pipeline once on a short synthetic signal so numba JIT and FFT setup are paid up front.
+
+        The target goes through a 44.1 kHz WAV file so decoding and resampling
+        are compiled too, at the configured analysis rate. With ``NUMBA_CACHE_DIR``
+        set, compiled code persists and later processes only load it.
+        """
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "warm_up.wav")
+            sf.write(path, rng.uniform(-0.5, 0.5, 44100 * 2).astype(np.float32), 44100)
+            target = DecodedAudio.from_file(path, self.sample_rate, resampler=self.resampler)
+        sr = target.sr
+        pattern = DecodedAudio(target.samples[sr // 2:sr].copy(), sr)
+        # librosa warns that the CQT's lowest octaves are shorter than n_fft here
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.analyze(pattern, target)
+    
+    def detect_pattern_streaming(self, pattern_path: str, target_path: str,
+                                 block_seconds: float = 30.0) -> Iterator[Dict]:
+        """
+        Correlation-only detection over a target decoded block by block.
+
+        Yields each detection as soon as it is final, then a summary event.
+        Memory is bounded by the block size rather than the target length.
+        """
+        target_sr = self.analysis_rate(target_path)
+        print(f"🌊 Streaming analysis with {block_seconds:.0f}s blocks...")
+        start_time = time.time()
+        
+        pattern = DecodedAudio.from_file(pattern_path, target_sr, cache=self.cache, resampler=self.resampler)
+        # Same score floor as cross_correlation_detection, so both endpoints find the same matches
+        detector = self.streaming_detector(pattern, block_seconds, CORRELATION_MIN_SCORE)
+        
+        samples_read = 0
+        
+        def target_blocks():
+            nonlocal samples_read
+            for block in read_blocks(target_path, target_sr, detector.block_size):
+                samples_read += len(block)
+                yield block
+        
+        detection_count = 0
+        for detection in detector.process(target_blocks()):
+            detection_count += 1
+            yield {"type": "detection", **detection}
+        
+        print(f"✅ Streaming analysis completed in {time.time() - start_time:.2f} seconds")
+        yield {
+            "type": "complete",
+            "detection_count": detection_count,
+            "pattern_duration": float(pattern.duration),
+            "target_duration": float(samples_read / target_sr),
+            "sample_rate": target_sr,
+            "analysis_methods": ["correlation"]
+        }
+    
+    def streaming_detector(self, pattern: DecodedAudio, block_seconds: float,
+                           threshold: Optional[float] = None) -> StreamingDetector:
+        """Overlap-save detector for ``pattern`` with its spectrum taken from the feature cache"""
+        block_size = int(block_seconds * pattern.sr)
+        options = {} if threshold is None else {"threshold": threshold}
+        return StreamingDetector(
+            pattern.samples, pattern.sr, block_size,
+            spectrum=pattern.pattern_spectrum(StreamingDetector.fft_size_for(block_size, len(pattern.samples))),
+            **options
+        )
+    
+    def live_detector(self, pattern_path: str, block_seconds: float,
+                      threshold: Optional[float] = None) -> StreamingDetector:
+        """Detector for pushing live target audio, sampled at the rate ``detect_pattern`` uses"""
+        pattern = DecodedAudio.from_file(
+            pattern_path, self.live_sample_rate, cache=self.cache, resampler=self.resampler
+        )
+        print(f"📡 Live detector ready for a {pattern.duration:.2f}s pattern")
+        return self.streaming_detector(pattern, block_seconds, threshold)
+    
+    def detect_patterns(self, pattern_paths: List[str], target_path: str, top_k: int = TOP_K,
+                        merge_window: float = MERGE_WINDOW_SECONDS) -> List[Dict]:
+        """
+        Correlation-only detection of many patterns in one target.
+
+        The target is decoded once and all patterns are correlated against it
+        block by block in stacked batches. Returns one result
+        per pattern, in order, in the same schema as ``detect_pattern``.
+        """
+        print(f"🎵 Batch analysis of {len(pattern_paths)} patterns...")
+        start_time = time.time()
+        
+        try:
+            target_sr = self.analysis_rate(target_path)
             
-            processing_time = time.time() - start_time
-            print(f"✅ Analysis completed in {processing_time:.2f} seconds")
+            print("📥 Loading target audio...")
+            target = DecodedAudio.from_file(target_path, target_sr, cache=self.cache, resampler=self.resampler)
+            print("📥 Loading pattern audio...")
+            patterns = [
+                DecodedAudio.from_file(path, target_sr, cache=self.cache, resampler=self.resampler)
+                for path in pattern_paths
+            ]
+            
+            print("🔍 Batch cross-correlation...")
+            results = []
+            # Block-sized pattern spectra don't depend on the target, so the cache serves them to later batches
+            scores = iter_normalized_cross_correlation(
+                target.samples,
+                [pattern.samples for pattern in patterns],
+                lambda i, fft_size: patterns[i].pattern_spectrum(fft_size)
+            )
+            for pattern, correlation_norm in zip(patterns, scores):
+                correlation_results = self.correlation_peaks(
+                    correlation_norm, len(pattern.samples), len(target.samples), target_sr
+                )
+                results.append(self.combine_detection_methods(
+                    {"correlation": correlation_results},
+                    target.samples,
+                    pattern.samples,
+                    target_sr,
+                    top_k,
+                    merge_window
+                ))
             
-            return combined_results
+            print(f"✅ Batch analysis completed in {time.time() - start_time:.2f} seconds")
+            return results
             
         except Exception as e:
             print(f"❌ Audio processing error: {str(e)}")
             raise Exception(f"Audio processing failed: {str(e)}")
     
-    def cross_correlation_detection(self, target: np.ndarray, pattern: np.ndarray, sr: int) -> Dict:
-        """Standard cross-correlation detection"""
-        correlation = self.fft_correlate(target, pattern)
-        correlation_norm = correlation / (np.max(np.abs(correlation)) + 1e-8)
+    def fingerprint(self, path: str) -> Dict:
+        """Landmark hashes of a file, taken from the same STFT the detectors use"""
+        # Always 22.05 kHz, whatever the analysis rate, so every landmark in the index is comparable
+        audio = DecodedAudio.from_file(path, sr=SAMPLE_RATE, cache=self.cache)
+        hashes, frames = extract_landmarks(audio.stft)
+        print(f"🧬 Extracted {len(hashes)} landmarks from {audio.duration:.2f}s of audio")
+        return {
+            "hashes": hashes,
+            "frames": frames,
+            "duration": float(audio.duration),
+            "sample_rate": audio.sr,
+            "hop_length": audio.hop_length
+        }
+    
+    def cross_correlation_detection(self, target: np.ndarray, pattern: np.ndarray, sr: int,
+                                    pattern_spectrum: Optional[np.ndarray] = None) -> Dict:
+        """Zero-normalized cross-correlation detection"""
+        # NCC scores are absolute, so the height threshold means the same on every file
+        correlation_norm = normalized_cross_correlation(target, pattern, pattern_spectrum)
+        return self.correlation_peaks(correlation_norm, len(pattern), len(target), sr)
+    
+    def coarse_to_fine_detection(self, target: np.ndarray, pattern: np.ndarray, sr: int) -> Dict:
+        """
+        Correlation detection that refines only candidate regions at full rate.
+
+        Detections carry exact full-rate times and NCC scores; the returned
+        ``correlation_data`` is drawn from the decimated score curve.
+        """
+        lags, scores, coarse_scores = coarse_to_fine_correlation(
+            target, pattern, self.coarse_decimation, self.coarse_threshold
+        )
+        
+        # Same height and spacing rules as correlation_peaks, strongest first
+        min_distance = max(1, int(len(pattern) * CORRELATION_MIN_SPACING))
+        kept = []
+        for i in np.argsort(scores)[::-1]:
+            if scores[i] < CORRELATION_MIN_SCORE:
+                break
+            if all(abs(lags[i] - lags[j]) >= min_distance for j in kept):
+                kept.append(i)
+        kept.sort(key=lambda i: lags[i])
         
+        detections = [
+            {"time": float(lags[i] / sr), "confidence": float(scores[i]), "method": "correlation"}
+            for i in kept
+        ]
+        
+        return {
+            "detections": detections,
+            "correlation_data": envelope(coarse_scores)
+        }
+    
+    def correlation_peaks(self, correlation_norm: np.ndarray, pattern_length: int, target_length: int, sr: int) -> Dict:
+        """Pick detections from an NCC score curve"""
         # Find peaks
-        min_distance = max(1, int(len(pattern) * 0.3))
-        peaks, properties = find_peaks(
-            correlation_norm,
-            height=0.2,
-            prominence=0.15,
-            distance=min_distance,
-            width=2
-        )
+        min_distance = max(1, int(pattern_length * CORRELATION_MIN_SPACING))
+        peaks, heights = find_correlation_peaks(correlation_norm, CORRELATION_MIN_SCORE, min_distance)
         
         detection_times = peaks / sr
-        max_time = len(target) / sr
+        max_time = target_length / sr
         valid_mask = (detection_times >= 0) & (detection_times <= max_time)
         detection_times = detection_times[valid_mask]
-        peak_values = properties['peak_heights'][valid_mask] if 'peak_heights' in properties else np.ones(len(detection_times))
+        peak_values = heights[valid_mask]
         
         detections = [
             {"time": float(t), "confidence": float(v), "method": "correlation"}
@@ -94,38 +427,25 @@ class AudioProcessor:
         
         return {
             "detections": detections,
-            "correlation_data": correlation_norm[::max(1, len(correlation_norm) // 500)].tolist()
+            "correlation_data": envelope(correlation_norm)
         }
     
-    def chroma_feature_detection(self, pattern_path: str, target_path: str, sr: int) -> Dict:
+    def chroma_feature_detection(self, pattern_chroma: np.ndarray, target_chroma: np.ndarray, sr: int,
+                                 hop_length: int = 512) -> Dict:
         """Chroma feature-based detection for musical similarity"""
         try:
-            # Load with chroma features
-            pattern_chroma = librosa.feature.chroma_cqt(
-                y=librosa.load(pattern_path, sr=sr)[0], 
-                sr=sr
-            )
-            target_chroma = librosa.feature.chroma_cqt(
-                y=librosa.load(target_path, sr=sr)[0], 
-                sr=sr
-            )
-            
-            # Cross-correlation of chroma features
-            chroma_correlation = np.array([
-                np.correlate(target_chroma[i], pattern_chroma[i], mode='same')
-                for i in range(12)
-            ])
-            chroma_correlation = np.mean(chroma_correlation, axis=0)
-            chroma_correlation_norm = chroma_correlation / (np.max(np.abs(chroma_correlation)) + 1e-8)
+            # Per-frame cosine similarity of chroma vectors at every lag
+            chroma_similarity = feature_similarity(target_chroma, pattern_chroma)
             
-            # Find peaks in chroma correlation
+            # Chroma vectors are non-negative, so unrelated music still scores ~0.7
             peaks, properties = find_peaks(
-                chroma_correlation_norm,
-                height=0.15,
-                distance=int(sr * 0.5)  # 0.5 second minimum distance
+                chroma_similarity,
+                height=0.8,
+                prominence=0.05,
+                distance=max(1, int(0.5 * sr / hop_length))  # 0.5 second minimum distance
             )
             
-            detection_times = peaks / sr
+            detection_times = librosa.frames_to_time(peaks, sr=sr, hop_length=hop_length)
             detections = [
                 {"time": float(t), "confidence": float(properties['peak_heights'][i]), "method": "chroma"}
                 for i, t in enumerate(detection_times)
@@ -137,30 +457,21 @@ class AudioProcessor:
             print(f"Chroma analysis warning: {e}")
             return {"detections": []}
     
-    def spectral_contrast_detection(self, pattern_path: str, target_path: str, sr: int) -> Dict:
+    def spectral_contrast_detection(self, pattern_spectral: np.ndarray, target_spectral: np.ndarray, sr: int,
+                                    hop_length: int = 512) -> Dict:
         """Spectral contrast for timbre matching"""
         try:
-            pattern_audio = librosa.load(pattern_path, sr=sr)[0]
-            target_audio = librosa.load(target_path, sr=sr)[0]
-            
-            pattern_spectral = librosa.feature.spectral_contrast(y=pattern_audio, sr=sr)
-            target_spectral = librosa.feature.spectral_contrast(y=target_audio, sr=sr)
-            
-            # Simple correlation of spectral features
-            spectral_similarity = np.array([
-                np.correlate(target_spectral[i], pattern_spectral[i], mode='same')
-                for i in range(pattern_spectral.shape[0])
-            ])
-            spectral_similarity = np.mean(spectral_similarity, axis=0)
-            spectral_similarity_norm = spectral_similarity / (np.max(np.abs(spectral_similarity)) + 1e-8)
+            # Contrast values are all positive, so compare deviations from the target's band means
+            spectral_similarity = feature_similarity(target_spectral, pattern_spectral, center_bands=True)
             
             peaks, properties = find_peaks(
-                spectral_similarity_norm,
-                height=0.1,
-                distance=int(sr * 0.5)
+                spectral_similarity,
+                height=0.3,
+                prominence=0.1,
+                distance=max(1, int(0.5 * sr / hop_length))
             )
             
-            detection_times = peaks / sr
+            detection_times = librosa.frames_to_time(peaks, sr=sr, hop_length=hop_length)
             detections = [
                 {"time": float(t), "confidence": float(properties['peak_heights'][i]), "method": "spectral"}
                 for i, t in enumerate(detection_times)
@@ -172,52 +483,22 @@ class AudioProcessor:
             print(f"Spectral analysis warning: {e}")
             return {"detections": []}
     
-    def combine_detection_methods(self, corr_results: Dict, chroma_results: Dict, spectral_results: Dict, 
-                                target_audio: np.ndarray, pattern_audio: np.ndarray, sr: int) -> Dict:
-        """Combine results from multiple detection methods"""
-        all_detections = []
-        
-        # Add all detections
-        all_detections.extend(corr_results["detections"])
-        all_detections.extend(chroma_results["detections"])
-        all_detections.extend(spectral_results["detections"])
-        
-        # Group nearby detections and average their times
-        merged_detections = []
-        all_detections.sort(key=lambda x: x["time"])
-        
-        i = 0
-        while i < len(all_detections):
-            current = all_detections[i]
-            group = [current]
-            
-            # Group detections within 0.5 seconds
-            j = i + 1
-            while j < len(all_detections) and all_detections[j]["time"] - current["time"] <= 0.5:
-                group.append(all_detections[j])
-                j += 1
-            
-            # Calculate weighted average time and combined confidence
-            avg_time = np.mean([d["time"] for d in group])
-            max_confidence = max([d["confidence"] for d in group])
-            methods = list(set([d["method"] for d in group]))
-            
-            merged_detections.append({
-                "time": float(avg_time),
-                "confidence": float(max_confidence),
-                "methods": methods,
-                "method_count": len(methods)
-            })
-            
-            i = j
-        
-        # Sort by confidence and take top matches
-        merged_detections.sort(key=lambda x: x["confidence"], reverse=True)
-        final_detections = merged_detections[:10]  # Limit to top 10
-        
-        # Downsample for visualization
-        downsample_factor = max(1, len(target_audio) // 500)
-        waveform_viz = target_audio[::downsample_factor].tolist()
+    def combine_detection_methods(self, results: Dict[str, Dict], target_audio: np.ndarray,
+                                  pattern_audio: np.ndarray, sr: int, top_k: int = TOP_K,
+                                  merge_window: float = MERGE_WINDOW_SECONDS) -> Dict:
+        """
+        Combine results from the detection methods that ran, keyed by method name.
+        
+        Detections are merged as NumPy arrays (see ``merge_detections``) and
+        only the ``top_k`` most confident groups become dicts.
+        """
+        methods = list(results)
+        weights = np.array([self.method_weights.get(method, 1.0) for method in methods])
+        merged = merge_detections(detections_array(results, methods), merge_window, weights)
+        final_detections = merged_to_dicts(select_top_k(merged, top_k), methods)
+        
+        # Min/max envelope for visualization, so short transients still show
+        waveform_viz = envelope(target_audio)
         
         return {
             "detection_count": len(final_detections),
@@ -226,17 +507,6 @@ class AudioProcessor:
             "target_duration": float(len(target_audio) / sr),
             "sample_rate": int(sr),
             "waveform_data": waveform_viz,
-            "correlation_data": corr_results["correlation_data"],
-            "analysis_methods": ["correlation", "chroma", "spectral"]
+            "correlation_data": results.get("correlation", {}).get("correlation_data", []),
+            "analysis_methods": list(results)
         }
-    
-    def fft_correlate(self, target: np.ndarray, pattern: np.ndarray) -> np.ndarray:
-        """FFT-based correlation for better performance"""
-        pattern_padded = np.zeros_like(target)
-        pattern_padded[:len(pattern)] = pattern
-        
-        target_fft = np.fft.fft(target)
-        pattern_fft = np.fft.fft(pattern_padded)
-        correlation = np.fft.ifft(target_fft * np.conj(pattern_fft))
-        
-        return np.real(correlation)
\ No newline at end of file
@@ -0,0 +1,158 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# Eviction frees down to this fraction of max_bytes, so a full cache isn't rescanned on every write
+EVICT_TO_FRACTION = 0.9
+
+
+class CacheCounters:
+    """
+    Hit/miss/eviction counters and the cached byte total in shared memory,
+    so pool workers report to the web process
+    """
+
+    def __init__(self):
+        context = multiprocessing.get_context("spawn")
+        self.hits = context.Value("q", 0)
+        self.misses = context.Value("q", 0)
+        self.evictions = context.Value("q", 0)
+        self.bytes = context.Value("q", 0)
+
+    @staticmethod
+    def increment(counter, amount: int = 1):
+        with counter.get_lock():
+            counter.value += amount
+
+
+class FeatureCache:
+    """
+    Content-addressed cache of decoded audio and derived arrays.
+
+    Entries are directories named by a hash of the input bytes plus the
+    analysis parameters, holding one ``.npy`` file per array. Reads are
+    memory-mapped. Total size is bounded by ``max_bytes`` with least-recently
+    used eviction, using file mtimes (refreshed on every hit) as the clock so
+    every process sharing the directory agrees on recency. A running byte total
+    in the shared counters is updated on every write, so the directory is only
+    scanned once the total goes over the limit.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, counters: Optional[CacheCounters] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.counters = counters or CacheCounters()
+        os.makedirs(directory, exist_ok=True)
+        with self.counters.bytes.get_lock():
+            self.counters.bytes.value = sum(size for _, size, _ in self._files())
+
+    @staticmethod
+    def key(content_hash: str, **params) -> str:
+        """Cache key for some content under the given analysis parameters"""
+        described = ",".join(f"{name}={params[name]}" for name in sorted(params))
+        return hashlib.sha256(f"{content_hash}|{described}".encode()).hexdigest()
+
+    def _path(self, key: str, name: str) -> str:
+        return os.path.join(self.directory, key, f"{name}.npy")
+
+    def get(self, key: str, name: str) -> Optional[np.ndarray]:
+        path = self._path(key, name)
+        try:
+            array = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            CacheCounters.increment(self.counters.misses)
+            return None
+        CacheCounters.increment(self.counters.hits)
+        return array
+
+    def put(self, key: str, name: str, array: np.ndarray):
+        entry_dir = os.path.join(self.directory, key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        # Write then rename so concurrent readers never see a partial file
+        path = self._path(key, name)
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                np.save(tmp_file, np.ascontiguousarray(array))
+            size = os.path.getsize(tmp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        CacheCounters.increment(self.counters.bytes, size - replaced)
+        self._evict()
+
+    def get_or_compute(self, key: str, name: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        array = self.get(key, name)
+        if array is None:
+            array = compute()
+            # A full disk or a racing eviction should cost a recompute, not the request
+            try:
+                self.put(key, name, array)
+            except OSError as e:
+                print(f"Feature cache warning: {e}")
+        return array
+
+    def _files(self):
+        """(path, size, mtime) of every cached array; tolerates concurrent eviction"""
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            try:
+                for item in os.scandir(entry.path):
+                    if item.name.endswith(".npy"):
+                        stat = item.stat()
+                        yield item.path, stat.st_size, stat.st_mtime
+            except FileNotFoundError:
+                continue
+
+    def _evict(self):
+        if self.counters.bytes.value <= self.max_bytes:
+            return
+
+        files = sorted(self._files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+
+        for path, size, _ in files:
+            if total <= self.max_bytes * EVICT_TO_FRACTION:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                CacheCounters.increment(self.counters.evictions)
+            except FileNotFoundError:
+                continue
+            # rmdir only succeeds once the entry is empty, so a concurrent writer is safe
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+
+        # The scan also catches up on writes by processes that don't share these counters
+        with self.counters.bytes.get_lock():
+            self.counters.bytes.value = total
+
+    def stats(self) -> Dict:
+        files = list(self._files())
+        hits, misses = self.counters.hits.value, self.counters.misses.value
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": self.counters.evictions.value,
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes
+        }
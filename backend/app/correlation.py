@@ -0,0 +1,294 @@
+import numpy as np
+from typing import Callable, Iterator, List, Optional, Tuple
+from scipy.fft import next_fast_len, rfft, irfft
+from scipy.signal import find_peaks
+
+# Lags per running-sum block; bounds the float64 scratch used for energies
+ENERGY_BLOCK = 1 << 20
+
+# Upper bound on the scores and block spectra held at once by the batch path
+BATCH_SPECTRA_BYTES = 256 * 1024 * 1024
+
+# Smallest overlap-save block FFT of the batch path; blocks are also at least four times
+# the longest pattern, so at least three quarters of every block is new target
+BATCH_BLOCK_FFT = 1 << 17
+
+# Windows quieter than this RMS (about -80 dBFS) score 0 instead of amplifying round-off
+SILENCE_RMS = 1e-4
+
+# Shape a score peak needs to count as a detection, beyond its height
+CORRELATION_MIN_PROMINENCE = 0.15
+CORRELATION_MIN_WIDTH = 2
+
+
+def local_energy(x: np.ndarray, m: int) -> np.ndarray:
+    """
+    Energy of every length-``m`` window of ``x`` about its own mean, in O(N).
+
+    Running sums are taken in float64 over blocks of ``ENERGY_BLOCK`` lags, so
+    precision does not degrade with target length and scratch memory stays
+    bounded; the result is float32.
+    """
+    n_lags = len(x) - m + 1
+    energy = np.empty(max(n_lags, 0), dtype=np.float32)
+
+    for start in range(0, n_lags, ENERGY_BLOCK):
+        stop = min(start + ENERGY_BLOCK, n_lags)
+        chunk = x[start:stop + m - 1].astype(np.float64)
+        sums = np.concatenate(([0.0], np.cumsum(chunk)))
+        squares = np.concatenate(([0.0], np.cumsum(chunk * chunk)))
+        count = stop - start
+        window_sum = sums[m:m + count] - sums[:count]
+        window_squares = squares[m:m + count] - squares[:count]
+        energy[start:stop] = np.maximum(window_squares - window_sum * window_sum / m, 0.0)
+
+    return energy
+
+
+def zero_mean_pattern(pattern: np.ndarray):
+    """Zero-mean float32 copy of the pattern and its norm"""
+    centered = pattern.astype(np.float32) - np.float32(np.mean(pattern))
+    return centered, float(np.linalg.norm(centered))
+
+
+def normalize_correlation(numerator: np.ndarray, energy: np.ndarray, m: int, pattern_norm: float) -> np.ndarray:
+    """
+    Turn a zero-mean-pattern correlation into NCC scores in [-1, 1].
+
+    ``energy`` is consumed: it is overwritten in place with the denominator.
+    """
+    audible = energy > m * SILENCE_RMS * SILENCE_RMS
+    denominator = np.sqrt(energy, out=energy)
+    denominator *= np.float32(pattern_norm)
+    audible &= denominator > 0
+    scores = np.divide(numerator, denominator, out=np.zeros(len(numerator), dtype=np.float32), where=audible)
+    return np.clip(scores, -1.0, 1.0, out=scores)
+
+
+def find_correlation_peaks(scores: np.ndarray, threshold: float, min_distance: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Detection peaks of an NCC curve and their heights.
+
+    Prominence and width are measured within ``min_distance`` lags either
+    side of each peak, and a peak is dropped when a stronger one that passed
+    those tests lies closer than ``min_distance``. Unlike find_peaks' own
+    distance rule this never chains from one suppression to the next, so a
+    peak's verdict depends only on the ``2 * min_distance`` lags either side
+    of it: a stream that waits for that much later context reaches the same
+    verdict as a pass over the whole curve.
+    """
+    peaks, properties = find_peaks(
+        scores,
+        height=threshold,
+        prominence=CORRELATION_MIN_PROMINENCE,
+        width=CORRELATION_MIN_WIDTH,
+        wlen=2 * min_distance + 1
+    )
+    heights = properties["peak_heights"]
+
+    keep = np.ones(len(peaks), dtype=bool)
+    starts = np.searchsorted(peaks, peaks - min_distance, side="right")
+    stops = np.searchsorted(peaks, peaks + min_distance, side="left")
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        if stop - start > 1:
+            near, near_heights = peaks[start:stop], heights[start:stop]
+            # Ties go to the earlier peak
+            stronger = (near_heights > heights[i]) | ((near_heights == heights[i]) & (near < peaks[i]))
+            keep[i] = not stronger.any()
+    return peaks[keep], heights[keep]
+
+
+def correlation_fft_size(target_length: int) -> int:
+    """FFT length used by ``normalized_cross_correlation`` for a target of this length"""
+    return next_fast_len(target_length, real=True)
+
+
+def pattern_spectrum(pattern: np.ndarray, fft_size: int) -> np.ndarray:
+    """Conjugate spectrum of the zero-mean pattern, reusable across targets of one FFT size"""
+    centered, _ = zero_mean_pattern(pattern)
+    spectrum = rfft(centered, n=fft_size)
+    return np.conj(spectrum, out=spectrum)
+
+
+def normalized_cross_correlation(target: np.ndarray, pattern: np.ndarray,
+                                 spectrum: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Zero-normalized cross-correlation over every lag where the pattern fits.
+
+    Returns ``len(target) - len(pattern) + 1`` float32 scores in [-1, 1];
+    index ``k`` scores the pattern starting at target sample ``k``. Only
+    these valid lags are kept, so an FFT of ``len(target)`` points already
+    has no circular wrap; it is rounded up to the next fast length and done
+    with real transforms. ``spectrum`` may be a precomputed
+    ``pattern_spectrum(pattern, correlation_fft_size(len(target)))``.
+    """
+    n, m = len(target), len(pattern)
+    if m == 0 or n < m:
+        return np.zeros(0, dtype=np.float32)
+
+    _, pattern_norm = zero_mean_pattern(pattern)
+    fft_size = correlation_fft_size(n)
+    if spectrum is None:
+        spectrum = pattern_spectrum(pattern, fft_size)
+
+    # With a zero-mean pattern, the target window mean drops out of the numerator
+    product = rfft(target.astype(np.float32, copy=False), n=fft_size)
+    product *= spectrum
+    numerator = irfft(product, n=fft_size)[:n - m + 1]
+    del product
+
+    return normalize_correlation(numerator, local_energy(target, m), m, pattern_norm)
+
+
+def batch_fft_size(pattern_length: int) -> int:
+    """Overlap-save block FFT length used by ``iter_normalized_cross_correlation`` for patterns up to this long"""
+    return max(BATCH_BLOCK_FFT, 1 << int(np.ceil(np.log2(4 * max(pattern_length, 1)))))
+
+
+def iter_normalized_cross_correlation(target: np.ndarray, patterns: List[np.ndarray],
+                                      spectrum_for: Optional[Callable[[int, int], np.ndarray]] = None) -> Iterator[np.ndarray]:
+    """
+    NCC of many patterns against one target, yielded in pattern order.
+
+    The target is correlated in overlap-save blocks of ``batch_fft_size``
+    points, which depends only on the longest pattern. Each block's spectrum
+    is computed once per group of patterns; every pattern in the group then
+    costs one broadcast multiply and one block-sized inverse FFT per block.
+    Because the block size does not depend on the target, pattern spectra can
+    be cached and reused for any target: ``spectrum_for(i, fft_size)`` may
+    supply pattern ``i``'s ``pattern_spectrum`` at that size. Groups are
+    sized by ``BATCH_SPECTRA_BYTES``, so memory does not grow with the
+    catalog size, and local target energies are shared between patterns of
+    equal length.
+    """
+    n = len(target)
+    target = target.astype(np.float32, copy=False)
+    fits = [0 < len(pattern) <= n for pattern in patterns]
+    longest = max((len(pattern) for pattern, fit in zip(patterns, fits) if fit), default=1)
+    fft_size = batch_fft_size(longest)
+    # Lags every pattern can take from one block without circular wrap
+    step = fft_size - longest + 1
+
+    # Per pattern in a group: its scores over the whole target plus its share of a block's spectra and products
+    group_size = max(1, BATCH_SPECTRA_BYTES // ((n + 2 * fft_size) * np.dtype(np.float32).itemsize))
+
+    for group_start in range(0, len(patterns), group_size):
+        group = [i for i in range(group_start, min(group_start + group_size, len(patterns))) if fits[i]]
+
+        numerators = {}
+        if group:
+            spectra = np.empty((len(group), fft_size // 2 + 1), dtype=np.complex64)
+            for row, i in enumerate(group):
+                spectra[row] = spectrum_for(i, fft_size) if spectrum_for is not None else pattern_spectrum(patterns[i], fft_size)
+            numerators = {i: np.empty(n - len(patterns[i]) + 1, dtype=np.float32) for i in group}
+            for start in range(0, n - min(len(patterns[i]) for i in group) + 1, step):
+                block = rfft(target[start:start + fft_size], n=fft_size)
+                correlations = irfft(spectra * block, n=fft_size, axis=-1)
+                for row, i in enumerate(group):
+                    lags = min(step, len(numerators[i]) - start)
+                    if lags > 0:
+                        numerators[i][start:start + lags] = correlations[row, :lags]
+                del correlations
+
+        energies = {}
+        for i in range(group_start, min(group_start + group_size, len(patterns))):
+            if i not in numerators:
+                yield np.zeros(0, dtype=np.float32)
+                continue
+            m = len(patterns[i])
+            if m not in energies:
+                energies[m] = local_energy(target, m)
+            _, pattern_norm = zero_mean_pattern(patterns[i])
+            # normalize_correlation consumes its energy argument
+            yield normalize_correlation(numerators.pop(i), energies[m].copy(), m, pattern_norm)
+
+
+def block_mean(x: np.ndarray, factor: int) -> np.ndarray:
+    """Decimate by averaging non-overlapping blocks of ``factor`` samples (a cheap boxcar low-pass)"""
+    usable = len(x) // factor * factor
+    return x[:usable].reshape(-1, factor).mean(axis=1, dtype=np.float32)
+
+
+def coarse_to_fine_correlation(target: np.ndarray, pattern: np.ndarray, decimation: int = 8,
+                               threshold: float = 0.2, max_candidates: int = 256) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Two-phase NCC search that only scores candidate regions at full rate.
+
+    Phase one correlates block means of both signals decimated by
+    ``decimation`` and keeps up to ``max_candidates`` local maxima scoring at
+    least ``threshold``. Phase two runs full-rate NCC only over a window of
+    ``2 * decimation`` lags either side of each candidate and keeps the best
+    lag per window.
+
+    Returns (lags, scores, coarse_scores): the exact full-rate lag and score
+    of each refined candidate, and the decimated score curve (index ``k``
+    covers full-rate lag ``k * decimation``). Larger decimations and higher
+    thresholds are faster; matches whose energy sits above the decimated
+    Nyquist frequency, or that score below ``threshold`` coarsely, are missed.
+    """
+    n, m = len(target), len(pattern)
+    empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    if m == 0 or n < m:
+        return (*empty, np.zeros(0, dtype=np.float32))
+
+    coarse_target = block_mean(target, decimation)
+    coarse_pattern = block_mean(pattern, decimation)
+    coarse_scores = normalized_cross_correlation(coarse_target, coarse_pattern)
+
+    peaks, properties = find_peaks(coarse_scores, height=threshold, distance=max(1, len(coarse_pattern) // 4))
+    if len(peaks) == 0:
+        return (*empty, coarse_scores)
+    if len(peaks) > max_candidates:
+        peaks = np.sort(peaks[np.argsort(properties["peak_heights"])[-max_candidates:]])
+
+    # Refinement windows in full-rate lags, merged where they overlap
+    radius = 2 * decimation
+    starts = np.maximum(peaks * decimation - radius, 0)
+    stops = np.minimum(peaks * decimation + radius, n - m)
+    windows = []
+    for start, stop in zip(starts, stops):
+        if windows and start <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], stop)
+        elif start <= stop:
+            windows.append([start, stop])
+
+    lags = np.empty(len(windows), dtype=np.int64)
+    scores = np.empty(len(windows), dtype=np.float32)
+    for i, (start, stop) in enumerate(windows):
+        window_scores = normalized_cross_correlation(target[start:stop + m], pattern)
+        best = int(np.argmax(window_scores))
+        lags[i], scores[i] = start + best, window_scores[best]
+
+    return lags, scores, coarse_scores
+
+
+def feature_similarity(target_features: np.ndarray, pattern_features: np.ndarray,
+                       center_bands: bool = False) -> np.ndarray:
+    """
+    Mean per-frame cosine similarity between a pattern and a target feature matrix.
+
+    Features are (bands, frames). Each frame is scaled to unit norm, then all
+    bands are correlated in one batched real FFT along the frame axis and
+    summed in the frequency domain, so a single inverse transform yields the
+    score for every valid lag. Index ``k`` scores the pattern starting at
+    target frame ``k``; scores are in [-1, 1]. With ``center_bands`` the
+    target's per-band mean over time is subtracted from both matrices first,
+    for features such as spectral contrast whose raw values are all positive
+    and would otherwise look alike frame to frame.
+    """
+    n, m = target_features.shape[1], pattern_features.shape[1]
+    if m == 0 or n < m or target_features.shape[0] != pattern_features.shape[0]:
+        return np.zeros(0, dtype=np.float32)
+
+    band_means = target_features.mean(axis=1, keepdims=True) if center_bands else 0.0
+
+    def unit_frames(features: np.ndarray) -> np.ndarray:
+        features = (features - band_means).astype(np.float32)
+        norms = np.linalg.norm(features, axis=0, keepdims=True)
+        return np.divide(features, norms, out=np.zeros_like(features), where=norms > 1e-8)
+
+    fft_size = next_fast_len(n, real=True)
+    spectrum = rfft(unit_frames(target_features), n=fft_size, axis=1)
+    spectrum *= np.conj(rfft(unit_frames(pattern_features), n=fft_size, axis=1))
+    scores = irfft(spectrum.sum(axis=0), n=fft_size)[:n - m + 1] / m
+    return np.clip(scores, -1.0, 1.0).astype(np.float32)
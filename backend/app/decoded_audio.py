@@ -0,0 +1,149 @@
+import math
+from functools import cached_property
+from typing import Callable, Optional
+
+import librosa
+import numpy as np
+import soxr
+
+from app.cache import FeatureCache
+from app.correlation import pattern_spectrum
+from app.utils import file_sha256
+
+# chroma_cqt defaults, so a shared CQT can be handed to it via C=; low analysis
+# rates get fewer octaves, since the top one must stay below Nyquist
+CQT_BINS_PER_OCTAVE = 36
+CQT_OCTAVES = 7
+CQT_FMIN = 32.70319566257483  # C1
+
+# spectral_contrast defaults; low analysis rates get fewer bands for the same reason
+CONTRAST_FMIN = 200.0
+CONTRAST_BANDS = 6
+
+# Feature frames last about as long at every analysis rate as 512 samples at 22.05 kHz
+FRAME_SECONDS = 512 / 22050
+
+# "soxr_hq" is librosa's default resampler; "poly" is scipy's polyphase filter
+RESAMPLERS = ("soxr_hq", "poly")
+
+
+def hop_length_for(sr: int) -> int:
+    """The power-of-two hop closest to FRAME_SECONDS at ``sr``: 512 at 22.05 kHz, 256 at 8 kHz"""
+    return 2 ** round(math.log2(FRAME_SECONDS * sr))
+
+
+def native_sample_rate(path: str) -> int:
+    return librosa.get_samplerate(path)
+
+
+def resample(samples: np.ndarray, orig_sr: int, sr: int, resampler: str = "soxr_hq") -> np.ndarray:
+    """Float32 ``samples`` at ``sr``; returned as is when the rates already match"""
+    if orig_sr == sr:
+        return samples
+    if resampler == "poly":
+        from scipy.signal import resample_poly
+        divisor = math.gcd(orig_sr, sr)
+        return resample_poly(samples, sr // divisor, orig_sr // divisor).astype(np.float32, copy=False)
+    return soxr.resample(samples, orig_sr, sr, quality="HQ")
+
+
+class DecodedAudio:
+    """
+    A signal decoded and resampled once per request.
+
+    Derived representations (STFT magnitude, CQT, chroma, spectral contrast)
+    are computed on first access and reused by every detection method. When
+    built with a ``FeatureCache``, the signal and feature matrices are also
+    shared across requests for identical file contents.
+    """
+
+    def __init__(self, samples: np.ndarray, sr: int, hop_length: Optional[int] = None,
+                 cache: Optional[FeatureCache] = None, cache_key: Optional[str] = None):
+        self.samples = samples
+        self.sr = sr
+        self.hop_length = hop_length or hop_length_for(sr)
+        self.cache = cache
+        self.cache_key = cache_key
+
+    @classmethod
+    def from_file(cls, path: str, sr: Optional[int] = 22050, hop_length: Optional[int] = None,
+                  cache: Optional[FeatureCache] = None, resampler: str = "soxr_hq") -> "DecodedAudio":
+        """
+        Decode, downmix and peak-normalize an audio file, or reuse a cached decode.
+
+        ``sr=None`` keeps the file's own rate. The hop defaults to ``hop_length_for(sr)``.
+        """
+        if sr is None:
+            sr = native_sample_rate(path)
+        hop_length = hop_length or hop_length_for(sr)
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key(file_sha256(path), sr=sr, hop_length=hop_length, resampler=resampler)
+            samples = cache.get_or_compute(cache_key, "samples", lambda: cls._decode(path, sr, resampler))
+        else:
+            samples = cls._decode(path, sr, resampler)
+
+        return cls(samples, sr, hop_length, cache, cache_key)
+
+    @staticmethod
+    def _decode(path: str, sr: int, resampler: str = "soxr_hq") -> np.ndarray:
+        # Decode at the file's own rate and resample separately, so matching rates skip it
+        samples, native_sr = librosa.load(path, sr=None, mono=True, dtype=np.float32)
+        samples = resample(samples, native_sr, sr, resampler)
+
+        # Normalize audio in place; the buffer is ours and stays float32
+        samples /= np.max(np.abs(samples)) + np.float32(1e-8)
+
+        return samples
+
+    def _cached(self, name: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        if self.cache is None or self.cache_key is None:
+            return compute()
+        return self.cache.get_or_compute(self.cache_key, name, compute)
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sr
+
+    @cached_property
+    def stft(self) -> np.ndarray:
+        """Magnitude STFT"""
+        return np.abs(librosa.stft(self.samples, hop_length=self.hop_length))
+
+    @cached_property
+    def cqt(self) -> np.ndarray:
+        """Magnitude CQT with the bin layout chroma_cqt expects"""
+        octaves = min(CQT_OCTAVES, int(math.log2(self.sr / 2 / CQT_FMIN)))
+        return np.abs(librosa.cqt(
+            self.samples,
+            sr=self.sr,
+            hop_length=self.hop_length,
+            fmin=CQT_FMIN,
+            n_bins=octaves * CQT_BINS_PER_OCTAVE,
+            bins_per_octave=CQT_BINS_PER_OCTAVE
+        ))
+
+    @cached_property
+    def chroma(self) -> np.ndarray:
+        return self._cached("chroma", lambda: librosa.feature.chroma_cqt(
+            C=self.cqt,
+            sr=self.sr,
+            hop_length=self.hop_length,
+            bins_per_octave=CQT_BINS_PER_OCTAVE
+        ))
+
+    @cached_property
+    def spectral_contrast(self) -> np.ndarray:
+        bands = min(CONTRAST_BANDS, int(math.log2(self.sr / 2 / CONTRAST_FMIN)) + 1)
+        return self._cached("spectral_contrast", lambda: librosa.feature.spectral_contrast(
+            S=self.stft, sr=self.sr, fmin=CONTRAST_FMIN, n_bands=bands
+        ).astype(np.float32))
+
+    def pattern_spectrum(self, fft_size: int) -> np.ndarray:
+        """
+        Conjugate zero-mean spectrum for correlating this signal as a pattern.
+
+        Cached, so only for FFT sizes that recur, such as streaming and batch
+        blocks; spectra padded to one target's length would only fill the cache.
+        """
+        return self._cached(f"pattern_spectrum_{fft_size}", lambda: pattern_spectrum(self.samples, fft_size))
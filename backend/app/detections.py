@@ -0,0 +1,87 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Built-in detection methods in pipeline order. AudioProcessor registers a stage for each;
+# the API validates requests against this without importing the processor
+DETECTION_METHODS = ("correlation", "chroma", "spectral")
+
+# One row per detection of any method; ``method`` indexes the method names passed alongside
+DETECTION_DTYPE = np.dtype([("time", np.float64), ("confidence", np.float32), ("method", np.uint8)])
+
+# One row per merged group; ``methods`` is a bitmask over the same method indices
+MERGED_DTYPE = np.dtype([("time", np.float64), ("confidence", np.float32), ("methods", np.uint32)])
+
+
+def detections_array(results: Dict[str, Dict], methods: Sequence[str]) -> np.ndarray:
+    """The detections of every method in ``methods`` as one time-sorted ``DETECTION_DTYPE`` array"""
+    parts = []
+    for index, method in enumerate(methods):
+        found = results[method]["detections"]
+        part = np.empty(len(found), dtype=DETECTION_DTYPE)
+        part["time"] = np.fromiter((d["time"] for d in found), np.float64, len(found))
+        part["confidence"] = np.fromiter((d["confidence"] for d in found), np.float32, len(found))
+        part["method"] = index
+        parts.append(part)
+
+    detections = np.concatenate(parts) if parts else np.empty(0, dtype=DETECTION_DTYPE)
+    return detections[np.argsort(detections["time"], kind="stable")]
+
+
+def merge_detections(detections: np.ndarray, window: float, weights: np.ndarray) -> np.ndarray:
+    """
+    Cluster time-sorted detections and fuse each cluster into one ``MERGED_DTYPE`` row.
+
+    A detection joins its predecessor's cluster when it is at most ``window``
+    seconds later. Each member scores ``weights[method] * confidence``; the
+    cluster time is the score-weighted mean of member times, and its
+    confidence is the noisy-OR of each method's best score, so agreement
+    between methods raises it while a single method keeps its own score.
+    Every step is a whole-array operation over the detections.
+    """
+    if len(detections) == 0:
+        return np.empty(0, dtype=MERGED_DTYPE)
+
+    times = detections["time"]
+    method = detections["method"]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(times) > window) + 1))
+
+    score = np.clip(weights[method] * detections["confidence"], 0.0, 1.0)
+    # The epsilon keeps the mean defined for clusters whose scores are all zero
+    time_weight = score + 1e-9
+
+    merged = np.empty(len(starts), dtype=MERGED_DTYPE)
+    merged["time"] = np.add.reduceat(time_weight * times, starts) / np.add.reduceat(time_weight, starts)
+
+    miss = np.ones(len(starts))
+    for index in np.unique(method):
+        best = np.maximum.reduceat(np.where(method == index, score, 0.0), starts)
+        miss *= 1.0 - best
+    merged["confidence"] = 1.0 - miss
+    merged["methods"] = np.bitwise_or.reduceat(np.left_shift(1, method.astype(np.uint32)), starts)
+    return merged
+
+
+def select_top_k(merged: np.ndarray, k: int) -> np.ndarray:
+    """The ``k`` most confident rows, most confident first"""
+    confidence = merged["confidence"]
+    if len(merged) > k:
+        candidates = np.argpartition(-confidence, k - 1)[:k]
+    else:
+        candidates = np.arange(len(merged))
+    return merged[candidates[np.argsort(-confidence[candidates], kind="stable")]]
+
+
+def merged_to_dicts(merged: np.ndarray, methods: Sequence[str]) -> List[Dict]:
+    """Serialize merged rows for the API; method lists keep the order of ``methods``"""
+    detections = []
+    for time, confidence, mask in zip(merged["time"].tolist(), merged["confidence"].tolist(),
+                                      merged["methods"].tolist()):
+        names = [name for index, name in enumerate(methods) if mask & (1 << index)]
+        detections.append({
+            "time": time,
+            "confidence": confidence,
+            "methods": names,
+            "method_count": len(names)
+        })
+    return detections
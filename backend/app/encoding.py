@@ -0,0 +1,126 @@
+import base64
+import json
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Min/max buckets per visualization curve; each bucket contributes two values
+VISUALIZATION_BUCKETS = 250
+
+# Result fields holding interleaved [min, max, min, max, ...] envelopes
+ENVELOPE_FIELDS = ("waveform_data", "correlation_data")
+
+JSON_MEDIA_TYPE = "application/json"
+COMPACT_MEDIA_TYPE = "application/vnd.audio-pattern.compact+json"
+BINARY_MEDIA_TYPE = "application/vnd.audio-pattern.compact"
+
+# Array element types selectable with a ``dtype`` media type parameter
+ARRAY_DTYPES = {"float16": np.dtype("<f2"), "float32": np.dtype("<f4")}
+
+# Binary container: magic, then the little-endian header length, header JSON and array bytes
+BINARY_MAGIC = b"APD1"
+
+
+def envelope(x: np.ndarray, buckets: int = VISUALIZATION_BUCKETS) -> List[float]:
+    """
+    Min/max envelope of a curve, interleaved as [min, max] per bucket.
+
+    Unlike strided samples, every peak of the curve survives into the
+    envelope, however long the curve is.
+    """
+    if len(x) == 0:
+        return []
+    edges = np.linspace(0, len(x), min(buckets, len(x)) + 1).astype(np.int64)[:-1]
+    pairs = np.empty((len(edges), 2), dtype=np.float32)
+    pairs[:, 0] = np.minimum.reduceat(x, edges)
+    pairs[:, 1] = np.maximum.reduceat(x, edges)
+    return pairs.reshape(-1).tolist()
+
+
+def split_envelope(values: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """The (mins, maxs) arrays of an interleaved envelope"""
+    pairs = np.asarray(values, dtype=np.float32).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def negotiate(accept: Optional[str]) -> Tuple[str, np.dtype]:
+    """
+    Pick the response media type and array dtype from an ``Accept`` header.
+
+    Honors q-values and falls back to plain JSON; arrays default to float16
+    unless the chosen media type carries ``dtype=float32``.
+    """
+    offers = []
+    for index, item in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        options = dict(param.split("=", 1) for param in params if "=" in param)
+        try:
+            quality = float(options.get("q", 1))
+        except ValueError:
+            quality = 0.0
+        offers.append((-quality, index, media_type.lower(), options))
+
+    for negative_quality, _, media_type, options in sorted(offers):
+        if negative_quality == 0:
+            break
+        if media_type in (COMPACT_MEDIA_TYPE, BINARY_MEDIA_TYPE):
+            return media_type, ARRAY_DTYPES.get(options.get("dtype", "float16"), ARRAY_DTYPES["float16"])
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            break
+
+    return JSON_MEDIA_TYPE, ARRAY_DTYPES["float32"]
+
+
+def _map_envelopes(value, encode):
+    """Copy of a result (or nested results) with every envelope field passed through ``encode``"""
+    if isinstance(value, dict):
+        return {
+            key: encode(item) if key in ENVELOPE_FIELDS and isinstance(item, list) else _map_envelopes(item, encode)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_map_envelopes(item, encode) for item in value]
+    return value
+
+
+def compact_results(results: Dict, dtype: np.dtype = ARRAY_DTYPES["float16"]) -> Dict:
+    """Results with each envelope as base64 little-endian min and max arrays"""
+    def encode(values: List[float]) -> Dict:
+        mins, maxs = split_envelope(values)
+        return {
+            "encoding": "base64",
+            "dtype": dtype.str,
+            "buckets": len(mins),
+            "min": base64.b64encode(mins.astype(dtype).tobytes()).decode("ascii"),
+            "max": base64.b64encode(maxs.astype(dtype).tobytes()).decode("ascii")
+        }
+
+    return _map_envelopes(results, encode)
+
+
+def encode_binary(results: Dict, dtype: np.dtype = ARRAY_DTYPES["float16"]) -> bytes:
+    """
+    Results as one binary message.
+
+    Layout: ``BINARY_MAGIC``, a uint32 header length, the UTF-8 JSON header,
+    then the raw array bytes. In the header each envelope is replaced by
+    ``{"dtype", "buckets", "min": [offset, nbytes], "max": [offset, nbytes]}``
+    with offsets counted from the start of the array bytes.
+    """
+    chunks = []
+    position = 0
+
+    def encode(values: List[float]) -> Dict:
+        nonlocal position
+        descriptor = {"dtype": dtype.str}
+        for name, array in zip(("min", "max"), split_envelope(values)):
+            data = array.astype(dtype).tobytes()
+            chunks.append(data)
+            descriptor[name] = [position, len(data)]
+            descriptor["buckets"] = len(array)
+            position += len(data)
+        return descriptor
+
+    header = json.dumps(_map_envelopes(results, encode), separators=(",", ":")).encode("utf-8")
+    return b"".join([BINARY_MAGIC, struct.pack("<I", len(header)), header, *chunks])
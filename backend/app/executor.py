@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from app.cache import FeatureCache
+from app.metrics import QUEUE_WAIT_SECONDS
+
+if TYPE_CHECKING:
+    # Imported in the workers only; the web process never needs librosa for pooled jobs
+    from app.audio_processor import AudioProcessor, ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Every worker is busy and the wait queue is at capacity"""
+
+
+class AnalysisTimeoutError(Exception):
+    """A job did not finish within the executor's per-job timeout"""
+
+
+LISTENER_GRACE_SECONDS = 5.0
+
+# Per worker process, set up by the pool initializer
+_worker_processor: Optional["AudioProcessor"] = None
+_worker_events = None
+
+
+def _init_worker(warm_up: bool, events, cache: Optional[FeatureCache], processor_options: Dict):
+    global _worker_processor, _worker_events
+    from app.audio_processor import AudioProcessor
+    _worker_processor = AudioProcessor(cache=cache, **processor_options)
+    _worker_events = events
+    if warm_up:
+        _worker_processor.warm_up()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _run_timed(fn: Callable, submitted_at: float, *args, **kwargs) -> Tuple[Any, float]:
+    """Run ``fn`` in a worker; returns its result and how long the job waited for the worker"""
+    queue_wait = time.time() - submitted_at
+    return fn(*args, **kwargs), queue_wait
+
+
+def _progress_reporter(token: Optional[str]) -> Optional["ProgressCallback"]:
+    """Forward progress events from a worker to the parent's listener for ``token``"""
+    if token is None:
+        return None
+    return lambda stage, payload: _worker_events.put((token, stage, payload))
+
+
+def run_detect_pattern(pattern_path: str, target_path: str, methods: Optional[List[str]] = None,
+                       adaptive: bool = False, combine_options: Optional[Dict] = None,
+                       progress_token: Optional[str] = None) -> Dict:
+    """Pool entry point for AudioProcessor.detect_pattern; ``combine_options`` holds top_k / merge_window"""
+    return _worker_processor.detect_pattern(
+        pattern_path, target_path, _progress_reporter(progress_token), methods, adaptive, **(combine_options or {})
+    )
+
+
+def run_detect_pattern_streaming(pattern_path: str, target_path: str, block_seconds: float,
+                                 progress_token: Optional[str] = None) -> Dict:
+    """
+    Pool entry point for AudioProcessor.detect_pattern_streaming: each detection is
+    reported as a "detection" progress event, and the summary event is returned
+    """
+    progress = _progress_reporter(progress_token)
+    for event in _worker_processor.detect_pattern_streaming(pattern_path, target_path, block_seconds):
+        if event["type"] != "detection":
+            return event
+        if progress:
+            progress("detection", event)
+
+
+def run_detect_patterns(pattern_paths: List[str], target_path: str,
+                        combine_options: Optional[Dict] = None) -> List[Dict]:
+    """Pool entry point for AudioProcessor.detect_patterns"""
+    return _worker_processor.detect_patterns(pattern_paths, target_path, **(combine_options or {}))
+
+
+def run_fingerprint(path: str) -> Dict:
+    """Pool entry point for AudioProcessor.fingerprint"""
+    return _worker_processor.fingerprint(path)
+
+
+class AnalysisExecutor:
+    """
+    Runs CPU-bound analyses in a process pool, off the event loop.
+
+    At most ``max_workers + max_queue`` jobs are admitted at once; beyond that
+    ``submit`` raises ``QueueFullError`` so callers can shed load instead of
+    piling up work. A job that times out keeps its slot until its worker
+    actually finishes, because a running pool task cannot be interrupted.
+
+    Pool functions that accept a ``progress_token`` keyword can report stage
+    progress; events travel back over a shared queue and are delivered to the
+    ``progress`` callback on the event loop. ``processor_options`` are passed
+    to each worker's ``AudioProcessor``.
+
+    The time each job waits for a free worker is recorded in
+    ``QUEUE_WAIT_SECONDS`` and, for results carrying a ``timings`` block,
+    added to it as the ``queue_wait`` span.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: float, warm_up: bool = True,
+                 cache: Optional[FeatureCache] = None, processor_options: Optional[Dict] = None):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        # spawn rather than fork: the web process already runs threads
+        context = multiprocessing.get_context("spawn")
+        self._events = context.Queue()
+        self._listeners: Dict[str, "ProgressCallback"] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(warm_up, self._events, cache, processor_options or {})
+        )
+
+    async def start(self):
+        """Start every worker so the initializer's warm-up runs before the first request"""
+        self._loop = asyncio.get_running_loop()
+        threading.Thread(target=self._dispatch_events, name="analysis-progress", daemon=True).start()
+
+        pids = await asyncio.gather(*[
+            self._loop.run_in_executor(self._pool, _ping) for _ in range(self.max_workers)
+        ])
+        logger.info(f"🔥 Analysis workers ready: {len(set(pids))} process(es)")
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.capacity
+
+    def submit(self, fn: Callable, *args, progress: Optional["ProgressCallback"] = None) -> asyncio.Future:
+        """
+        Admit a job or raise ``QueueFullError`` right away.
+
+        Admission is synchronous so callers can reject a request before doing
+        any other work; the returned future resolves to the job's result.
+        """
+        if not self.has_capacity():
+            raise QueueFullError(f"{self.in_flight} analyses in flight (capacity {self.capacity})")
+
+        loop = asyncio.get_running_loop()
+        token = None
+        if progress is not None:
+            token = str(uuid.uuid4())
+            self._listeners[token] = progress
+
+        self.in_flight += 1
+        kwargs = {"progress_token": token} if token else {}
+        future = self._pool.submit(_run_timed, fn, time.time(), *args, **kwargs)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, token))
+
+        return asyncio.ensure_future(self._wait(future, fn.__name__))
+
+    async def _wait(self, future, job: str):
+        try:
+            result, queue_wait = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # Frees the slot immediately if the job never left the queue
+            future.cancel()
+            raise AnalysisTimeoutError(f"Analysis exceeded {self.timeout:.0f}s")
+        QUEUE_WAIT_SECONDS.observe(queue_wait, job=job)
+        if isinstance(result, dict) and "timings" in result:
+            result["timings"]["spans"]["queue_wait"] = round(queue_wait, 4)
+        return result
+
+    def _release(self, token: Optional[str]):
+        self.in_flight -= 1
+        # Events travel on a different pipe than the result and may still be in
+        # transit, so keep the listener around briefly
+        if token is not None:
+            asyncio.get_running_loop().call_later(LISTENER_GRACE_SECONDS, self._listeners.pop, token, None)
+
+    def _dispatch_events(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            token, stage, payload = event
+            self._loop.call_soon_threadsafe(self._deliver, token, stage, payload)
+
+    def _deliver(self, token: str, stage: str, payload: Dict):
+        listener = self._listeners.get(token)
+        if listener is not None:
+            listener(stage, payload)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "capacity": self.capacity
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._events.put(None)
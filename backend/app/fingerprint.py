@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Constellation peak picking on the magnitude STFT
+PEAK_NEIGHBORHOOD = (21, 5)             # (frequency bins, frames)
+# A peak must stand this far above the mean level of the bins around it, so the
+# threshold follows the local noise floor instead of the clip's loudest bin
+PEAK_MIN_CONTRAST_DB = 15.0
+PEAK_FLOOR_NEIGHBORHOOD = (31, 31)      # (frequency bins, frames)
+MAX_PEAKS_PER_FRAME = 3
+
+# Target zone: the later peaks an anchor is paired with, nearest first
+FAN_OUT = 8
+MIN_DELTA_FRAMES = 1
+MAX_DELTA_FRAMES = 63
+ZONE_FREQ_BINS = 64                     # either side of the anchor's bin
+
+# Hash layout: 10 bits per (halved) frequency bin and 6 bits of frame delta
+FREQ_BITS = 10
+DELTA_BITS = 6
+
+
+def extract_landmarks(stft_magnitude: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hash pairs of spectral peaks into (hashes, anchor_frames).
+
+    Peaks are local maxima of the dB spectrogram within ``PEAK_NEIGHBORHOOD``
+    that rise ``PEAK_MIN_CONTRAST_DB`` above their surroundings; the
+    strongest few per frame are kept. Each peak is paired with up to
+    ``FAN_OUT`` of the nearest later peaks inside its target zone: a frame
+    delta of ``MIN_DELTA_FRAMES`` to ``MAX_DELTA_FRAMES`` and at most
+    ``ZONE_FREQ_BINS`` away in frequency. A pair hashes to (f1, f2, delta) and
+    is stamped with the anchor's frame so matches can vote on a consistent
+    offset. Background noise rarely clears the contrast threshold, so the
+    same pairs come out of a pattern on its own and of a noisy recording of it.
+    """
+    # Only pool workers extract landmarks; keep scipy out of the web process's imports
+    from scipy.ndimage import maximum_filter, uniform_filter
+
+    empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    if stft_magnitude.size == 0:
+        return empty
+
+    db = 20 * np.log10(np.maximum(stft_magnitude, 1e-10))
+    contrast = db - uniform_filter(db, size=PEAK_FLOOR_NEIGHBORHOOD, mode="nearest")
+    is_peak = (
+        (db == maximum_filter(db, size=PEAK_NEIGHBORHOOD, mode="constant", cval=-np.inf))
+        & (contrast >= PEAK_MIN_CONTRAST_DB)
+    )
+    freqs, frames = np.nonzero(is_peak)
+    if len(frames) == 0:
+        return empty
+
+    # Keep the most prominent few peaks per frame so dense frames don't flood the index
+    strength = contrast[freqs, frames]
+    order = np.lexsort((-strength, frames))
+    freqs, frames = freqs[order], frames[order]
+    rank = np.arange(len(frames)) - np.searchsorted(frames, frames, side="left")
+    keep = rank < MAX_PEAKS_PER_FRAME
+    freqs, frames = freqs[keep], frames[keep]
+
+    # Peaks are in frame order, so the step-th later peak is never nearer than the
+    # (step-1)-th; walk outwards until every anchor's zone has been passed
+    freq_codes = np.minimum(freqs >> 1, (1 << FREQ_BITS) - 1).astype(np.int64)
+    paired = np.zeros(len(frames), dtype=np.int32)
+    hashes, anchors = [], []
+    for step in range(1, len(frames)):
+        delta = frames[step:] - frames[:-step]
+        if delta.min() > MAX_DELTA_FRAMES:
+            break
+        valid = (
+            (delta >= MIN_DELTA_FRAMES) & (delta <= MAX_DELTA_FRAMES)
+            & (np.abs(freqs[step:] - freqs[:-step]) <= ZONE_FREQ_BINS)
+            & (paired[:-step] < FAN_OUT)
+        )
+        paired[:-step] += valid
+        hashes.append(
+            (freq_codes[:-step][valid] << (FREQ_BITS + DELTA_BITS))
+            | (freq_codes[step:][valid] << DELTA_BITS)
+            | delta[valid]
+        )
+        anchors.append(frames[:-step][valid])
+
+    if not hashes:
+        return empty
+    return np.concatenate(hashes), np.concatenate(anchors).astype(np.int32)
+
+
+class FingerprintIndex:
+    """
+    On-disk inverted index from landmark hash to (recording, anchor frame).
+
+    Postings live in a SQLite ``WITHOUT ROWID`` table clustered on the hash,
+    so a lookup is a B-tree seek per query hash and query cost depends on
+    how many postings share the query's hashes, not on archive size.
+    Matches are ranked by offset-histogram voting.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS recordings (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    duration REAL,
+                    sample_rate INTEGER,
+                    hop_length INTEGER,
+                    ingested_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    hash INTEGER NOT NULL,
+                    recording_id INTEGER NOT NULL,
+                    frame INTEGER NOT NULL,
+                    PRIMARY KEY (hash, recording_id, frame)
+                ) WITHOUT ROWID;
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def add(self, name: str, hashes: np.ndarray, frames: np.ndarray, duration: float,
+            sample_rate: int, hop_length: int) -> int:
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO recordings (name, duration, sample_rate, hop_length, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                (name, duration, sample_rate, hop_length, datetime.now().isoformat())
+            )
+            recording_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO postings (hash, recording_id, frame) VALUES (?, ?, ?)",
+                ((int(h), recording_id, int(f)) for h, f in zip(hashes, frames))
+            )
+        return recording_id
+
+    def query(self, hashes: np.ndarray, frames: np.ndarray, top_k: int = 10, min_votes: int = 5) -> List[Dict]:
+        if len(hashes) == 0:
+            return []
+
+        conn = self._connect()
+        with conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_hashes (hash INTEGER, frame INTEGER)")
+            conn.execute("DELETE FROM query_hashes")
+            conn.executemany(
+                "INSERT INTO query_hashes (hash, frame) VALUES (?, ?)",
+                ((int(h), int(f)) for h, f in zip(hashes, frames))
+            )
+            rows = conn.execute("""
+                SELECT p.recording_id, p.frame - q.frame
+                FROM query_hashes q JOIN postings p ON p.hash = q.hash
+            """).fetchall()
+
+        if not rows:
+            return []
+
+        # Offset histogram: true matches pile up on one (recording, offset) bin
+        votes = np.asarray(rows, dtype=np.int64)
+        bins, counts = np.unique(votes, axis=0, return_counts=True)
+        best = np.argsort(counts)[::-1]
+
+        matches, seen = [], set()
+        for index in best:
+            recording_id, offset = (int(v) for v in bins[index])
+            if counts[index] < min_votes or len(matches) >= top_k:
+                break
+            if recording_id in seen:
+                continue
+            seen.add(recording_id)
+            matches.append({"recording_id": recording_id, "offset_frames": offset, "votes": int(counts[index])})
+
+        return self._describe(matches)
+
+    def _describe(self, matches: List[Dict]) -> List[Dict]:
+        conn = self._connect()
+        for match in matches:
+            name, duration, sample_rate, hop_length = conn.execute(
+                "SELECT name, duration, sample_rate, hop_length FROM recordings WHERE id = ?",
+                (match["recording_id"],)
+            ).fetchone()
+            match.update({
+                "name": name,
+                "duration": duration,
+                "time": match["offset_frames"] * hop_length / sample_rate
+            })
+        return matches
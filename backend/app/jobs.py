@@ -0,0 +1,169 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# Pipeline stages in the order they report, including persistence in the API layer
+STAGES = ["load", "correlation", "chroma", "spectral", "combine", "persist"]
+
+
+class Job:
+    """State of one submitted analysis plus the event log its subscribers replay"""
+
+    def __init__(self, analysis_id: str, user_id: str):
+        self.analysis_id = analysis_id
+        self.user_id = user_id
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+        self.partial_detections: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict] = []
+        self._changed = asyncio.Event()
+
+    def _publish(self, event: Dict):
+        self.events.append(event)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def mark_running(self):
+        if self.status == "queued":
+            self.status = "running"
+            self._publish({"event": "status", "status": self.status})
+
+    def complete_stage(self, stage: str, payload: Dict):
+        if stage in self.stages:
+            return
+        self.mark_running()
+        self.stages[stage] = round(time.monotonic() - self.started, 3)
+        if "detections" in payload:
+            self.partial_detections.extend(payload["detections"])
+        self._publish({"event": "stage", "stage": stage, "elapsed": self.stages[stage], **payload})
+
+    def complete(self, result: Dict):
+        self.status = "completed"
+        self.result = result
+        self.finished = time.monotonic()
+        self._publish({"event": "status", "status": self.status, "result": result})
+
+    def fail(self, error: str):
+        self.status = "failed"
+        self.error = error
+        self.finished = time.monotonic()
+        self._publish({"event": "status", "status": self.status, "error": error})
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict:
+        return {
+            "analysis_id": self.analysis_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "stages_completed": [stage for stage in STAGES if stage in self.stages],
+            "stage_elapsed": self.stages,
+            "partial_detections": self.partial_detections if not self.done else [],
+            "result": self.result,
+            "error": self.error
+        }
+
+    async def follow(self) -> AsyncIterator[Dict]:
+        """Replay past events, then yield new ones until the job is done"""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            await changed.wait()
+
+
+class JobStore:
+    """In-memory registry of jobs; finished jobs are dropped after ``ttl_seconds``"""
+
+    def __init__(self, ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Job] = {}
+
+    def create(self, analysis_id: str, user_id: str) -> Job:
+        self._prune()
+        job = Job(analysis_id, user_id)
+        self._jobs[analysis_id] = job
+        return job
+
+    def get(self, analysis_id: str) -> Optional[Job]:
+        return self._jobs.get(analysis_id)
+
+    def discard(self, analysis_id: str):
+        self._jobs.pop(analysis_id, None)
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [
+            analysis_id for analysis_id, job in self._jobs.items()
+            if job.finished is not None and now - job.finished > self.ttl_seconds
+        ]
+        for analysis_id in expired:
+            del self._jobs[analysis_id]
+
+
+def queued_job_to_dict(record: Dict) -> Dict:
+    """A work queue record (see app.work_queue) in the shape of ``Job.to_dict``; only the latest attempt counts"""
+    stages = [
+        event for event in record["events"]
+        if event["event"] == "stage" and event.get("attempt") == record["attempts"]
+    ]
+    stage_elapsed = {event["stage"]: event["elapsed"] for event in stages}
+    done = record["status"] in ("completed", "failed")
+    return {
+        "analysis_id": record["analysis_id"],
+        "status": record["status"],
+        "created_at": record["created_at"],
+        "stages_completed": [stage for stage in STAGES if stage in stage_elapsed],
+        "stage_elapsed": stage_elapsed,
+        "partial_detections": [] if done else [
+            detection for event in stages for detection in event.get("detections", [])
+        ],
+        "result": record["result"],
+        "error": record["error"],
+        "attempts": record["attempts"]
+    }
+
+
+async def follow_queued_job(get: Callable[[], Awaitable[Optional[Dict]]],
+                            poll_seconds: float) -> AsyncIterator[Dict]:
+    """
+    ``Job.follow`` for a work queue record, polled through ``get`` every ``poll_seconds``.
+
+    Stage events of every attempt are replayed in order, each carrying its
+    ``attempt``; a status event is sent whenever the status changes.
+    """
+    index = 0
+    status = None
+    while True:
+        record = await get()
+        if record is None:
+            return
+        done = record["status"] in ("completed", "failed")
+        changed = record["status"] != status
+        status = record["status"]
+        event = {"event": "status", "status": status, "attempts": record["attempts"]}
+        if status == "completed":
+            event["result"] = record["result"]
+        elif record["error"]:
+            event["error"] = record["error"]
+        if changed and not done:
+            yield event
+        while index < len(record["events"]):
+            yield record["events"][index]
+            index += 1
+        if done:
+            yield event
+            return
+        await asyncio.sleep(poll_seconds)
@@ -1,11 +1,43 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+import time
+
+# Module import is the first measured startup phase
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import (
+    BackgroundTasks, FastAPI, UploadFile, File, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import (
+    FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
+)
+from starlette.concurrency import run_in_threadpool
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import aiofiles
+import asyncio
+import hashlib
 import os
+import json
+import shutil
 import uuid
 from datetime import datetime
-from app.audio_processor import AudioProcessor
-import supabase
+from app.cache import FeatureCache
+from app.detections import DETECTION_METHODS
+from app.encoding import (
+    BINARY_MEDIA_TYPE, COMPACT_MEDIA_TYPE, compact_results, encode_binary, negotiate
+)
+from app.executor import (
+    LISTENER_GRACE_SECONDS, AnalysisExecutor, AnalysisTimeoutError, QueueFullError, run_detect_pattern,
+    run_detect_pattern_streaming, run_detect_patterns, run_fingerprint
+)
+from app.fingerprint import FingerprintIndex
+from app.jobs import Job, JobStore, follow_queued_job, queued_job_to_dict
+from app.memo import ResultMemo, SingleFlight
+from app import metrics
+from app.metrics import RESULT_MEMO_LOOKUPS, Timings, observe_timings, track_request, tracked
+from app.results import analysis_response, analysis_row
+from app.startup import StartupPhases
+from app.storage import AnalysisStore, LocalStore, create_store
+from app.work_queue import COMPLETED, FAILED, WorkQueue, create_work_queue
 from dotenv import load_dotenv
 import logging
 import traceback
@@ -26,19 +58,15 @@ app = FastAPI(
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 PORT = int(os.getenv("PORT", 8000))
 
-# Supabase client initialization
-try:
-    supabase_client = supabase.create_client(
-        supabase_url=os.getenv("SUPABASE_URL"),
-        supabase_key=os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    )
-    # Test the connection
-    supabase_client.table("audio_analysis").select("count", count="exact").limit(1).execute()
-    logger.info("✅ Supabase client initialized successfully")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize Supabase client: {e}")
-    logger.error(f"Full error: {traceback.format_exc()}")
-    supabase_client = None
+# Persistence backend: "supabase", "local" (filesystem + SQLite stand-in for offline use) or "none"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", 20))
+# Storage is pinged in the background after startup, doubling the delay between attempts
+STORAGE_CONNECT_ATTEMPTS = int(os.getenv("STORAGE_CONNECT_ATTEMPTS", 5))
+STORAGE_CONNECT_BACKOFF_SECONDS = float(os.getenv("STORAGE_CONNECT_BACKOFF_SECONDS", 1.0))
+
+store: Optional[AnalysisStore] = create_store(STORAGE_BACKEND, LOCAL_STORAGE_DIR, STORAGE_MAX_CONNECTIONS)
 
 # CORS Configuration - get from environment
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
@@ -52,13 +80,216 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Streaming analysis decodes block by block, so it can accept much larger targets
+STREAM_MAX_FILE_SIZE_MB = int(os.getenv("STREAM_MAX_FILE_SIZE_MB", 2048))
+STREAM_BLOCK_SECONDS = float(os.getenv("STREAM_BLOCK_SECONDS", 30))
+
+# Live WebSocket detection: detector block length and concurrent session cap
+LIVE_BLOCK_SECONDS = float(os.getenv("LIVE_BLOCK_SECONDS", 0.5))
+LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", 16))
+
+# Analysis process pool
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", ANALYSIS_WORKERS * 2))
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", 300))
+ANALYSIS_WARMUP = os.getenv("ANALYSIS_WARMUP", "true").lower() == "true"
+
+# Rate audio is analyzed at: 22050 by default, lower (16000, 8000) for faster speech/jingle
+# detection, or "native" to keep each target's own rate. ANALYSIS_RESAMPLER is "soxr_hq" or "poly";
+# `python -m benchmarks.bench_rates` compares accuracy and time of each
+ANALYSIS_SAMPLE_RATE = os.getenv("ANALYSIS_SAMPLE_RATE", "22050")
+ANALYSIS_RESAMPLER = os.getenv("ANALYSIS_RESAMPLER", "soxr_hq")
+
+# Coarse-to-fine correlation for long targets: decimation factor and candidate threshold
+# trade speed against recall; COARSE_SEARCH_MIN_SECONDS=0 always searches exhaustively
+COARSE_SEARCH_MIN_SECONDS = float(os.getenv("COARSE_SEARCH_MIN_SECONDS", 600))
+COARSE_SEARCH_DECIMATION = int(os.getenv("COARSE_SEARCH_DECIMATION", 8))
+COARSE_SEARCH_THRESHOLD = float(os.getenv("COARSE_SEARCH_THRESHOLD", 0.2))
+
+# Multi-pattern batch analysis
+BATCH_MAX_PATTERNS = int(os.getenv("BATCH_MAX_PATTERNS", 500))
+
+# Upper bounds on the top_k and merge_window request fields
+COMBINE_MAX_TOP_K = int(os.getenv("COMBINE_MAX_TOP_K", 1000))
+COMBINE_MAX_MERGE_WINDOW = float(os.getenv("COMBINE_MAX_MERGE_WINDOW", 10.0))
+
+# Landmark fingerprint index for archive-wide lookups
+FINGERPRINT_DB = os.getenv("FINGERPRINT_DB", "fingerprints/index.db")
+
+# Decoded audio / feature cache shared by all workers
+FEATURE_CACHE_ENABLED = os.getenv("FEATURE_CACHE_ENABLED", "true").lower() == "true"
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "cache")
+FEATURE_CACHE_MAX_MB = int(os.getenv("FEATURE_CACHE_MAX_MB", 2048))
+
+# Store visualization envelopes as base64 float16 in the audio_analysis row instead of
+# number arrays; only enable once every client reading history decodes them
+COMPACT_STORAGE = os.getenv("COMPACT_STORAGE", "false").lower() == "true"
+
+# Results of /api/analyze are remembered by the content of both inputs and the detection
+# parameters, so a repeated analysis returns without running the pipeline again
+RESULT_MEMO_ENABLED = os.getenv("RESULT_MEMO_ENABLED", "true").lower() == "true"
+RESULT_MEMO_DB = os.getenv("RESULT_MEMO_DB", "memo/results.db")
+RESULT_MEMO_TTL_SECONDS = float(os.getenv("RESULT_MEMO_TTL_SECONDS", 86400))
+RESULT_MEMO_MAX_MB = int(os.getenv("RESULT_MEMO_MAX_MB", 256))
+
+# Finished jobs stay queryable for this long
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", 3600))
+
+# Distributed work queue: "sqlite" (workers on this machine), "redis" (workers anywhere) or
+# "none" to analyze in this process's pool. Queued analyses run in `python -m app.worker`
+# processes, which fetch the audio from storage, so the queue needs a storage backend
+WORK_QUEUE_BACKEND = os.getenv("WORK_QUEUE_BACKEND", "none")
+WORK_QUEUE_SQLITE_PATH = os.getenv("WORK_QUEUE_SQLITE_PATH", "queue/jobs.db")
+WORK_QUEUE_REDIS_URL = os.getenv("WORK_QUEUE_REDIS_URL", "redis://localhost:6379/0")
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", 3))
+WORK_QUEUE_RETENTION_SECONDS = float(os.getenv("WORK_QUEUE_RETENTION_SECONDS", 86400))
+# How often /api/analyze and job event streams check on queued analyses
+WORK_QUEUE_POLL_SECONDS = float(os.getenv("WORK_QUEUE_POLL_SECONDS", 0.5))
+
+# Analyses slower than this dump a sampling profile (folded stacks) to PROFILE_DIR; 0 disables profiling
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
 # Directories
 UPLOAD_DIR = "uploads"
 RESULTS_DIR = "results"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
-processor = AudioProcessor()
+feature_cache = FeatureCache(FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_MB * 1024 * 1024) if FEATURE_CACHE_ENABLED else None
+
+processor_options = {
+    "coarse_min_seconds": COARSE_SEARCH_MIN_SECONDS,
+    "coarse_decimation": COARSE_SEARCH_DECIMATION,
+    "coarse_threshold": COARSE_SEARCH_THRESHOLD,
+    "profile_slow_seconds": PROFILE_SLOW_SECONDS,
+    "profile_dir": PROFILE_DIR,
+    "sample_rate": None if ANALYSIS_SAMPLE_RATE == "native" else int(ANALYSIS_SAMPLE_RATE),
+    "resampler": ANALYSIS_RESAMPLER
+}
+executor = AnalysisExecutor(
+    max_workers=ANALYSIS_WORKERS,
+    max_queue=ANALYSIS_QUEUE_SIZE,
+    timeout=ANALYSIS_TIMEOUT_SECONDS,
+    warm_up=ANALYSIS_WARMUP,
+    cache=feature_cache,
+    processor_options=processor_options
+)
+
+fingerprint_index = FingerprintIndex(FINGERPRINT_DB)
+result_memo = ResultMemo(
+    RESULT_MEMO_DB, RESULT_MEMO_TTL_SECONDS, RESULT_MEMO_MAX_MB * 1024 * 1024
+) if RESULT_MEMO_ENABLED else None
+# Identical analyses requested while one is running wait for it instead of running again
+analysis_flights = SingleFlight()
+jobs = JobStore(ttl_seconds=JOB_TTL_SECONDS)
+work_queue: Optional[WorkQueue] = None
+if WORK_QUEUE_BACKEND != "none":
+    if store is None:
+        logger.error("❌ The work queue needs a storage backend; analyses will run in-process")
+    else:
+        work_queue = create_work_queue(
+            WORK_QUEUE_BACKEND, WORK_QUEUE_SQLITE_PATH, WORK_QUEUE_REDIS_URL, WORK_QUEUE_RETENTION_SECONDS
+        )
+        logger.info(f"📬 Analyses are queued for workers ({work_queue.name} queue)")
+job_tasks = set()
+live_sessions = 0
+
+# Readiness waits for warmed analysis workers and the web process's own processor;
+# storage is reported but optional, since analyses still run without it
+startup = StartupPhases(required=("analysis_workers", "processor"))
+startup_tasks = set()
+
+# Used in the web process by streaming and live detection; created on first use
+# so importing this module doesn't import librosa
+_processor = None
+
+def get_processor():
+    global _processor
+    if _processor is None:
+        from app.audio_processor import AudioProcessor
+        _processor = AudioProcessor(cache=feature_cache, **processor_options)
+    return _processor
+
+metrics.Callback("audio_analysis_in_flight", "Analyses running or queued in the worker pool",
+                 lambda: executor.in_flight)
+metrics.Callback("audio_analysis_capacity", "Analyses the worker pool admits at once",
+                 lambda: executor.capacity)
+metrics.Callback("audio_live_sessions", "Open live detection WebSockets", lambda: live_sessions)
+metrics.Callback("audio_analysis_flights", "Distinct analyses running for /api/analyze, after collapsing "
+                 "identical requests", lambda: len(analysis_flights))
+metrics.Callback("audio_ready", "1 once every required startup phase is done", lambda: startup.ready)
+if feature_cache:
+    metrics.Callback("audio_feature_cache_hits_total", "Feature cache hits",
+                     lambda: feature_cache.counters.hits.value, type="counter")
+    metrics.Callback("audio_feature_cache_misses_total", "Feature cache misses",
+                     lambda: feature_cache.counters.misses.value, type="counter")
+
+def run_in_background(coroutine):
+    task = asyncio.create_task(coroutine)
+    startup_tasks.add(task)
+    task.add_done_callback(startup_tasks.discard)
+
+@app.on_event("startup")
+def record_import_time():
+    startup.record("import", time.perf_counter() - IMPORT_STARTED)
+
+async def start_analysis_workers():
+    try:
+        with startup.phase("analysis_workers"):
+            await executor.start()
+    except Exception as e:
+        logger.error(f"❌ Analysis workers failed to start: {e}")
+
+@app.on_event("startup")
+async def start_executor():
+    # Workers import librosa and warm up in the background; the server accepts
+    # connections meanwhile and submitted analyses wait in the pool's queue
+    run_in_background(start_analysis_workers())
+
+async def warm_up_web_processor():
+    def load():
+        processor = get_processor()
+        if ANALYSIS_WARMUP:
+            processor.warm_up()
+    try:
+        with startup.phase("processor"):
+            await run_in_threadpool(load)
+    except Exception as e:
+        logger.error(f"❌ Processor warm-up failed: {e}")
+
+@app.on_event("startup")
+async def warm_up_processor():
+    run_in_background(warm_up_web_processor())
+
+async def connect_storage_with_retry():
+    try:
+        with startup.phase("storage"):
+            if not await store.connect(STORAGE_CONNECT_ATTEMPTS, STORAGE_CONNECT_BACKOFF_SECONDS):
+                raise ConnectionError(f"no answer after {STORAGE_CONNECT_ATTEMPTS} attempts")
+        logger.info(f"✅ {store.name} storage connected")
+    except ConnectionError as e:
+        logger.error(f"❌ {store.name} storage is not responding: {e}")
+
+@app.on_event("startup")
+async def connect_storage():
+    if store is None:
+        logger.warning("⚠️ No storage backend; analyses will not be persisted")
+        return
+    run_in_background(connect_storage_with_retry())
+
+@app.on_event("shutdown")
+def stop_executor():
+    for task in startup_tasks:
+        task.cancel()
+    executor.shutdown()
+
+@app.on_event("shutdown")
+async def close_storage():
+    if store is not None:
+        await store.close()
+    if work_queue is not None:
+        await work_queue.close()
 
 @app.get("/")
 async def root():
@@ -69,33 +300,337 @@ async def root():
         "version": "1.0.0"
     }
 
-@app.post("/api/analyze")
-async def analyze_audio(
-    pattern: UploadFile = File(...),
-    target: UploadFile = File(...),
-    user_id: str = Form(...)
-):
-    """Analyze audio files for pattern detection"""
-    logger.info(f"🎵 Received analysis request from user: {user_id}")
-    
+ALLOWED_EXTENSIONS = {'.mp3', '.wav', '.ogg', '.m4a', '.aac', '.flac'}
+MAX_FILE_SIZE = 50 * 1024 * 1024
+
+# Uploads are written to disk this many bytes at a time
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+def validate_analysis_request(pattern: UploadFile, target: UploadFile, user_id: str) -> Tuple[str, str]:
+    """Shared validation for analysis endpoints; returns the pattern and target extensions"""
     if not user_id or user_id == "None":
         raise HTTPException(status_code=400, detail="User ID is required")
     
     # Validate file types
-    allowed_extensions = {'.mp3', '.wav', '.ogg', '.m4a', '.aac', '.flac'}
     pattern_ext = os.path.splitext(pattern.filename)[1].lower()
     target_ext = os.path.splitext(target.filename)[1].lower()
     
-    if pattern_ext not in allowed_extensions or target_ext not in allowed_extensions:
+    if pattern_ext not in ALLOWED_EXTENSIONS or target_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Unsupported file format")
     
-    # Validate file size (50MB max)
-    max_size = 50 * 1024 * 1024
-    if pattern.size > max_size or target.size > max_size:
-        raise HTTPException(status_code=400, detail="File size too large. Maximum 50MB per file.")
+    # File size (50MB max) is enforced by save_upload as the bytes are written
+    return pattern_ext, target_ext
+
+def parse_methods(methods: Optional[str]) -> Tuple[Optional[List[str]], bool]:
+    """
+    Parse the ``methods`` form field: a comma-separated list of detection
+    methods, optionally including ``adaptive``. Returns (methods, adaptive);
+    methods is None when every method should run.
+    """
+    if not methods:
+        return None, False
+    
+    names = [name.strip().lower() for name in methods.split(",") if name.strip()]
+    adaptive = "adaptive" in names
+    names = [name for name in names if name != "adaptive"]
+    # Checked against the static list: building the processor here would import librosa on the event loop
+    unknown = [name for name in names if name not in DETECTION_METHODS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown detection method(s): {', '.join(unknown)}. Available: {', '.join(DETECTION_METHODS)}, adaptive"
+        )
+    
+    return names or None, adaptive
+
+def parse_combine_options(top_k: Optional[int], merge_window: Optional[float]) -> Dict:
+    """
+    Validate the ``top_k`` and ``merge_window`` form fields. Returns the
+    keyword arguments to pass on; fields left out keep the processor defaults.
+    """
+    options = {}
+    if top_k is not None:
+        if not 1 <= top_k <= COMBINE_MAX_TOP_K:
+            raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {COMBINE_MAX_TOP_K}")
+        options["top_k"] = top_k
+    if merge_window is not None:
+        if not 0 <= merge_window <= COMBINE_MAX_MERGE_WINDOW:
+            raise HTTPException(
+                status_code=400, detail=f"merge_window must be between 0 and {COMBINE_MAX_MERGE_WINDOW} seconds"
+            )
+        options["merge_window"] = merge_window
+    return options
+
+async def save_upload(upload: UploadFile, path: str, max_bytes: int = MAX_FILE_SIZE) -> str:
+    """
+    Stream an upload to ``path`` in ``UPLOAD_CHUNK_BYTES`` chunks; returns the hex SHA-256 of its bytes.
+    
+    Only one chunk is held in memory at a time. The size limit is checked as
+    bytes arrive, so an oversized or unsized upload is cut off and removed
+    with a 413 rather than trusting ``UploadFile.size``.
+    """
+    written = 0
+    digest = hashlib.sha256()
+    try:
+        async with aiofiles.open(path, "wb") as buffer:
+            while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File size too large. Maximum {max_bytes // (1024 * 1024)}MB per file."
+                    )
+                digest.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        remove_files(path)
+        raise
+    return digest.hexdigest()
+
+def remove_files(*paths: Optional[str]):
+    """Cleanup temporary files"""
+    for file_path in paths:
+        if file_path and os.path.exists(file_path):
+            try:
+                os.remove(file_path)
+            except Exception as e:
+                logger.warning(f"Could not remove temporary file {file_path}: {e}")
+
+def link_input(path: str) -> str:
+    """A second name for an uploaded file, so another owner can remove it independently"""
+    base, ext = os.path.splitext(path)
+    linked = f"{base}_{uuid.uuid4().hex[:8]}{ext}"
+    try:
+        os.link(path, linked)
+    except OSError:
+        shutil.copyfile(path, linked)
+    return linked
+
+def queue_full_error(e: QueueFullError) -> HTTPException:
+    logger.warning(f"⏳ Rejecting analysis, queue full: {e}")
+    return HTTPException(
+        status_code=503,
+        detail="Analysis queue is full. Please retry shortly.",
+        headers={"Retry-After": "30"}
+    )
+
+def render_results(request: Request, payload: Dict):
+    """
+    Encode analysis results as the client's ``Accept`` header asks.
+    
+    Plain JSON (the default) carries visualization envelopes as number arrays;
+    ``COMPACT_MEDIA_TYPE`` carries them as base64 little-endian arrays and
+    ``BINARY_MEDIA_TYPE`` as raw bytes after a JSON header. Both compact forms
+    take a ``dtype=float16|float32`` parameter.
+    """
+    media_type, dtype = negotiate(request.headers.get("accept"))
+    if media_type == COMPACT_MEDIA_TYPE:
+        return JSONResponse(compact_results(payload, dtype), media_type=COMPACT_MEDIA_TYPE)
+    if media_type == BINARY_MEDIA_TYPE:
+        return Response(encode_binary(payload, dtype), media_type=BINARY_MEDIA_TYPE)
+    return payload
+
+def input_storage_path(user_id: str, local_path: str, sha256: str) -> str:
+    """Inputs are stored by content, so a user's repeated uploads of one file share a single copy"""
+    return f"{user_id}/{sha256}{os.path.splitext(local_path)[1]}"
+
+async def upload_input(storage_path: str, local_path: str) -> str:
+    """Upload a file unless its content-addressed ``storage_path`` is already stored; returns its URL"""
+    if await store.exists(storage_path):
+        return store.public_url(storage_path)
+    return await store.upload(storage_path, local_path)
+
+async def persist_analysis(user_id: str, pattern_path: str, target_path: str, pattern_sha256: str,
+                           target_sha256: str) -> Tuple[Optional[str], Optional[str]]:
+    """Upload both files to storage concurrently; returns (pattern_url, target_url)"""
+    if store is None:
+        return None, None
+    
+    try:
+        logger.info(f"☁️ Uploading to {store.name} storage...")
+        pattern_url, target_url = await asyncio.gather(
+            upload_input(input_storage_path(user_id, pattern_path, pattern_sha256), pattern_path),
+            upload_input(input_storage_path(user_id, target_path, target_sha256), target_path)
+        )
+        logger.info(f"Pattern URL: {pattern_url}")
+        logger.info(f"Target URL: {target_url}")
+        return pattern_url, target_url
+    except Exception as e:
+        logger.error(f"❌ Storage upload failed: {e}")
+        logger.error(f"Full storage error: {traceback.format_exc()}")
+        # Continue without storage, and don't save to the database
+        return None, None
+
+async def record_analysis(row: Dict):
+    """Insert an analysis row; run after the response is sent, so failures are only logged"""
+    timings = Timings()
+    try:
+        logger.info("💾 Saving analysis to database...")
+        with timings.span("db_insert"):
+            await store.insert_analysis(row)
+        logger.info("✅ Analysis saved to database successfully")
+        observe_timings(timings.to_dict())
+    except Exception as e:
+        logger.error(f"❌ Database insert failed for {row['analysis_id']}: {e}")
+        logger.error(f"Full database error: {traceback.format_exc()}")
+
+def build_analysis_response(analysis_id: str, pattern_filename: str, target_filename: str, results: Dict,
+                            pattern_url: Optional[str], target_url: Optional[str],
+                            timings: Optional[Timings] = None) -> Dict:
+    return analysis_response(
+        analysis_id, pattern_filename, target_filename, results, pattern_url, target_url,
+        saved=store is not None and target_url is not None,
+        timings=timings.to_dict() if timings is not None else None
+    )
+
+def parse_analysis_id(analysis_id: Optional[str]) -> str:
+    """A client-chosen analysis_id (a UUID) makes resubmitting the same job safe; otherwise a new one"""
+    if not analysis_id:
+        return str(uuid.uuid4())
+    try:
+        return str(uuid.UUID(analysis_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="analysis_id must be a UUID")
+
+async def enqueue_analysis(analysis_id: str, user_id: str, pattern_filename: str, target_filename: str,
+                           pattern_path: str, target_path: str, pattern_sha256: str, target_sha256: str,
+                           method_names: Optional[List[str]], adaptive: bool, combine_options: Dict,
+                           request_timings: Timings, include_timings: bool) -> bool:
+    """
+    Upload both saved files to storage and queue their analysis for a worker.
+    Returns False if a job with this analysis_id was already queued.
+    """
+    pattern_storage_path = input_storage_path(user_id, pattern_path, pattern_sha256)
+    target_storage_path = input_storage_path(user_id, target_path, target_sha256)
+    try:
+        logger.info(f"☁️ Uploading to {store.name} storage...")
+        with request_timings.span("storage_upload"):
+            pattern_url, target_url = await asyncio.gather(
+                upload_input(pattern_storage_path, pattern_path),
+                upload_input(target_storage_path, target_path)
+            )
+    except Exception as e:
+        # Workers read the audio from storage, so there is nothing to queue without it
+        logger.error(f"❌ Storage upload failed: {e}")
+        logger.error(f"Full storage error: {traceback.format_exc()}")
+        raise HTTPException(status_code=503, detail="Storage is unavailable. Please retry shortly.",
+                            headers={"Retry-After": "30"})
+    
+    return await work_queue.enqueue(analysis_id, {
+        "user_id": user_id,
+        "pattern_filename": pattern_filename,
+        "target_filename": target_filename,
+        "pattern_storage_path": pattern_storage_path,
+        "target_storage_path": target_storage_path,
+        "pattern_url": pattern_url,
+        "target_url": target_url,
+        "methods": method_names,
+        "adaptive": adaptive,
+        "combine_options": combine_options,
+        "timings": request_timings.to_dict() if include_timings else None,
+        "enqueued_at": time.time()
+    }, WORK_QUEUE_MAX_ATTEMPTS)
+
+async def wait_for_queued_analysis(analysis_id: str) -> Dict:
+    """Poll the work queue until a worker finishes the analysis; 504 after ANALYSIS_TIMEOUT_SECONDS"""
+    deadline = time.monotonic() + ANALYSIS_TIMEOUT_SECONDS
+    while True:
+        record = await work_queue.get(analysis_id)
+        if record is None:
+            raise HTTPException(status_code=500, detail="Analysis failed: job disappeared from the queue")
+        if record["status"] == COMPLETED:
+            return record["result"]
+        if record["status"] == FAILED:
+            raise HTTPException(status_code=500, detail=record["error"])
+        if time.monotonic() > deadline:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Analysis is still running after {ANALYSIS_TIMEOUT_SECONDS:.0f}s; "
+                       f"follow it at /api/jobs/{analysis_id}"
+            )
+        await asyncio.sleep(WORK_QUEUE_POLL_SECONDS)
+
+def analysis_memo_key(pattern_sha256: str, target_sha256: str, method_names: Optional[List[str]],
+                      adaptive: bool, combine_options: Dict) -> str:
+    """Everything /api/analyze results depend on: both inputs, the request's parameters and the analysis settings"""
+    return ResultMemo.key(
+        pattern_sha256, target_sha256,
+        methods=sorted(method_names or []),
+        adaptive=adaptive,
+        combine=combine_options,
+        coarse=[COARSE_SEARCH_MIN_SECONDS, COARSE_SEARCH_DECIMATION, COARSE_SEARCH_THRESHOLD],
+        rate=[ANALYSIS_SAMPLE_RATE, ANALYSIS_RESAMPLER]
+    )
+
+async def memoized_analysis(memo_key: str, inputs: List[str],
+                            compute: Callable[..., Awaitable[Dict]]) -> Tuple[Dict, str]:
+    """
+    Results for ``memo_key``: remembered from an earlier analysis ("hit"), awaited from an
+    identical analysis already running ("shared"), or computed and remembered ("miss").
+    Returns the results and which of the three it was.
+    
+    A computation outlives the request that started it when that request goes away,
+    so it runs ``compute(*inputs)`` on its own links to the input files and removes
+    them when it finishes; callers remove their own files whenever they like.
+    """
+    if result_memo is not None:
+        results = await run_in_threadpool(result_memo.get, memo_key)
+        if results is not None:
+            RESULT_MEMO_LOOKUPS.inc(outcome="hit")
+            return results, "hit"
+    
+    flight_inputs = [link_input(path) for path in inputs]
+    taken = False
+    
+    async def compute_and_remember() -> Dict:
+        try:
+            results = await compute(*flight_inputs)
+        finally:
+            remove_files(*flight_inputs)
+        if result_memo is not None:
+            try:
+                await run_in_threadpool(result_memo.put, memo_key, results)
+            except Exception as e:
+                logger.warning(f"Could not memoize results: {e}")
+        return results
+    
+    def start_flight() -> Awaitable[Dict]:
+        nonlocal taken
+        taken = True
+        return compute_and_remember()
+    
+    try:
+        results, shared = await analysis_flights.do(memo_key, start_flight)
+    finally:
+        if not taken:
+            remove_files(*flight_inputs)
+    outcome = "shared" if shared else "miss"
+    RESULT_MEMO_LOOKUPS.inc(outcome=outcome)
+    return results, outcome
+
+@app.post("/api/analyze")
+@tracked("analyze")
+async def analyze_audio(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    pattern: UploadFile = File(...),
+    target: UploadFile = File(...),
+    user_id: str = Form(...),
+    methods: Optional[str] = Form(None),
+    top_k: Optional[int] = Form(None),
+    merge_window: Optional[float] = Form(None),
+    timings: bool = Form(False)
+):
+    """Analyze audio files for pattern detection"""
+    logger.info(f"🎵 Received analysis request from user: {user_id}")
+    
+    pattern_ext, target_ext = validate_analysis_request(pattern, target, user_id)
+    method_names, adaptive = parse_methods(methods)
+    combine_options = parse_combine_options(top_k, merge_window)
     
     pattern_path = None
     target_path = None
+    request_timings = Timings()
     
     try:
         analysis_id = str(uuid.uuid4())
@@ -103,185 +638,660 @@ async def analyze_audio(
         # Save files temporarily
         pattern_path = os.path.join(UPLOAD_DIR, f"{analysis_id}_pattern{pattern_ext}")
         target_path = os.path.join(UPLOAD_DIR, f"{analysis_id}_target{target_ext}")
+        with request_timings.span("save_uploads"):
+            pattern_sha256 = await save_upload(pattern, pattern_path)
+            target_sha256 = await save_upload(target, target_path)
         
-        # Save uploaded files
-        with open(pattern_path, "wb") as buffer:
-            content = await pattern.read()
-            buffer.write(content)
+        async def compute(pattern_path: str, target_path: str) -> Dict:
+            if work_queue is not None:
+                await enqueue_analysis(
+                    analysis_id, user_id, pattern.filename, target.filename, pattern_path, target_path,
+                    pattern_sha256, target_sha256, method_names, adaptive, combine_options, request_timings, timings
+                )
+                return await wait_for_queued_analysis(analysis_id)
+            
+            # Process audio in the worker pool so the event loop stays responsive
+            logger.info("🔍 Starting audio processing...")
+            try:
+                return await executor.submit(
+                    run_detect_pattern, pattern_path, target_path, method_names, adaptive, combine_options
+                )
+            except QueueFullError as e:
+                raise queue_full_error(e)
+            except AnalysisTimeoutError as e:
+                logger.error(f"⏱️ {e}")
+                raise HTTPException(status_code=504, detail=str(e))
         
-        with open(target_path, "wb") as buffer:
-            content = await target.read()
-            buffer.write(content)
+        memo_key = analysis_memo_key(pattern_sha256, target_sha256, method_names, adaptive, combine_options)
+        results, outcome = await memoized_analysis(memo_key, [pattern_path, target_path], compute)
+        if outcome == "miss" and work_queue is not None:
+            # The worker saved the analysis and built its response
+            return render_results(request, results)
+        if outcome == "miss":
+            logger.info(f"✅ Processing complete. Found {results['detection_count']} detections")
+            request_timings.update(results.get("timings"))
+        else:
+            logger.info(f"♻️ Reusing results of an identical analysis ({outcome})")
         
-        # Process audio
-        logger.info("🔍 Starting audio processing...")
-        results = processor.detect_pattern(pattern_path, target_path)
-        logger.info(f"✅ Processing complete. Found {results['detection_count']} detections")
+        with request_timings.span("storage_upload"):
+            pattern_url, target_url = await persist_analysis(
+                user_id, pattern_path, target_path, pattern_sha256, target_sha256
+            )
+        if target_url is not None:
+            background_tasks.add_task(record_analysis, analysis_row(
+                user_id, analysis_id, pattern.filename, target.filename, results, pattern_url, target_url,
+                compact=COMPACT_STORAGE
+            ))
+        observe_timings(request_timings.to_dict())
         
-        # Upload to Supabase Storage
-        target_url = None
-        pattern_url = None
+        return render_results(
+            request,
+            build_analysis_response(
+                analysis_id, pattern.filename, target.filename, results, pattern_url, target_url,
+                request_timings if timings else None
+            )
+        )
         
-        if supabase_client:
-            try:
-                logger.info("☁️ Uploading to Supabase Storage...")
-                
-                # Upload pattern file
-                with open(pattern_path, "rb") as pattern_file:
-                    pattern_data = pattern_file.read()
-                    pattern_storage_path = f"{user_id}/{analysis_id}_pattern{pattern_ext}"
-                    
-                    upload_response = supabase_client.storage.from_("audio-analysis-files").upload(
-                        pattern_storage_path,
-                        pattern_data
-                    )
-                    logger.info(f"Pattern upload response: {upload_response}")
-                    
-                    # Get public URL for pattern
-                    pattern_url = supabase_client.storage.from_("audio-analysis-files").get_public_url(pattern_storage_path)
-                    logger.info(f"Pattern URL: {pattern_url}")
-                
-                # Upload target file
-                with open(target_path, "rb") as target_file:
-                    target_data = target_file.read()
-                    target_storage_path = f"{user_id}/{analysis_id}_target{target_ext}"
-                    
-                    upload_response = supabase_client.storage.from_("audio-analysis-files").upload(
-                        target_storage_path,
-                        target_data
-                    )
-                    logger.info(f"Target upload response: {upload_response}")
-                    
-                    # Get public URL for target
-                    target_url = supabase_client.storage.from_("audio-analysis-files").get_public_url(target_storage_path)
-                    logger.info(f"Target URL: {target_url}")
-                
-                # Store in database
-                logger.info("💾 Saving analysis to database...")
-                analysis_data = {
-                    "user_id": user_id,
-                    "analysis_id": analysis_id,
-                    "pattern_filename": pattern.filename,
-                    "target_filename": target.filename,
-                    "pattern_url": pattern_url,
-                    "target_url": target_url,
-                    "detection_count": results["detection_count"],
-                    "detections": results["detections"],
-                    "pattern_duration": results["pattern_duration"],
-                    "target_duration": results["target_duration"],
-                    "sample_rate": results["sample_rate"],
-                    "waveform_data": results["waveform_data"],
-                    "correlation_data": results["correlation_data"],
-                    "analysis_methods": results.get("analysis_methods", ["correlation"]),
-                    "created_at": datetime.now().isoformat()
-                }
-                
-                db_response = supabase_client.table("audio_analysis").insert(analysis_data).execute()
-                
-                if hasattr(db_response, 'error') and db_response.error:
-                    logger.error(f"Database error: {db_response.error}")
-                    raise Exception(f"Database insert failed: {db_response.error}")
-                else:
-                    logger.info("✅ Analysis saved to database successfully")
-                    
-            except Exception as e:
-                logger.error(f"❌ Supabase operation failed: {e}")
-                logger.error(f"Full Supabase error: {traceback.format_exc()}")
-                # Continue without Supabase storage but don't save to database
-                target_url = None
-                pattern_url = None
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Analysis error: {str(e)}")
+        logger.error(f"Full analysis error: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    finally:
+        remove_files(pattern_path, target_path)
+
+@app.post("/api/analyze/batch")
+@tracked("batch")
+async def analyze_audio_batch(
+    request: Request,
+    patterns: List[UploadFile] = File(...),
+    target: UploadFile = File(...),
+    user_id: str = Form(...),
+    top_k: Optional[int] = Form(None),
+    merge_window: Optional[float] = Form(None)
+):
+    """Correlate many patterns against one target in a single pass"""
+    logger.info(f"🎵 Received batch analysis of {len(patterns)} patterns from user: {user_id}")
+    
+    if len(patterns) > BATCH_MAX_PATTERNS:
+        raise HTTPException(status_code=400, detail=f"Too many patterns. Maximum {BATCH_MAX_PATTERNS} per request.")
+    
+    extensions = [validate_analysis_request(pattern, target, user_id) for pattern in patterns]
+    combine_options = parse_combine_options(top_k, merge_window)
+    target_ext = os.path.splitext(target.filename)[1].lower()
+    
+    analysis_id = str(uuid.uuid4())
+    target_path = os.path.join(UPLOAD_DIR, f"{analysis_id}_target{target_ext}")
+    pattern_paths = [
+        os.path.join(UPLOAD_DIR, f"{analysis_id}_pattern{index}{pattern_ext}")
+        for index, (pattern_ext, _) in enumerate(extensions)
+    ]
+    
+    try:
+        for pattern, pattern_path in zip(patterns, pattern_paths):
+            await save_upload(pattern, pattern_path)
+        await save_upload(target, target_path)
         
-        return {
+        try:
+            results = await executor.submit(run_detect_patterns, pattern_paths, target_path, combine_options)
+        except QueueFullError as e:
+            raise queue_full_error(e)
+        except AnalysisTimeoutError as e:
+            logger.error(f"⏱️ {e}")
+            raise HTTPException(status_code=504, detail=str(e))
+        
+        return render_results(request, {
             "analysis_id": analysis_id,
             "timestamp": datetime.now().isoformat(),
-            "pattern_filename": pattern.filename,
             "target_filename": target.filename,
-            "detection_count": results["detection_count"],
-            "detections": results["detections"],
-            "pattern_duration": results["pattern_duration"],
-            "target_duration": results["target_duration"],
-            "sample_rate": results["sample_rate"],
-            "waveform_data": results["waveform_data"],
-            "correlation_data": results["correlation_data"],
-            "analysis_methods": results.get("analysis_methods", ["correlation"]),
-            "target_url": target_url,
-            "pattern_url": pattern_url,
-            "supabase_saved": supabase_client is not None and target_url is not None
-        }
+            "pattern_count": len(patterns),
+            "results": [
+                build_analysis_response(f"{analysis_id}:{index}", pattern.filename, target.filename, result, None, None)
+                for index, (pattern, result) in enumerate(zip(patterns, results))
+            ]
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"❌ Analysis error: {str(e)}")
-        logger.error(f"Full analysis error: {traceback.format_exc()}")
+        logger.error(f"❌ Batch analysis error: {str(e)}")
+        logger.error(f"Full batch analysis error: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
     finally:
-        # Cleanup temporary files
-        for file_path in [pattern_path, target_path]:
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    logger.warning(f"Could not remove temporary file {file_path}: {e}")
+        remove_files(target_path, *pattern_paths)
+
+async def fingerprint_upload(upload: UploadFile) -> Dict:
+    """Save an upload, extract its landmarks in the worker pool and remove it"""
+    ext = os.path.splitext(upload.filename)[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+    
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_fingerprint{ext}")
+    try:
+        await save_upload(upload, path)
+        return await executor.submit(run_fingerprint, path)
+    except QueueFullError as e:
+        raise queue_full_error(e)
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    finally:
+        remove_files(path)
+
+@app.post("/api/fingerprint/ingest")
+async def ingest_fingerprint(
+    recording: UploadFile = File(...),
+    name: Optional[str] = Form(None)
+):
+    """Add a recording's landmarks to the archive index"""
+    landmarks = await fingerprint_upload(recording)
+    recording_id = await run_in_threadpool(
+        fingerprint_index.add,
+        name or recording.filename,
+        landmarks["hashes"],
+        landmarks["frames"],
+        landmarks["duration"],
+        landmarks["sample_rate"],
+        landmarks["hop_length"]
+    )
+    logger.info(f"🧬 Indexed {recording.filename} as recording {recording_id}")
+    return {
+        "recording_id": recording_id,
+        "name": name or recording.filename,
+        "landmark_count": int(len(landmarks["hashes"])),
+        "duration": landmarks["duration"]
+    }
+
+@app.post("/api/fingerprint/query")
+async def query_fingerprint(
+    pattern: UploadFile = File(...),
+    top_k: int = Form(10),
+    min_votes: int = Form(5)
+):
+    """Find archived recordings containing the pattern, with the offset where it occurs"""
+    landmarks = await fingerprint_upload(pattern)
+    matches = await run_in_threadpool(
+        fingerprint_index.query, landmarks["hashes"], landmarks["frames"], top_k, min_votes
+    )
+    return {
+        "pattern_filename": pattern.filename,
+        "landmark_count": int(len(landmarks["hashes"])),
+        "match_count": len(matches),
+        "matches": matches
+    }
+
+async def run_analysis_job(job: Job, result_future: asyncio.Future, pattern_filename: str,
+                           target_filename: str, pattern_path: str, target_path: str, pattern_sha256: str,
+                           target_sha256: str, request_timings: Timings, include_timings: bool = False):
+    """Await a submitted analysis, persist it and record the outcome on the job"""
+    try:
+        with track_request("jobs"):
+            results = await result_future
+            logger.info(f"✅ Job {job.analysis_id} processed. Found {results['detection_count']} detections")
+            request_timings.update(results.get("timings"))
+            
+            with request_timings.span("storage_upload"):
+                pattern_url, target_url = await persist_analysis(
+                    job.user_id, pattern_path, target_path, pattern_sha256, target_sha256
+                )
+            if target_url is not None:
+                await record_analysis(analysis_row(
+                    job.user_id, job.analysis_id, pattern_filename, target_filename, results, pattern_url, target_url,
+                    compact=COMPACT_STORAGE
+                ))
+            observe_timings(request_timings.to_dict())
+            response = build_analysis_response(
+                job.analysis_id, pattern_filename, target_filename, results, pattern_url, target_url,
+                request_timings if include_timings else None
+            )
+        job.complete_stage("persist", {"supabase_saved": response["supabase_saved"]})
+        job.complete(response)
+    except Exception as e:
+        logger.error(f"❌ Job {job.analysis_id} failed: {str(e)}")
+        logger.error(f"Full job error: {traceback.format_exc()}")
+        job.fail(f"Analysis failed: {str(e)}")
+    finally:
+        remove_files(pattern_path, target_path)
+
+@app.post("/api/jobs", status_code=202)
+async def submit_analysis_job(
+    pattern: UploadFile = File(...),
+    target: UploadFile = File(...),
+    user_id: str = Form(...),
+    methods: Optional[str] = Form(None),
+    top_k: Optional[int] = Form(None),
+    merge_window: Optional[float] = Form(None),
+    timings: bool = Form(False),
+    analysis_id: Optional[str] = Form(None)
+):
+    """
+    Queue an analysis and return immediately; poll or subscribe for progress.
+    Resubmitting with the same ``analysis_id`` returns the existing job instead of running it again.
+    """
+    logger.info(f"🎵 Received analysis job from user: {user_id}")
+    
+    pattern_ext, target_ext = validate_analysis_request(pattern, target, user_id)
+    method_names, adaptive = parse_methods(methods)
+    combine_options = parse_combine_options(top_k, merge_window)
+    analysis_id = parse_analysis_id(analysis_id)
+    
+    if work_queue is not None:
+        existing = await work_queue.get(analysis_id)
+        if existing:
+            return job_links(analysis_id, existing["status"])
+    else:
+        existing = jobs.get(analysis_id)
+        if existing:
+            return job_links(analysis_id, existing.status)
+        if not executor.has_capacity():
+            raise queue_full_error(QueueFullError("no free analysis slots"))
+    
+    pattern_path = os.path.join(UPLOAD_DIR, f"{analysis_id}_pattern{pattern_ext}")
+    target_path = os.path.join(UPLOAD_DIR, f"{analysis_id}_target{target_ext}")
+    request_timings = Timings()
+    try:
+        with request_timings.span("save_uploads"):
+            pattern_sha256 = await save_upload(pattern, pattern_path)
+            target_sha256 = await save_upload(target, target_path)
+    except BaseException:
+        remove_files(pattern_path, target_path)
+        raise
+    
+    if work_queue is not None:
+        try:
+            await enqueue_analysis(
+                analysis_id, user_id, pattern.filename, target.filename, pattern_path, target_path,
+                pattern_sha256, target_sha256, method_names, adaptive, combine_options, request_timings, timings
+            )
+        finally:
+            remove_files(pattern_path, target_path)
+        record = await work_queue.get(analysis_id)
+        return job_links(analysis_id, record["status"])
+    
+    job = jobs.create(analysis_id, user_id)
+    try:
+        result_future = executor.submit(
+            run_detect_pattern, pattern_path, target_path, method_names, adaptive, combine_options,
+            progress=job.complete_stage
+        )
+    except QueueFullError as e:
+        jobs.discard(analysis_id)
+        remove_files(pattern_path, target_path)
+        raise queue_full_error(e)
+    
+    task = asyncio.create_task(run_analysis_job(
+        job, result_future, pattern.filename, target.filename, pattern_path, target_path, pattern_sha256,
+        target_sha256, request_timings, timings
+    ))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    
+    return job_links(analysis_id, job.status)
+
+def job_links(analysis_id: str, status: str) -> Dict:
+    return {
+        "analysis_id": analysis_id,
+        "status": status,
+        "status_url": f"/api/jobs/{analysis_id}",
+        "events_url": f"/api/jobs/{analysis_id}/events"
+    }
+
+@app.get("/api/jobs/{analysis_id}")
+async def get_analysis_job(analysis_id: str, request: Request):
+    """Job status, completed stages, partial detections and, once done, the full result"""
+    if work_queue is not None:
+        record = await work_queue.get(analysis_id)
+        if not record:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return render_results(request, queued_job_to_dict(record))
+    
+    job = jobs.get(analysis_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return render_results(request, job.to_dict())
+
+@app.get("/api/jobs/{analysis_id}/events")
+async def stream_analysis_job(analysis_id: str):
+    """Server-sent events for each stage as it finishes, ending with the final status"""
+    if work_queue is not None:
+        if not await work_queue.get(analysis_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        followed = follow_queued_job(lambda: work_queue.get(analysis_id), WORK_QUEUE_POLL_SECONDS)
+    else:
+        job = jobs.get(analysis_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        followed = job.follow()
+    
+    async def events():
+        async for event in followed:
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/analyze/stream")
+async def analyze_audio_stream(
+    pattern: UploadFile = File(...),
+    target: UploadFile = File(...),
+    user_id: str = Form(...)
+):
+    """Correlation-only analysis of long targets, streamed back as NDJSON events"""
+    logger.info(f"🌊 Received streaming analysis request from user: {user_id}")
+    
+    if not user_id or user_id == "None":
+        raise HTTPException(status_code=400, detail="User ID is required")
+    
+    # Block decoding goes through libsndfile, which cannot read m4a/aac
+    allowed_extensions = {'.mp3', '.wav', '.ogg', '.flac'}
+    pattern_ext = os.path.splitext(pattern.filename)[1].lower()
+    target_ext = os.path.splitext(target.filename)[1].lower()
+    
+    if pattern_ext not in allowed_extensions or target_ext not in allowed_extensions:
+        raise HTTPException(status_code=400, detail="Unsupported file format for streaming analysis")
+    if not executor.has_capacity():
+        raise queue_full_error(QueueFullError("no free analysis slots"))
+    
+    analysis_id = str(uuid.uuid4())
+    pattern_path = os.path.join(UPLOAD_DIR, f"{analysis_id}_pattern{pattern_ext}")
+    target_path = os.path.join(UPLOAD_DIR, f"{analysis_id}_target{target_ext}")
+    
+    max_size = STREAM_MAX_FILE_SIZE_MB * 1024 * 1024
+    try:
+        await save_upload(pattern, pattern_path, max_size)
+        await save_upload(target, target_path, max_size)
+    except BaseException:
+        remove_files(pattern_path, target_path)
+        raise
+    
+    # Detections arrive as progress events from the worker; the summary is the job's result
+    detections: asyncio.Queue = asyncio.Queue()
+    try:
+        summary_future = executor.submit(
+            run_detect_pattern_streaming, pattern_path, target_path, STREAM_BLOCK_SECONDS,
+            progress=lambda stage, event: detections.put_nowait(event)
+        )
+    except QueueFullError as e:
+        remove_files(pattern_path, target_path)
+        raise queue_full_error(e)
+    # The worker keeps reading the files after a client disconnects, so clean up when it is done
+    summary_future.add_done_callback(lambda _: remove_files(pattern_path, target_path))
+    
+    async def events():
+        yield json.dumps({"type": "started", "analysis_id": analysis_id}) + "\n"
+        try:
+            sent = 0
+            while not summary_future.done():
+                next_detection = asyncio.ensure_future(detections.get())
+                await asyncio.wait({next_detection, summary_future}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_detection.done():
+                    next_detection.cancel()
+                    break
+                yield json.dumps(next_detection.result()) + "\n"
+                sent += 1
+            summary = summary_future.result()
+            # Progress events travel on a different pipe than the result and may still be in transit
+            while sent < summary["detection_count"]:
+                yield json.dumps(await asyncio.wait_for(detections.get(), LISTENER_GRACE_SECONDS)) + "\n"
+                sent += 1
+            yield json.dumps(summary) + "\n"
+        except Exception as e:
+            logger.error(f"❌ Streaming analysis error: {str(e)}")
+            logger.error(f"Full streaming analysis error: {traceback.format_exc()}")
+            yield json.dumps({"type": "error", "detail": f"Analysis failed: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/detect")
+async def live_detection(
+    websocket: WebSocket,
+    sample_rate: int = 22050,
+    channels: int = 1,
+    sample_format: str = "f32le",
+    pattern_format: str = "wav",
+    threshold: float = 0.6
+):
+    """
+    Live pattern detection over a raw PCM stream.
+    
+    After connecting, send the pattern as one binary message holding an audio
+    file in ``pattern_format``, then the stream as binary PCM chunks described
+    by the query parameters. The server answers with a ``ready`` event, a
+    ``chunk`` event per chunk reporting its processing time, and ``detection``
+    events as soon as they are final. Send ``{"type": "end"}`` to flush the
+    last detection and close.
+    """
+    global live_sessions
+    await websocket.accept()
+    if live_sessions >= LIVE_MAX_SESSIONS:
+        await websocket.send_json({"type": "error", "detail": "Too many live sessions. Please retry shortly."})
+        await websocket.close(code=1013)
+        return
+    
+    live_sessions += 1
+    pattern_path = None
+    try:
+        pattern_ext = "." + pattern_format.lower().lstrip(".")
+        if pattern_ext not in ALLOWED_EXTENSIONS:
+            raise ValueError("Unsupported pattern format")
+        from app.streaming import PcmStream
+        pcm = PcmStream(sample_format, channels, sample_rate, get_processor().live_sample_rate)
+        
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        if message.get("bytes") is None:
+            raise ValueError("Expected the pattern audio file as a binary message")
+        if len(message["bytes"]) > MAX_FILE_SIZE:
+            raise ValueError("Pattern too large. Maximum 50MB.")
+        
+        pattern_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_live_pattern{pattern_ext}")
+        with open(pattern_path, "wb") as buffer:
+            buffer.write(message["bytes"])
+        detector = await run_in_threadpool(get_processor().live_detector, pattern_path, LIVE_BLOCK_SECONDS, threshold)
+        pattern_duration = len(detector.pattern) / detector.sr
+        logger.info(f"📡 Live detection session started ({pattern_duration:.2f}s pattern)")
+        await websocket.send_json({
+            "type": "ready",
+            "pattern_duration": pattern_duration,
+            "sample_rate": detector.sr,
+            "block_seconds": LIVE_BLOCK_SECONDS
+        })
+        
+        async def send_detections(detections: List[Dict]):
+            stream_time = detector.samples_seen / detector.sr
+            for detection in detections:
+                # Stream time between the end of the match and its detection being final
+                latency = stream_time - detection["time"] - pattern_duration
+                await websocket.send_json({"type": "detection", **detection, "latency": round(latency, 3)})
+        
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            
+            if message.get("bytes") is not None:
+                started = time.perf_counter()
+                samples = pcm.decode(message["bytes"])
+                detections = await run_in_threadpool(detector.push, samples)
+                elapsed = time.perf_counter() - started
+                
+                await send_detections(detections)
+                chunk_seconds = len(samples) / detector.sr
+                await websocket.send_json({
+                    "type": "chunk",
+                    "samples": len(samples),
+                    "stream_time": detector.samples_seen / detector.sr,
+                    "processing_ms": round(elapsed * 1000, 3),
+                    # Below 1 the server keeps up with real time
+                    "realtime_factor": round(elapsed / chunk_seconds, 4) if chunk_seconds else None
+                })
+            elif json.loads(message.get("text") or "{}").get("type") == "end":
+                await send_detections(detector.flush())
+                await websocket.send_json({"type": "complete", "stream_duration": detector.samples_seen / detector.sr})
+                await websocket.close()
+                return
+            
+    except WebSocketDisconnect:
+        pass
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1003)
+    except Exception as e:
+        logger.error(f"❌ Live detection error: {str(e)}")
+        logger.error(f"Full live detection error: {traceback.format_exc()}")
+        await websocket.send_json({"type": "error", "detail": f"Live detection failed: {str(e)}"})
+        await websocket.close(code=1011)
+    finally:
+        live_sessions -= 1
+        remove_files(pattern_path)
+        logger.info("📡 Live detection session closed")
 
 # Audio file endpoint
 @app.get("/api/audio/{analysis_id}")
 async def get_audio_file(analysis_id: str):
     """Get audio file URL from database"""
     try:
-        if not supabase_client:
+        if not store:
             raise HTTPException(status_code=500, detail="Storage service unavailable")
             
         # Get analysis record from database
-        response = supabase_client.table("audio_analysis").select("target_url").eq("analysis_id", analysis_id).execute()
+        row = await store.get_analysis(analysis_id)
         
-        if not response.data:
+        if not row:
             raise HTTPException(status_code=404, detail="Analysis not found")
         
-        target_url = response.data[0]["target_url"]
+        target_url = row["target_url"]
         
         if not target_url:
             raise HTTPException(status_code=404, detail="Audio file not found")
         
-        # Redirect to the actual Supabase URL
+        # Redirect to the stored file
         return RedirectResponse(url=target_url)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Audio file error: {e}")
         logger.error(f"Full audio file error: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/storage/{storage_path:path}")
+async def get_stored_file(storage_path: str):
+    """Serve files kept by the local storage backend"""
+    if not isinstance(store, LocalStore):
+        raise HTTPException(status_code=404, detail="Local storage is not enabled")
+    file_path = store.file_path(storage_path)
+    if not file_path or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage timings, input sizes, queue wait and request counters in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and disk usage of the feature cache and the result memo"""
+    memo = {"enabled": True, **await run_in_threadpool(result_memo.stats)} if result_memo else {"enabled": False}
+    if not feature_cache:
+        return {"enabled": False, "result_memo": memo}
+    return {"enabled": True, **await run_in_threadpool(feature_cache.stats), "result_memo": memo}
+
 # Health check endpoint for monitoring
 @app.get("/api/health")
 async def health_check():
-    # Test Supabase connection
-    supabase_status = False
-    if supabase_client:
+    # Test the storage connection without blocking the event loop
+    storage_status = False
+    if store:
         try:
-            # Simple query to test connection
-            supabase_client.table("audio_analysis").select("count", count="exact").limit(1).execute()
-            supabase_status = True
+            storage_status = await asyncio.wait_for(store.ping(), timeout=5)
         except Exception as e:
-            logger.warning(f"Supabase health check failed: {e}")
+            logger.warning(f"{store.name} storage health check failed: {e}")
+    
+    queue_status = None
+    if work_queue:
+        try:
+            queue_status = {"backend": work_queue.name, **await asyncio.wait_for(work_queue.stats(), timeout=5)}
+        except Exception as e:
+            logger.warning(f"{work_queue.name} work queue health check failed: {e}")
+            queue_status = {"backend": work_queue.name, "error": str(e)}
     
     status = {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "environment": ENVIRONMENT,
-        "supabase_connected": supabase_status,
+        "supabase_connected": storage_status and STORAGE_BACKEND == "supabase",
+        "storage_backend": store.name if store else "none",
+        "storage_connected": storage_status,
+        "analysis_pool": executor.stats(),
+        "work_queue": queue_status,
+        "ready": startup.ready,
         "port": PORT
     }
     return status
 
+@app.get("/api/health/live")
+async def liveness_check():
+    """The process is up and serving; never waits on warm-up or storage"""
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """200 once analysis workers and the processor are warm, 503 before; includes measured startup phases"""
+    readiness = {
+        **startup.to_dict(),
+        "storage_backend": store.name if store else "none",
+        "storage_connected": store.connected if store else False
+    }
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
 @app.get("/api/docs")
 async def get_docs():
     """API Documentation endpoint"""
     return {
         "endpoints": {
             "POST /api/analyze": "Analyze audio files for pattern detection",
+            "POST /api/analyze/stream": "Correlation-only analysis of long targets, streamed as NDJSON",
+            "POST /api/analyze/batch": "Correlate many patterns against one target in a single pass",
+            "POST /api/fingerprint/ingest": "Add a recording to the fingerprint archive",
+            "POST /api/fingerprint/query": "Find archived recordings containing a pattern",
+            "POST /api/jobs": "Submit an analysis job and return its analysis_id immediately; "
+                              "pass your own analysis_id (a UUID) to make resubmission idempotent",
+            "GET /api/jobs/{analysis_id}": "Job status, per-stage progress and result",
+            "GET /api/jobs/{analysis_id}/events": "Server-sent events for job progress",
+            "WS /ws/detect": "Live detection over a PCM stream: send the pattern file, then PCM chunks",
             "GET /api/audio/{analysis_id}": "Get audio file URL",
+            "GET /api/storage/{path}": "Files kept by the local storage backend",
+            "GET /api/cache/stats": "Feature cache and result memo hit/miss counters and size",
             "GET /api/health": "Health check",
+            "GET /api/health/live": "Liveness: the process is serving requests",
+            "GET /api/health/ready": "Readiness: 503 until warm-up finishes; startup phase timings",
+            "GET /metrics": "Prometheus metrics: per-stage timing histograms, input sizes, queue wait, requests",
             "GET /api/docs": "This documentation"
         },
         "authentication": "Required via Supabase Auth",
+        "detection_methods": "Optional 'methods' form field on /api/analyze and /api/jobs: "
+                             "comma-separated subset of correlation, chroma, spectral; add 'adaptive' to "
+                             "skip the feature-based methods when correlation is already confident",
+        "combining": "Optional 'top_k' (default 10) and 'merge_window' (seconds, default 0.5) form fields on "
+                     "/api/analyze, /api/analyze/batch and /api/jobs: detections within merge_window of their "
+                     "neighbour merge into one, and the top_k most confident merged detections are returned",
+        "timings": "Optional 'timings=true' form field on /api/analyze and /api/jobs adds per-stage seconds "
+                   "(decode, correlation, chroma, spectral, combine, queue_wait, save_uploads, storage_upload) "
+                   "and input sizes to the result",
+        "result_memo": "/api/analyze remembers results by the content of both files and the detection "
+                       "parameters for RESULT_MEMO_TTL_SECONDS; repeats and concurrent duplicates skip the "
+                       "analysis, and files already in storage are not uploaded again",
+        "work_queue": "With WORK_QUEUE_BACKEND=sqlite or redis, /api/analyze and /api/jobs upload the audio to "
+                      "storage and queue it for `python -m app.worker` processes, which retry failed or "
+                      "abandoned analyses up to WORK_QUEUE_MAX_ATTEMPTS times",
+        "result_encodings": {
+            "application/json": "Default; waveform_data and correlation_data are interleaved [min, max] envelopes",
+            COMPACT_MEDIA_TYPE: "Envelopes as base64 little-endian min/max arrays",
+            BINARY_MEDIA_TYPE: "'APD1', uint32 header length, JSON header, then raw envelope arrays",
+            "dtype": "Add ';dtype=float32' to a compact media type for float32 instead of float16"
+        },
         "file_limits": "Maximum 50MB per file",
         "supported_formats": ["mp3", "wav", "ogg", "m4a", "aac", "flac"]
     }
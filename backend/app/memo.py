@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# Part of every key; bump when a change to the pipeline changes its output for the same inputs
+RESULT_MEMO_VERSION = 1
+
+
+class ResultMemo:
+    """
+    Finished analysis results keyed by the content of both inputs and the detection parameters.
+
+    Results live in a SQLite table, so every worker process and restart
+    shares them. Entries older than ``ttl_seconds`` are never returned, and
+    once the stored results exceed ``max_bytes`` the least recently used are
+    evicted. The timings block is dropped, since it describes the run that
+    computed a result, not the result.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(pattern_sha256: str, target_sha256: str, **params) -> str:
+        """Memo key for a pattern/target pair under the given detection parameters"""
+        described = json.dumps({"version": RESULT_MEMO_VERSION, **params}, sort_keys=True)
+        return hashlib.sha256(f"{pattern_sha256}|{target_sha256}|{described}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM results WHERE key = ? AND created_at >= ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict):
+        encoded = json.dumps({name: value for name, value in result.items() if name != "timings"})
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        self.evictions += conn.execute(
+            "DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used, keeping the rows that still fit after the excess is dropped
+        excess = total - self.max_bytes
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def stats(self) -> Dict:
+        entries, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one computation.
+
+    The first caller starts the computation as its own task; callers that
+    arrive while it runs await the same task, and all of them get its result
+    or its exception. The task is shielded, so one caller disconnecting does
+    not cancel the work the others are waiting for.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, compute: Callable[[], Awaitable[Dict]]) -> Tuple[Dict, bool]:
+        """The result of ``compute``, and whether it was shared with an earlier caller's computation"""
+        task = self._flights.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(compute())
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(task), shared
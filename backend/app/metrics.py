@@ -0,0 +1,257 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Seconds; stages range from milliseconds (combine) to minutes (CQT of an hour-long target)
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Decoded samples at 22.05 kHz: from a fraction of a second to several hours
+SAMPLE_BUCKETS = (1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+# Feature frames at a 512-sample hop
+FRAME_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+REGISTRY: List["Metric"] = []
+
+
+class Timings:
+    """
+    Wall-clock spans and input sizes of one request.
+
+    Spans with the same name accumulate. ``to_dict`` is what travels back
+    from pool workers and is included in responses as ``timings``.
+    """
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+        self.sizes: Dict[str, int] = {}
+        self.profile: Optional[str] = None
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.0) + time.perf_counter() - start
+
+    def update(self, timings: Optional[Dict]):
+        """Merge the ``to_dict`` form of another request's timings into this one"""
+        if not timings:
+            return
+        for name, seconds in timings.get("spans", {}).items():
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+        self.sizes.update(timings.get("sizes", {}))
+        self.profile = timings.get("profile") or self.profile
+
+    def to_dict(self) -> Dict:
+        timings = {
+            "spans": {name: round(seconds, 4) for name, seconds in self.spans.items()},
+            "sizes": dict(self.sizes)
+        }
+        if self.profile:
+            timings["profile"] = self.profile
+        return timings
+
+
+class Metric:
+    """A named metric in Prometheus text exposition format"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = TIME_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (per-bucket counts with a final +Inf bucket, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(zip(self.labels, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Callback(Metric):
+    """A gauge or counter read from elsewhere (a pool, a shared counter) at scrape time"""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float], type: str = "gauge"):
+        super().__init__(name, help)
+        self.type = type
+        self.read = read
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, {}, float(self.read()))]
+
+
+STAGE_SECONDS = Histogram(
+    "audio_analysis_stage_seconds",
+    "Wall time per analysis stage: decode, correlation (FFT), chroma (CQT), spectral (STFT), combine, "
+    "save_uploads, storage_upload, db_insert",
+    labels=("stage",)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "audio_analysis_queue_wait_seconds", "Time from submission until a pool worker starts a job", labels=("job",)
+)
+INPUT_SAMPLES = Histogram(
+    "audio_analysis_input_samples", "Decoded samples per analyzed file", labels=("input",), buckets=SAMPLE_BUCKETS
+)
+INPUT_FRAMES = Histogram(
+    "audio_analysis_input_frames", "Feature frames per analyzed file", labels=("input",), buckets=FRAME_BUCKETS
+)
+REQUESTS = Counter(
+    "audio_analysis_requests_total", "Analysis requests by endpoint and outcome", labels=("endpoint", "status")
+)
+REQUEST_SECONDS = Histogram(
+    "audio_analysis_request_seconds", "End-to-end analysis request time", labels=("endpoint",)
+)
+SLOW_PROFILES = Counter(
+    "audio_analysis_slow_profiles_total", "Profiles dumped for analyses slower than the profiling threshold"
+)
+STARTUP_PHASE_SECONDS = Gauge(
+    "audio_startup_phase_seconds", "Duration of each finished startup phase", labels=("phase",)
+)
+RESULT_MEMO_LOOKUPS = Counter(
+    "audio_result_memo_lookups_total",
+    "Analyses answered from the result memo (hit), by an identical analysis in flight (shared) or by running "
+    "the pipeline (miss)",
+    labels=("outcome",)
+)
+
+
+def observe_timings(timings: Optional[Dict]):
+    """Record the spans and sizes of one request's ``Timings.to_dict`` in the histograms"""
+    if not timings:
+        return
+    for name, seconds in timings.get("spans", {}).items():
+        if name != "queue_wait":
+            STAGE_SECONDS.observe(seconds, stage=name)
+    for name, size in timings.get("sizes", {}).items():
+        # Sizes are named "<input>_samples" or "<input>_frames"
+        source, _, unit = name.rpartition("_")
+        if unit == "samples":
+            INPUT_SAMPLES.observe(size, input=source)
+        elif unit == "frames":
+            INPUT_FRAMES.observe(size, input=source)
+    if timings.get("profile"):
+        SLOW_PROFILES.inc()
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[None]:
+    """Count a request by outcome (``ok``, an HTTP status code or ``error``) and time it"""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    except Exception as e:
+        status = str(getattr(e, "status_code", "error"))
+        raise
+    finally:
+        REQUESTS.inc(endpoint=endpoint, status=status)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+
+def tracked(endpoint: str):
+    """Decorator applying ``track_request`` to an async endpoint"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with track_request(endpoint):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    """Every registered metric in Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {escape(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            label_text = ",".join(f'{key}="{escape(str(item))}"' for key, item in labels.items())
+            lines.append(f"{name}{{{label_text}}} {format_value(value)}" if label_text else f"{name} {format_value(value)}")
+    return "\n".join(lines) + "\n"
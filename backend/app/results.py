@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.encoding import ARRAY_DTYPES, compact_results
+
+
+def analysis_row(user_id: str, analysis_id: str, pattern_filename: str, target_filename: str, results: Dict,
+                 pattern_url: Optional[str], target_url: Optional[str], compact: bool = False) -> Dict:
+    """The audio_analysis row for a finished analysis; ``compact`` stores envelopes as base64 float16"""
+    row = {
+        "user_id": user_id,
+        "analysis_id": analysis_id,
+        "pattern_filename": pattern_filename,
+        "target_filename": target_filename,
+        "pattern_url": pattern_url,
+        "target_url": target_url,
+        "detection_count": results["detection_count"],
+        "detections": results["detections"],
+        "pattern_duration": results["pattern_duration"],
+        "target_duration": results["target_duration"],
+        "sample_rate": results["sample_rate"],
+        "waveform_data": results["waveform_data"],
+        "correlation_data": results["correlation_data"],
+        "analysis_methods": results.get("analysis_methods", ["correlation"]),
+        "created_at": datetime.now().isoformat()
+    }
+    if compact:
+        row = compact_results(row, ARRAY_DTYPES["float16"])
+    return row
+
+
+def analysis_response(analysis_id: str, pattern_filename: str, target_filename: str, results: Dict,
+                      pattern_url: Optional[str], target_url: Optional[str], saved: bool,
+                      timings: Optional[Dict] = None) -> Dict:
+    """The API response for a finished analysis; ``timings`` is included when given"""
+    response = {
+        "analysis_id": analysis_id,
+        "timestamp": datetime.now().isoformat(),
+        "pattern_filename": pattern_filename,
+        "target_filename": target_filename,
+        "detection_count": results["detection_count"],
+        "detections": results["detections"],
+        "pattern_duration": results["pattern_duration"],
+        "target_duration": results["target_duration"],
+        "sample_rate": results["sample_rate"],
+        "waveform_data": results["waveform_data"],
+        "correlation_data": results["correlation_data"],
+        "analysis_methods": results.get("analysis_methods", ["correlation"]),
+        "target_url": target_url,
+        "pattern_url": pattern_url,
+        "supabase_saved": saved
+    }
+    if timings is not None:
+        response["timings"] = timings
+    return response
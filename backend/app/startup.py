@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+from app.metrics import STARTUP_PHASE_SECONDS
+
+
+class StartupPhases:
+    """
+    Measured startup phases and the readiness they gate.
+
+    Each phase is ``pending``, ``running``, ``done`` or ``failed``. The app is
+    ready once every phase in ``required`` is done; other phases (storage)
+    are reported but never hold readiness back.
+    """
+
+    def __init__(self, required: Tuple[str, ...]):
+        self.required = required
+        self.started_at = time.time()
+        self.phases: Dict[str, Dict] = {name: {"status": "pending"} for name in required}
+
+    def record(self, name: str, seconds: float, status: str = "done"):
+        self.phases[name] = {"status": status, "seconds": round(seconds, 3)}
+        if status == "done":
+            STARTUP_PHASE_SECONDS.set(seconds, phase=name)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.phases[name] = {"status": "running"}
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(name, time.perf_counter() - start, "failed")
+            raise
+        self.record(name, time.perf_counter() - start)
+
+    @property
+    def ready(self) -> bool:
+        return all(self.phases.get(name, {}).get("status") == "done" for name in self.required)
+
+    def to_dict(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "phases": self.phases
+        }
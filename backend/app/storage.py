@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+import sqlite3
+import threading
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+import aiofiles
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Bytes per read when streaming a file to storage
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# PostgREST's error code for an on_conflict column without a unique constraint
+MISSING_UNIQUE_CONSTRAINT = "42P10"
+
+
+async def read_chunks(path: str) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as source:
+        while True:
+            chunk = await source.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+class AnalysisStore:
+    """Where uploaded audio files and analysis rows are persisted"""
+
+    name = "none"
+    connected = False
+
+    async def connect(self, attempts: int = 5, backoff: float = 1.0, timeout: float = 10.0) -> bool:
+        """
+        Ping until storage answers, doubling the delay between attempts.
+
+        Nothing else waits on this: uploads are attempted whether or not it
+        has succeeded, and ``connected`` only reports the outcome.
+        """
+        for attempt in range(attempts):
+            try:
+                self.connected = await asyncio.wait_for(self.ping(), timeout=timeout)
+            except Exception as e:
+                logger.warning(f"{self.name} storage ping {attempt + 1}/{attempts} failed: {e}")
+            if self.connected:
+                return True
+            if attempt + 1 < attempts:
+                await asyncio.sleep(backoff * 2 ** attempt)
+        return False
+
+    async def upload(self, storage_path: str, local_path: str) -> str:
+        """Store a local file under ``storage_path``, replacing any earlier copy; returns its public URL"""
+        raise NotImplementedError
+
+    async def download(self, storage_path: str, local_path: str):
+        """Copy a stored file to ``local_path``"""
+        raise NotImplementedError
+
+    async def exists(self, storage_path: str) -> bool:
+        """Whether a file is stored under ``storage_path``"""
+        raise NotImplementedError
+
+    def public_url(self, storage_path: str) -> str:
+        """The URL ``upload`` returns for ``storage_path``"""
+        raise NotImplementedError
+
+    async def insert_analysis(self, row: Dict):
+        """Insert an analysis row, or replace the row with the same analysis_id"""
+        raise NotImplementedError
+
+    async def get_analysis(self, analysis_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def ping(self) -> bool:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class SupabaseStore(AnalysisStore):
+    """
+    Supabase Storage and PostgREST over one pooled async HTTP client.
+
+    Keep-alive connections are reused across requests, and file bodies are
+    streamed from disk rather than read into memory. Analysis rows are
+    upserted on analysis_id, which needs the unique constraint added by
+    ``supabase/migrations``; on a table without it rows are inserted plainly
+    instead, so a retried job may leave a duplicate row but none are lost.
+    """
+
+    name = "supabase"
+
+    def __init__(self, url: str, key: str, bucket: str = "audio-analysis-files", table: str = "audio_analysis",
+                 max_connections: int = 20, timeout: float = 60.0):
+        self.url = url.rstrip("/")
+        self.bucket = bucket
+        self.table = table
+        self._upsert = True
+        self._client = httpx.AsyncClient(
+            base_url=self.url,
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=10.0)
+        )
+
+    async def upload(self, storage_path: str, local_path: str) -> str:
+        content_type = mimetypes.guess_type(local_path)[0] or "application/octet-stream"
+        response = await self._client.post(
+            f"/storage/v1/object/{self.bucket}/{storage_path}",
+            content=read_chunks(local_path),
+            headers={
+                "Content-Type": content_type,
+                "Content-Length": str(os.path.getsize(local_path)),
+                "x-upsert": "true"
+            }
+        )
+        response.raise_for_status()
+        return self.public_url(storage_path)
+
+    async def download(self, storage_path: str, local_path: str):
+        async with self._client.stream("GET", f"/storage/v1/object/{self.bucket}/{storage_path}") as response:
+            response.raise_for_status()
+            async with aiofiles.open(local_path, "wb") as target:
+                async for chunk in response.aiter_bytes(UPLOAD_CHUNK_BYTES):
+                    await target.write(chunk)
+
+    async def exists(self, storage_path: str) -> bool:
+        response = await self._client.head(f"/storage/v1/object/{self.bucket}/{storage_path}")
+        return response.status_code == 200
+
+    def public_url(self, storage_path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{storage_path}"
+
+    async def insert_analysis(self, row: Dict):
+        if self._upsert:
+            response = await self._client.post(
+                f"/rest/v1/{self.table}",
+                json=row,
+                params={"on_conflict": "analysis_id"},
+                headers={"Prefer": "resolution=merge-duplicates,return=minimal"}
+            )
+            if not self._missing_unique_constraint(response):
+                response.raise_for_status()
+                return
+            logger.error(
+                f"❌ {self.table}.analysis_id has no unique constraint, so rows cannot be upserted; apply "
+                f"supabase/migrations/*_audio_analysis_unique_analysis_id.sql. Falling back to plain inserts"
+            )
+            self._upsert = False
+
+        response = await self._client.post(
+            f"/rest/v1/{self.table}", json=row, headers={"Prefer": "return=minimal"}
+        )
+        response.raise_for_status()
+
+    @staticmethod
+    def _missing_unique_constraint(response: httpx.Response) -> bool:
+        if response.status_code != 400:
+            return False
+        try:
+            return response.json().get("code") == MISSING_UNIQUE_CONSTRAINT
+        except ValueError:
+            return False
+
+    async def get_analysis(self, analysis_id: str) -> Optional[Dict]:
+        response = await self._client.get(
+            f"/rest/v1/{self.table}", params={"analysis_id": f"eq.{analysis_id}", "select": "*", "limit": 1}
+        )
+        response.raise_for_status()
+        rows = response.json()
+        return rows[0] if rows else None
+
+    async def ping(self) -> bool:
+        response = await self._client.get(f"/rest/v1/{self.table}", params={"select": "analysis_id", "limit": 1})
+        return response.status_code < 400
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class LocalStore(AnalysisStore):
+    """
+    Filesystem and SQLite stand-in for Supabase, for offline development.
+
+    Files are copied under ``directory/files`` and served back by the API at
+    ``url_prefix``; rows go to ``directory/analyses.db``.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: str, url_prefix: str = "/api/storage"):
+        self.files_dir = os.path.join(directory, "files")
+        self.url_prefix = url_prefix.rstrip("/")
+        self.path = os.path.join(directory, "analyses.db")
+        self._local = threading.local()
+        os.makedirs(self.files_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS audio_analysis (
+                    analysis_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    created_at TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def file_path(self, storage_path: str) -> Optional[str]:
+        """Local path of a stored file, or None if ``storage_path`` escapes the storage directory"""
+        root = os.path.realpath(self.files_dir)
+        path = os.path.realpath(os.path.join(root, storage_path))
+        return path if path.startswith(root + os.sep) else None
+
+    async def upload(self, storage_path: str, local_path: str) -> str:
+        destination = self.file_path(storage_path)
+        if destination is None:
+            raise ValueError(f"Invalid storage path: {storage_path}")
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # Write then rename, so exists() never sees a partial file and concurrent
+        # uploads of the same content don't interleave
+        partial = f"{destination}.{uuid.uuid4().hex}.partial"
+        try:
+            async with aiofiles.open(partial, "wb") as target:
+                async for chunk in read_chunks(local_path):
+                    await target.write(chunk)
+            os.replace(partial, destination)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return self.public_url(storage_path)
+
+    async def download(self, storage_path: str, local_path: str):
+        source = self.file_path(storage_path)
+        if source is None or not os.path.isfile(source):
+            raise FileNotFoundError(f"Not in storage: {storage_path}")
+        async with aiofiles.open(local_path, "wb") as target:
+            async for chunk in read_chunks(source):
+                await target.write(chunk)
+
+    async def exists(self, storage_path: str) -> bool:
+        path = self.file_path(storage_path)
+        return path is not None and os.path.isfile(path)
+
+    def public_url(self, storage_path: str) -> str:
+        return f"{self.url_prefix}/{storage_path}"
+
+    def _insert(self, row: Dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO audio_analysis (analysis_id, user_id, created_at, data) VALUES (?, ?, ?, ?)",
+                (row["analysis_id"], row.get("user_id"), row.get("created_at"), json.dumps(row))
+            )
+
+    async def insert_analysis(self, row: Dict):
+        await asyncio.to_thread(self._insert, row)
+
+    def _get(self, analysis_id: str) -> Optional[Dict]:
+        found = self._connect().execute(
+            "SELECT data FROM audio_analysis WHERE analysis_id = ?", (analysis_id,)
+        ).fetchone()
+        return json.loads(found[0]) if found else None
+
+    async def get_analysis(self, analysis_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self._get, analysis_id)
+
+    async def ping(self) -> bool:
+        return os.path.isdir(self.files_dir)
+
+
+def create_store(backend: str, local_directory: str = "storage",
+                 max_connections: int = 20) -> Optional[AnalysisStore]:
+    """
+    The store for a ``STORAGE_BACKEND`` setting: "supabase" (needs SUPABASE_URL and
+    SUPABASE_SERVICE_ROLE_KEY), "local" or "none". Returns None when nothing is configured.
+    """
+    if backend == "supabase":
+        if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_SERVICE_ROLE_KEY"):
+            return SupabaseStore(
+                os.getenv("SUPABASE_URL"),
+                os.getenv("SUPABASE_SERVICE_ROLE_KEY"),
+                max_connections=max_connections
+            )
+        logger.error("❌ Supabase is not configured: SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
+    elif backend == "local":
+        return LocalStore(local_directory)
+    return None
@@ -0,0 +1,194 @@
+import numpy as np
+import soundfile as sf
+import soxr
+from scipy.fft import next_fast_len, rfft, irfft
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.correlation import (
+    find_correlation_peaks, local_energy, normalize_correlation, pattern_spectrum, zero_mean_pattern
+)
+
+
+def read_blocks(path: str, sr: int, block_size: int) -> Iterator[np.ndarray]:
+    """
+    Decode a file in fixed-size blocks, downmixed to mono and resampled to ``sr``.
+
+    Only one block (plus the resampler's small internal state) is held in memory.
+    """
+    with sf.SoundFile(path) as audio_file:
+        native_sr = audio_file.samplerate
+        resampler = None
+        if native_sr != sr:
+            resampler = soxr.ResampleStream(native_sr, sr, 1, dtype="float32")
+
+        # Read enough native samples to yield roughly block_size output samples
+        native_block = max(1, int(block_size * native_sr / sr))
+        for block in audio_file.blocks(blocksize=native_block, dtype="float32", always_2d=True):
+            mono = block.mean(axis=1)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono)
+            if len(mono):
+                yield mono
+
+        if resampler is not None:
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            if len(tail):
+                yield tail
+
+
+class StreamingDetector:
+    """
+    Overlap-save correlation of a short pattern against an unbounded target.
+
+    The pattern spectrum is computed once for a fixed FFT size. Each incoming
+    block is appended to the tail of the previous one (pattern length plus
+    one sample, so a peak on a block boundary is still interior to a segment)
+    in a preallocated buffer, so memory and per-block cost stay constant no
+    matter how long the target runs. Scores are the same zero-normalized
+    cross-correlation as ``normalized_cross_correlation``, so thresholds mean
+    the same thing on every file, and peaks are picked by the same
+    ``find_correlation_peaks`` rules. A peak is decided once
+    ``2 * min_distance`` later lags have been scored; the scores around
+    undecided lags are kept so a peak straddling a block boundary sees the
+    same surroundings as in a whole-target pass.
+
+    Blocks can be pulled from an iterable with ``process`` or pushed one at a
+    time with ``push`` and ``flush``, e.g. from a live stream.
+    """
+
+    def __init__(self, pattern: np.ndarray, sr: int, block_size: int,
+                 threshold: float = 0.6, min_distance: Optional[int] = None,
+                 spectrum: Optional[np.ndarray] = None):
+        self.pattern, self.pattern_norm = zero_mean_pattern(pattern)
+        self.sr = sr
+        self.block_size = block_size
+        self.threshold = threshold
+        self.min_distance = min_distance or max(1, int(len(pattern) * 0.3))
+
+        self.fft_size = self.fft_size_for(block_size, len(pattern))
+        if spectrum is None:
+            spectrum = pattern_spectrum(pattern, self.fft_size)
+        self.pattern_spectrum = spectrum
+
+        # The last m + 1 samples followed by the incoming block
+        self._buffer = np.zeros(len(pattern) + 1 + block_size, dtype=np.float32)
+        self._filled = 0
+        self._offset = 0  # target sample index of _buffer[0]
+        # Scores kept for peak picking, from lag _scores_offset; lags before _decided are settled
+        self._scores = np.zeros(0, dtype=np.float32)
+        self._scores_offset = 0
+        self._decided = 0
+        self.samples_seen = 0
+
+    @staticmethod
+    def fft_size_for(block_size: int, pattern_length: int) -> int:
+        """FFT length for a block plus the carried-over pattern tail"""
+        return next_fast_len(block_size + pattern_length + 1, real=True)
+
+    def _score_segment(self, segment: np.ndarray) -> np.ndarray:
+        """NCC for every lag where the pattern fits inside ``segment``"""
+        m = len(self.pattern)
+        valid = len(segment) - m + 1
+        correlation = irfft(rfft(segment, n=self.fft_size) * self.pattern_spectrum, n=self.fft_size)[:valid]
+        return normalize_correlation(correlation, local_energy(segment, m), m, self.pattern_norm)
+
+    def process(self, blocks: Iterable[np.ndarray]) -> Iterator[Dict]:
+        """Yield detections as soon as no later lag can outscore them"""
+        for block in blocks:
+            yield from self.push(block)
+        yield from self.flush()
+
+    def push(self, block: np.ndarray) -> List[Dict]:
+        """Append target samples; returns the detections that became final"""
+        detections = []
+        for start in range(0, len(block), self.block_size):
+            detections.extend(self._push_block(block[start:start + self.block_size]))
+        return detections
+
+    def flush(self) -> List[Dict]:
+        """End of target: decide the peaks still waiting for later lags"""
+        return self._decide(final=True)
+
+    def _push_block(self, block: np.ndarray) -> List[Dict]:
+        m = len(self.pattern)
+        end = self._filled + len(block)
+        self._buffer[self._filled:end] = block
+        self._filled = end
+        self.samples_seen += len(block)
+        if end < m:
+            return []
+
+        # Consecutive segments overlap by a couple of lags; keep only the ones not scored yet
+        scores = self._score_segment(self._buffer[:end])
+        scored_until = self._scores_offset + len(self._scores)
+        self._scores = np.concatenate((self._scores, scores[scored_until - self._offset:]))
+        detections = self._decide(final=False)
+
+        keep = min(m + 1, end)
+        self._offset += end - keep
+        self._buffer[:keep] = self._buffer[end - keep:end]
+        self._filled = keep
+        return detections
+
+    def _decide(self, final: bool) -> List[Dict]:
+        """Detections among the lags whose surroundings are complete, or all remaining lags when ``final``"""
+        end = self._scores_offset + len(self._scores)
+        context = 2 * self.min_distance
+        ready = end if final else end - context
+        if ready <= self._decided:
+            return []
+
+        peaks, heights = find_correlation_peaks(self._scores, self.threshold, self.min_distance)
+        lags = peaks + self._scores_offset
+        detections = [
+            self._detection(int(lag), float(height))
+            for lag, height in zip(lags, heights)
+            if self._decided <= lag < ready
+        ]
+        self._decided = ready
+
+        # Later peaks look back up to the same context, for prominence and spacing
+        keep_from = max(self._scores_offset, ready - context)
+        self._scores = self._scores[keep_from - self._scores_offset:].copy()
+        self._scores_offset = keep_from
+        return detections
+
+    def _detection(self, lag: int, score: float) -> Dict:
+        return {"time": lag / self.sr, "confidence": score, "method": "correlation"}
+
+
+# Raw PCM sample formats accepted from live streams
+PCM_FORMATS = {"s16le": np.dtype("<i2"), "f32le": np.dtype("<f4")}
+
+
+class PcmStream:
+    """
+    Decode raw interleaved PCM chunks to mono float32 at ``sr``.
+
+    Chunks may split frames anywhere; leftover bytes are carried into the
+    next chunk. Resampling keeps its filter state across chunks.
+    """
+
+    def __init__(self, sample_format: str, channels: int, native_sr: int, sr: int):
+        if sample_format not in PCM_FORMATS:
+            raise ValueError(f"Unsupported sample format '{sample_format}'; expected one of {', '.join(PCM_FORMATS)}")
+        if channels < 1 or native_sr < 1:
+            raise ValueError("channels and sample_rate must be positive")
+        self.dtype = PCM_FORMATS[sample_format]
+        self.channels = channels
+        self.resampler = soxr.ResampleStream(native_sr, sr, 1, dtype="float32") if native_sr != sr else None
+        self._remainder = b""
+
+    def decode(self, data: bytes) -> np.ndarray:
+        data = self._remainder + data
+        frame_bytes = self.dtype.itemsize * self.channels
+        usable = len(data) // frame_bytes * frame_bytes
+        self._remainder = data[usable:]
+
+        samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float32)
+        if self.dtype.kind == "i":
+            samples /= 32768.0
+        mono = samples.reshape(-1, self.channels).mean(axis=1)
+        if self.resampler is not None:
+            mono = self.resampler.resample_chunk(mono)
+        return mono
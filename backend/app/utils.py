@@ -1,3 +1,4 @@
+import hashlib
 import os
 from typing import Optional
 
@@ -17,4 +18,12 @@ def clean_old_files(directory: str, max_age_hours: int = 24):
         if os.path.isfile(file_path):
             file_age = current_time - os.path.getctime(file_path)
             if file_age > max_age_hours * 3600:
-                os.remove(file_path)
\ No newline at end of file
+                os.remove(file_path)
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hex SHA-256 of a file's bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,442 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class WorkQueue:
+    """
+    Durable analysis jobs shared by web nodes and workers, keyed on analysis_id.
+
+    Workers ``claim`` a job together with a lease token valid for
+    ``visibility_timeout`` seconds and extend it with ``heartbeat``. A job whose
+    lease runs out (its worker died or stalled) becomes claimable again.
+    ``fail`` retries with exponential backoff until the job's ``max_attempts``,
+    as does an expired lease.
+
+    Every write by a worker names its lease, so a worker that lost its lease
+    cannot overwrite the stage events or result of the one that took over.
+    Enqueueing an analysis_id that already exists is a no-op.
+    """
+
+    name = "none"
+
+    async def enqueue(self, analysis_id: str, payload: Dict, max_attempts: int = 3) -> bool:
+        """Add a job; returns False if ``analysis_id`` is already queued, running or finished"""
+        raise NotImplementedError
+
+    async def claim(self, worker_id: str, visibility_timeout: float) -> Optional[Dict]:
+        """The oldest available job, leased to ``worker_id``, or None; the record carries its ``lease``"""
+        raise NotImplementedError
+
+    async def heartbeat(self, analysis_id: str, lease: str, visibility_timeout: float) -> bool:
+        """Extend a lease; returns False if it was lost"""
+        raise NotImplementedError
+
+    async def record_stage(self, analysis_id: str, lease: str, event: Dict) -> bool:
+        """Append a stage event for subscribers; returns False if the lease was lost"""
+        raise NotImplementedError
+
+    async def complete(self, analysis_id: str, lease: str, result: Dict) -> bool:
+        """Store the result; returns False if the lease was lost and the result discarded"""
+        raise NotImplementedError
+
+    async def fail(self, analysis_id: str, lease: str, error: str, retry_delay: float) -> Optional[str]:
+        """
+        Give up an attempt. The job is queued again after ``retry_delay * 2 ** (attempts - 1)``
+        seconds, or failed once out of attempts. Returns the new status, or None if the lease was lost.
+        """
+        raise NotImplementedError
+
+    async def get(self, analysis_id: str) -> Optional[Dict]:
+        """The job record: status, payload, attempts, events, result and error"""
+        raise NotImplementedError
+
+    async def stats(self) -> Dict:
+        """Job counts by status"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    Work queue in a SQLite database, for web nodes and workers on one machine.
+
+    Claims run in ``BEGIN IMMEDIATE`` transactions, so concurrent workers in
+    separate processes never take the same job. Finished jobs are deleted
+    ``retention_seconds`` after they finish.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, retention_seconds: float = 86400):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._connect().executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                analysis_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease TEXT,
+                lease_until REAL,
+                worker_id TEXT,
+                events TEXT NOT NULL DEFAULT '[]',
+                result TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS analysis_jobs_status ON analysis_jobs (status, available_at);
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit mode, so transactions are exactly the BEGIN IMMEDIATE blocks below
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _enqueue(self, analysis_id: str, payload: Dict, max_attempts: int) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM analysis_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (COMPLETED, FAILED, now - self.retention_seconds)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO analysis_jobs "
+                "(analysis_id, status, payload, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (analysis_id, QUEUED, json.dumps(payload), max_attempts, now, datetime.now().isoformat(), now)
+            )
+            return cursor.rowcount == 1
+
+    async def enqueue(self, analysis_id: str, payload: Dict, max_attempts: int = 3) -> bool:
+        return await asyncio.to_thread(self._enqueue, analysis_id, payload, max_attempts)
+
+    def _claim(self, worker_id: str, visibility_timeout: float) -> Optional[Dict]:
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired leases: retry, or fail the job once it is out of attempts
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, lease = NULL, error = 'Lease expired', updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                (FAILED, now, RUNNING, now)
+            )
+            row = conn.execute(
+                "SELECT analysis_id FROM analysis_jobs "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY available_at LIMIT 1",
+                (QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            lease = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, lease = ?, lease_until = ?, worker_id = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE analysis_id = ?",
+                (RUNNING, lease, now + visibility_timeout, worker_id, now, row["analysis_id"])
+            )
+            return self._record(conn, row["analysis_id"])
+
+    async def claim(self, worker_id: str, visibility_timeout: float) -> Optional[Dict]:
+        return await asyncio.to_thread(self._claim, worker_id, visibility_timeout)
+
+    def _update_leased(self, analysis_id: str, lease: str, assignments: str, values: tuple) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE analysis_jobs SET {assignments}, updated_at = ? "
+                "WHERE analysis_id = ? AND lease = ? AND status = ?",
+                (*values, time.time(), analysis_id, lease, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    async def heartbeat(self, analysis_id: str, lease: str, visibility_timeout: float) -> bool:
+        return await asyncio.to_thread(
+            self._update_leased, analysis_id, lease, "lease_until = ?", (time.time() + visibility_timeout,)
+        )
+
+    async def record_stage(self, analysis_id: str, lease: str, event: Dict) -> bool:
+        return await asyncio.to_thread(
+            self._update_leased, analysis_id, lease, "events = json_insert(events, '$[#]', json(?))",
+            (json.dumps(event),)
+        )
+
+    async def complete(self, analysis_id: str, lease: str, result: Dict) -> bool:
+        return await asyncio.to_thread(
+            self._update_leased, analysis_id, lease, "status = ?, result = ?, lease = NULL, error = NULL",
+            (COMPLETED, json.dumps(result))
+        )
+
+    def _fail(self, analysis_id: str, lease: str, error: str, retry_delay: float) -> Optional[str]:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM analysis_jobs WHERE analysis_id = ? AND lease = ? AND status = ?",
+                (analysis_id, lease, RUNNING)
+            ).fetchone()
+            if row is None:
+                return None
+            status = QUEUED if row["attempts"] < row["max_attempts"] else FAILED
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, error = ?, lease = NULL, available_at = ?, updated_at = ? "
+                "WHERE analysis_id = ?",
+                (status, error, now + retry_delay * 2 ** (row["attempts"] - 1), now, analysis_id)
+            )
+            return status
+
+    async def fail(self, analysis_id: str, lease: str, error: str, retry_delay: float) -> Optional[str]:
+        return await asyncio.to_thread(self._fail, analysis_id, lease, error, retry_delay)
+
+    def _record(self, conn: sqlite3.Connection, analysis_id: str) -> Optional[Dict]:
+        row = conn.execute("SELECT * FROM analysis_jobs WHERE analysis_id = ?", (analysis_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["payload"] = json.loads(record["payload"])
+        record["events"] = json.loads(record["events"])
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+    async def get(self, analysis_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(lambda: self._record(self._connect(), analysis_id))
+
+    def _stats(self) -> Dict:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status").fetchall()
+        return {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0, **{status: count for status, count in rows}}
+
+    async def stats(self) -> Dict:
+        return await asyncio.to_thread(self._stats)
+
+
+# Redis scripts run atomically on the server and read its clock, so nodes with
+# skewed clocks still agree on lease expiry. KEYS: ready zset, leases zset;
+# ARGV[1] is the job key prefix. Job hashes live at prefix .. analysis_id and
+# their stage events in a list at prefix .. analysis_id .. ":events".
+_REDIS_NOW = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+"""
+
+_REDIS_ENQUEUE = _REDIS_NOW + """
+local key = ARGV[1] .. ARGV[2]
+if redis.call('EXISTS', key) == 1 then return 0 end
+redis.call('HSET', key, 'analysis_id', ARGV[2], 'status', 'queued', 'payload', ARGV[3], 'attempts', 0,
+           'max_attempts', ARGV[4], 'available_at', now, 'created_at', ARGV[5], 'updated_at', now)
+redis.call('ZADD', KEYS[1], now, ARGV[2])
+return 1
+"""
+
+_REDIS_CLAIM = _REDIS_NOW + """
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    local key = ARGV[1] .. id
+    redis.call('ZREM', KEYS[2], id)
+    if tonumber(redis.call('HGET', key, 'attempts')) >= tonumber(redis.call('HGET', key, 'max_attempts')) then
+        redis.call('HSET', key, 'status', 'failed', 'lease', '', 'error', 'Lease expired', 'updated_at', now)
+        redis.call('EXPIRE', key, ARGV[5])
+        redis.call('EXPIRE', key .. ':events', ARGV[5])
+    else
+        redis.call('HSET', key, 'status', 'queued', 'lease', '', 'available_at', now, 'updated_at', now)
+        redis.call('ZADD', KEYS[1], now, id)
+    end
+end
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, 1)
+if #ids == 0 then return false end
+local id = ids[1]
+local key = ARGV[1] .. id
+local lease_until = now + tonumber(ARGV[3])
+redis.call('ZREM', KEYS[1], id)
+redis.call('ZADD', KEYS[2], lease_until, id)
+redis.call('HSET', key, 'status', 'running', 'lease', ARGV[2], 'lease_until', lease_until,
+           'worker_id', ARGV[4], 'updated_at', now)
+redis.call('HINCRBY', key, 'attempts', 1)
+return id
+"""
+
+# Shared preamble: the job must be running under ARGV[3]'s lease
+_REDIS_LEASED = _REDIS_NOW + """
+local key = ARGV[1] .. ARGV[2]
+if redis.call('HGET', key, 'status') ~= 'running' or redis.call('HGET', key, 'lease') ~= ARGV[3] then
+    return false
+end
+"""
+
+_REDIS_HEARTBEAT = _REDIS_LEASED + """
+local lease_until = now + tonumber(ARGV[4])
+redis.call('HSET', key, 'lease_until', lease_until, 'updated_at', now)
+redis.call('ZADD', KEYS[2], lease_until, ARGV[2])
+return 1
+"""
+
+_REDIS_RECORD_STAGE = _REDIS_LEASED + """
+redis.call('RPUSH', key .. ':events', ARGV[4])
+redis.call('HSET', key, 'updated_at', now)
+return 1
+"""
+
+_REDIS_COMPLETE = _REDIS_LEASED + """
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('HSET', key, 'status', 'completed', 'result', ARGV[4], 'lease', '', 'error', '', 'updated_at', now)
+redis.call('EXPIRE', key, ARGV[5])
+redis.call('EXPIRE', key .. ':events', ARGV[5])
+return 1
+"""
+
+_REDIS_FAIL = _REDIS_LEASED + """
+redis.call('ZREM', KEYS[2], ARGV[2])
+local attempts = tonumber(redis.call('HGET', key, 'attempts'))
+if attempts < tonumber(redis.call('HGET', key, 'max_attempts')) then
+    local available_at = now + tonumber(ARGV[5]) * 2 ^ (attempts - 1)
+    redis.call('HSET', key, 'status', 'queued', 'lease', '', 'error', ARGV[4], 'available_at', available_at,
+               'updated_at', now)
+    redis.call('ZADD', KEYS[1], available_at, ARGV[2])
+    return 'queued'
+end
+redis.call('HSET', key, 'status', 'failed', 'lease', '', 'error', ARGV[4], 'updated_at', now)
+redis.call('EXPIRE', key, ARGV[6])
+redis.call('EXPIRE', key .. ':events', ARGV[6])
+return 'failed'
+"""
+
+
+class RedisWorkQueue(WorkQueue):
+    """
+    Work queue in Redis (or a Redis-compatible server), for web nodes and workers on many machines.
+
+    Each job is a hash; queued jobs sit in a sorted set scored by when they
+    become available and running jobs in one scored by lease expiry. Every
+    state change is a server-side script, so it is atomic across nodes.
+    Finished jobs expire ``retention_seconds`` after they finish.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "audio-analysis:", retention_seconds: float = 86400):
+        # Imported here so deployments using the SQLite queue don't need the redis package
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self.retention_seconds = int(retention_seconds)
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._keys = [f"{prefix}ready", f"{prefix}leases"]
+        self._job_prefix = f"{prefix}job:"
+        self._enqueue = self._client.register_script(_REDIS_ENQUEUE)
+        self._claim = self._client.register_script(_REDIS_CLAIM)
+        self._heartbeat = self._client.register_script(_REDIS_HEARTBEAT)
+        self._record_stage = self._client.register_script(_REDIS_RECORD_STAGE)
+        self._complete = self._client.register_script(_REDIS_COMPLETE)
+        self._fail = self._client.register_script(_REDIS_FAIL)
+
+    async def enqueue(self, analysis_id: str, payload: Dict, max_attempts: int = 3) -> bool:
+        added = await self._enqueue(keys=self._keys, args=[
+            self._job_prefix, analysis_id, json.dumps(payload), max_attempts, datetime.now().isoformat()
+        ])
+        return added == 1
+
+    async def claim(self, worker_id: str, visibility_timeout: float) -> Optional[Dict]:
+        lease = uuid.uuid4().hex
+        analysis_id = await self._claim(keys=self._keys, args=[
+            self._job_prefix, lease, visibility_timeout, worker_id, self.retention_seconds
+        ])
+        if not analysis_id:
+            return None
+        return await self.get(analysis_id)
+
+    async def heartbeat(self, analysis_id: str, lease: str, visibility_timeout: float) -> bool:
+        return bool(await self._heartbeat(
+            keys=self._keys, args=[self._job_prefix, analysis_id, lease, visibility_timeout]
+        ))
+
+    async def record_stage(self, analysis_id: str, lease: str, event: Dict) -> bool:
+        return bool(await self._record_stage(
+            keys=self._keys, args=[self._job_prefix, analysis_id, lease, json.dumps(event)]
+        ))
+
+    async def complete(self, analysis_id: str, lease: str, result: Dict) -> bool:
+        return bool(await self._complete(keys=self._keys, args=[
+            self._job_prefix, analysis_id, lease, json.dumps(result), self.retention_seconds
+        ]))
+
+    async def fail(self, analysis_id: str, lease: str, error: str, retry_delay: float) -> Optional[str]:
+        status = await self._fail(keys=self._keys, args=[
+            self._job_prefix, analysis_id, lease, error, retry_delay, self.retention_seconds
+        ])
+        return status or None
+
+    async def get(self, analysis_id: str) -> Optional[Dict]:
+        key = self._job_prefix + analysis_id
+        async with self._client.pipeline(transaction=True) as pipe:
+            fields, events = await pipe.hgetall(key).lrange(f"{key}:events", 0, -1).execute()
+        if not fields:
+            return None
+        return {
+            "analysis_id": analysis_id,
+            "status": fields["status"],
+            "payload": json.loads(fields["payload"]),
+            "attempts": int(fields["attempts"]),
+            "max_attempts": int(fields["max_attempts"]),
+            "available_at": float(fields["available_at"]),
+            "lease": fields.get("lease") or None,
+            "lease_until": float(fields["lease_until"]) if fields.get("lease_until") else None,
+            "worker_id": fields.get("worker_id"),
+            "events": [json.loads(event) for event in events],
+            "result": json.loads(fields["result"]) if fields.get("result") else None,
+            "error": fields.get("error") or None,
+            "created_at": fields["created_at"],
+            "updated_at": float(fields["updated_at"])
+        }
+
+    async def stats(self) -> Dict:
+        # Finished jobs are only kept as expiring hashes, so they are not counted
+        queued, running = await asyncio.gather(
+            self._client.zcard(self._keys[0]), self._client.zcard(self._keys[1])
+        )
+        return {QUEUED: queued, RUNNING: running}
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def create_work_queue(backend: str, sqlite_path: str = "queue/jobs.db", redis_url: str = "redis://localhost:6379/0",
+                      retention_seconds: float = 86400) -> Optional[WorkQueue]:
+    """The queue for a ``WORK_QUEUE_BACKEND`` setting: "sqlite", "redis" or "none" (analyses run in-process)"""
+    if backend == "sqlite":
+        return SqliteWorkQueue(sqlite_path, retention_seconds)
+    if backend == "redis":
+        return RedisWorkQueue(redis_url, retention_seconds=retention_seconds)
+    return None
@@ -0,0 +1,240 @@
+"""
+Analysis worker for the distributed work queue.
+
+Claims jobs enqueued by the API, downloads their audio from storage, runs
+the detection pipeline and writes the result to both the audio_analysis
+table and the queue. Run any number of workers, on any machine, with the
+same STORAGE_BACKEND and WORK_QUEUE_BACKEND settings as the API:
+
+    cd backend && python -m app.worker
+"""
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+import traceback
+from typing import TYPE_CHECKING, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.cache import FeatureCache
+from app.metrics import Timings
+from app.results import analysis_response, analysis_row
+from app.storage import AnalysisStore, create_store
+from app.work_queue import WorkQueue, create_work_queue
+
+if TYPE_CHECKING:
+    from app.audio_processor import AudioProcessor, ProgressCallback
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Shared with the API: where audio and analysis rows live, and which queue to take jobs from
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", 20))
+WORK_QUEUE_BACKEND = os.getenv("WORK_QUEUE_BACKEND", "none")
+WORK_QUEUE_SQLITE_PATH = os.getenv("WORK_QUEUE_SQLITE_PATH", "queue/jobs.db")
+WORK_QUEUE_REDIS_URL = os.getenv("WORK_QUEUE_REDIS_URL", "redis://localhost:6379/0")
+WORK_QUEUE_RETENTION_SECONDS = float(os.getenv("WORK_QUEUE_RETENTION_SECONDS", 86400))
+COMPACT_STORAGE = os.getenv("COMPACT_STORAGE", "false").lower() == "true"
+
+# A job's lease lasts this long and is renewed every third of it; a worker that
+# stops renewing (crashed, partitioned) loses the job to another worker
+WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS", 120))
+# Failed attempts are retried after this delay, doubling each attempt
+WORK_QUEUE_RETRY_DELAY_SECONDS = float(os.getenv("WORK_QUEUE_RETRY_DELAY_SECONDS", 5))
+# How often an idle worker checks for jobs
+WORK_QUEUE_POLL_SECONDS = float(os.getenv("WORK_QUEUE_POLL_SECONDS", 0.5))
+
+# Processor settings, as in the API
+ANALYSIS_WARMUP = os.getenv("ANALYSIS_WARMUP", "true").lower() == "true"
+ANALYSIS_SAMPLE_RATE = os.getenv("ANALYSIS_SAMPLE_RATE", "22050")
+ANALYSIS_RESAMPLER = os.getenv("ANALYSIS_RESAMPLER", "soxr_hq")
+COARSE_SEARCH_MIN_SECONDS = float(os.getenv("COARSE_SEARCH_MIN_SECONDS", 600))
+COARSE_SEARCH_DECIMATION = int(os.getenv("COARSE_SEARCH_DECIMATION", 8))
+COARSE_SEARCH_THRESHOLD = float(os.getenv("COARSE_SEARCH_THRESHOLD", 0.2))
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+FEATURE_CACHE_ENABLED = os.getenv("FEATURE_CACHE_ENABLED", "true").lower() == "true"
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "cache")
+FEATURE_CACHE_MAX_MB = int(os.getenv("FEATURE_CACHE_MAX_MB", 2048))
+
+
+class AnalysisWorker:
+    """
+    Runs queued analyses one at a time.
+
+    The pipeline runs in a thread so the event loop keeps renewing the lease.
+    Stopping lets the current job finish; a worker killed mid-job simply
+    stops renewing, and the job is retried elsewhere once its lease expires.
+    Results are written under the job's analysis_id, replacing whatever an
+    earlier, abandoned attempt may have stored.
+    """
+
+    def __init__(self, queue: WorkQueue, store: AnalysisStore, processor: "AudioProcessor",
+                 visibility_timeout: float = 120, retry_delay: float = 5, poll_seconds: float = 0.5,
+                 compact: bool = False, worker_id: Optional[str] = None):
+        self.queue = queue
+        self.store = store
+        self.processor = processor
+        self.visibility_timeout = visibility_timeout
+        self.retry_delay = retry_delay
+        self.poll_seconds = poll_seconds
+        self.compact = compact
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        logger.info("🛑 Stopping after the current job")
+        self._stopping.set()
+
+    async def run(self):
+        while not self._stopping.is_set():
+            job = await self.queue.claim(self.worker_id, self.visibility_timeout)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.process(job)
+
+    async def _keep_lease(self, analysis_id: str, lease: str):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                if not await self.queue.heartbeat(analysis_id, lease, self.visibility_timeout):
+                    logger.warning(f"⚠️ Lost the lease on job {analysis_id}; its result will be discarded")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not renew the lease on job {analysis_id}: {e}")
+
+    def _progress_reporter(self, job: Dict) -> "ProgressCallback":
+        """Stage events for the queue, recorded from the pipeline thread before it moves on"""
+        loop = asyncio.get_running_loop()
+        enqueued_at = job["payload"]["enqueued_at"]
+
+        def progress(stage: str, payload: Dict):
+            event = {
+                "event": "stage",
+                "stage": stage,
+                "elapsed": round(time.time() - enqueued_at, 3),
+                "attempt": job["attempts"],
+                **payload
+            }
+            asyncio.run_coroutine_threadsafe(
+                self.queue.record_stage(job["analysis_id"], job["lease"], event), loop
+            ).result()
+        return progress
+
+    async def process(self, job: Dict):
+        analysis_id = job["analysis_id"]
+        lease = job["lease"]
+        payload = job["payload"]
+        logger.info(f"🎵 Claimed job {analysis_id} (attempt {job['attempts']} of {job['max_attempts']})")
+
+        keep_lease = asyncio.create_task(self._keep_lease(analysis_id, lease))
+        directory = tempfile.mkdtemp(prefix="analysis-")
+        try:
+            timings = Timings()
+            timings.update(payload.get("timings"))
+            timings.spans["queue_wait"] = max(0.0, time.time() - payload["enqueued_at"])
+
+            pattern_path = os.path.join(directory, os.path.basename(payload["pattern_storage_path"]))
+            target_path = os.path.join(directory, os.path.basename(payload["target_storage_path"]))
+            with timings.span("storage_download"):
+                await asyncio.gather(
+                    self.store.download(payload["pattern_storage_path"], pattern_path),
+                    self.store.download(payload["target_storage_path"], target_path)
+                )
+
+            results = await asyncio.to_thread(
+                self.processor.detect_pattern, pattern_path, target_path, self._progress_reporter(job),
+                payload["methods"], payload["adaptive"], **payload["combine_options"]
+            )
+            logger.info(f"✅ Job {analysis_id} processed. Found {results['detection_count']} detections")
+            timings.update(results.get("timings"))
+
+            with timings.span("db_insert"):
+                await self.store.insert_analysis(analysis_row(
+                    payload["user_id"], analysis_id, payload["pattern_filename"], payload["target_filename"],
+                    results, payload["pattern_url"], payload["target_url"], compact=self.compact
+                ))
+            await self.queue.record_stage(analysis_id, lease, {
+                "event": "stage",
+                "stage": "persist",
+                "elapsed": round(time.time() - payload["enqueued_at"], 3),
+                "attempt": job["attempts"],
+                "supabase_saved": True
+            })
+            response = analysis_response(
+                analysis_id, payload["pattern_filename"], payload["target_filename"], results,
+                payload["pattern_url"], payload["target_url"], saved=True,
+                timings=timings.to_dict() if payload.get("timings") is not None else None
+            )
+            if not await self.queue.complete(analysis_id, lease, response):
+                logger.warning(f"⚠️ Job {analysis_id} was taken over by another worker; result discarded")
+        except Exception as e:
+            logger.error(f"❌ Job {analysis_id} failed: {str(e)}")
+            logger.error(f"Full job error: {traceback.format_exc()}")
+            status = await self.queue.fail(analysis_id, lease, f"Analysis failed: {str(e)}", self.retry_delay)
+            if status == "queued":
+                logger.info(f"🔁 Job {analysis_id} will be retried")
+        finally:
+            keep_lease.cancel()
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+async def main():
+    if WORK_QUEUE_BACKEND not in ("sqlite", "redis"):
+        raise SystemExit("WORK_QUEUE_BACKEND must be 'sqlite' or 'redis' to run a worker")
+    store = create_store(STORAGE_BACKEND, LOCAL_STORAGE_DIR, STORAGE_MAX_CONNECTIONS)
+    if store is None:
+        raise SystemExit("Workers need a storage backend to fetch audio from and save results to")
+    queue = create_work_queue(
+        WORK_QUEUE_BACKEND, WORK_QUEUE_SQLITE_PATH, WORK_QUEUE_REDIS_URL, WORK_QUEUE_RETENTION_SECONDS
+    )
+
+    from app.audio_processor import AudioProcessor
+    feature_cache = FeatureCache(FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_MB * 1024 * 1024) if FEATURE_CACHE_ENABLED else None
+    processor = AudioProcessor(
+        cache=feature_cache,
+        coarse_min_seconds=COARSE_SEARCH_MIN_SECONDS,
+        coarse_decimation=COARSE_SEARCH_DECIMATION,
+        coarse_threshold=COARSE_SEARCH_THRESHOLD,
+        profile_slow_seconds=PROFILE_SLOW_SECONDS,
+        profile_dir=PROFILE_DIR,
+        sample_rate=None if ANALYSIS_SAMPLE_RATE == "native" else int(ANALYSIS_SAMPLE_RATE),
+        resampler=ANALYSIS_RESAMPLER
+    )
+    if ANALYSIS_WARMUP:
+        await asyncio.to_thread(processor.warm_up)
+
+    worker = AnalysisWorker(
+        queue, store, processor,
+        visibility_timeout=WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS,
+        retry_delay=WORK_QUEUE_RETRY_DELAY_SECONDS,
+        poll_seconds=WORK_QUEUE_POLL_SECONDS,
+        compact=COMPACT_STORAGE
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    logger.info(f"👷 Worker {worker.worker_id} taking jobs from the {queue.name} queue")
+    try:
+        await worker.run()
+    finally:
+        await queue.close()
+        await store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
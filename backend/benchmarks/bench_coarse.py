@@ -0,0 +1,68 @@
+"""
+Coarse-to-fine correlation search vs the exhaustive full-rate search.
+
+Plants copies of a 10 second pattern in noisy targets and reports, for each
+decimation factor and candidate threshold, the wall time, speedup and the
+fraction of planted copies detected within ``TOLERANCE_SECONDS``. Recall is
+also reported for the exhaustive path, which is the reference.
+
+    cd backend && python -m benchmarks.bench_coarse [--minutes 10 30] [--noise 0.3]
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from app.audio_processor import AudioProcessor
+from benchmarks.synthetic import make_pattern, make_target
+
+SR = 22050
+DECIMATIONS = [4, 8, 16, 32]
+THRESHOLDS = [0.1, 0.2, 0.4]
+TOLERANCE_SECONDS = 0.01
+
+
+def recall(detections, offsets) -> float:
+    times = [d["time"] for d in detections]
+    found = sum(any(abs(t - offset) <= TOLERANCE_SECONDS for t in times) for offset in offsets)
+    return found / len(offsets)
+
+
+def timed(fn, *args):
+    # The processor prints progress; keep the table readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 30])
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--copies", type=int, default=20)
+    args = parser.parse_args()
+
+    pattern = make_pattern(10.0, SR)
+    exhaustive = AudioProcessor()
+    print(f"{'target':>7} {'path':>12} {'threshold':>10} {'time s':>8} {'speedup':>8} {'recall':>7}")
+
+    for minutes in args.minutes:
+        target, offsets = make_target(pattern, minutes * 60, SR, n_copies=args.copies, noise=args.noise)
+
+        result, reference = timed(exhaustive.cross_correlation_detection, target, pattern, SR)
+        print(f"{minutes:>6g}m {'exhaustive':>12} {'-':>10} {reference:>8.2f} {'1.0x':>8} "
+              f"{recall(result['detections'], offsets):>7.2f}")
+
+        for decimation in DECIMATIONS:
+            for threshold in THRESHOLDS:
+                processor = AudioProcessor(coarse_decimation=decimation, coarse_threshold=threshold)
+                result, elapsed = timed(processor.coarse_to_fine_detection, target, pattern, SR)
+                print(f"{minutes:>6g}m {f'1/{decimation} rate':>12} {threshold:>10.1f} {elapsed:>8.2f} "
+                      f"{reference / elapsed:>7.1f}x {recall(result['detections'], offsets):>7.2f}")
+
+        del target
+
+
+if __name__ == "__main__":
+    main()
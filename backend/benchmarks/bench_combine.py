@@ -0,0 +1,97 @@
+"""
+Merging and top-K selection in combine_detection_methods vs the previous list-of-dicts path.
+
+Generates dense synthetic detections from three methods (as correlation
+produces on long, repetitive targets) and times the merge of both
+implementations, excluding the visualization envelope both share.
+
+    cd backend && python -m benchmarks.bench_combine [--counts 1000 10000 100000 1000000] [--top-k 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.audio_processor import METHOD_WEIGHTS
+from app.detections import detections_array, merge_detections, merged_to_dicts, select_top_k
+
+METHODS = ["correlation", "chroma", "spectral"]
+
+
+def make_results(count: int, seed: int = 0):
+    """``count`` detections spread over methods, about one per 0.4 s so groups chain and split"""
+    rng = np.random.default_rng(seed)
+    duration = count * 0.4
+    return {
+        method: {"detections": [
+            {"time": float(t), "confidence": float(c), "method": method}
+            for t, c in zip(rng.uniform(0, duration, count // len(METHODS)),
+                            rng.uniform(0.3, 1.0, count // len(METHODS)))
+        ]}
+        for method in METHODS
+    }
+
+
+def legacy_merge(results, top_k: int, window: float):
+    """The grouping loop combine_detection_methods used before structured arrays"""
+    all_detections = []
+    for method_results in results.values():
+        all_detections.extend(method_results["detections"])
+
+    merged_detections = []
+    all_detections.sort(key=lambda x: x["time"])
+    i = 0
+    while i < len(all_detections):
+        current = all_detections[i]
+        group = [current]
+        j = i + 1
+        while j < len(all_detections) and all_detections[j]["time"] - current["time"] <= window:
+            group.append(all_detections[j])
+            j += 1
+        methods = list(set([d["method"] for d in group]))
+        merged_detections.append({
+            "time": float(np.mean([d["time"] for d in group])),
+            "confidence": float(max([d["confidence"] for d in group])),
+            "methods": methods,
+            "method_count": len(methods)
+        })
+        i = j
+
+    merged_detections.sort(key=lambda x: x["confidence"], reverse=True)
+    return merged_detections[:top_k]
+
+
+def array_merge(results, top_k: int, window: float):
+    methods = list(results)
+    weights = np.array([METHOD_WEIGHTS[method] for method in methods])
+    merged = merge_detections(detections_array(results, methods), window, weights)
+    return merged_to_dicts(select_top_k(merged, top_k), methods)
+
+
+def best_time(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--window", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{'detections':>11} {'legacy ms':>10} {'arrays ms':>10} {'speedup':>8} {'ns/detection':>13}")
+    for count in args.counts:
+        results = make_results(count)
+        legacy = best_time(legacy_merge, results, args.top_k, args.window)
+        arrays = best_time(array_merge, results, args.top_k, args.window)
+        print(f"{count:>11} {legacy * 1e3:>10.1f} {arrays * 1e3:>10.1f} {legacy / arrays:>7.1f}x "
+              f"{arrays / count * 1e9:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
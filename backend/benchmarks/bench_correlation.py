@@ -0,0 +1,70 @@
+"""
+Legacy circular FFT correlation vs the NCC engine on 1, 10 and 60 minute targets.
+
+Reports wall time, peak traced memory and the score given to the weakest
+planted copy. The legacy path holds several full-length complex128 arrays,
+so it is skipped above ``--legacy-max-minutes`` to stay within RAM.
+
+    cd backend && python -m benchmarks.bench_correlation [--legacy-max-minutes 60]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.correlation import normalized_cross_correlation
+from benchmarks.synthetic import make_pattern, make_target
+
+SR = 22050
+TARGET_MINUTES = [1, 10, 60]
+
+
+def legacy_correlate(target: np.ndarray, pattern: np.ndarray) -> np.ndarray:
+    """The previous AudioProcessor.fft_correlate plus its global-max normalization"""
+    pattern_padded = np.zeros_like(target)
+    pattern_padded[:len(pattern)] = pattern
+    target_fft = np.fft.fft(target)
+    pattern_fft = np.fft.fft(pattern_padded)
+    correlation = np.real(np.fft.ifft(target_fft * np.conj(pattern_fft)))
+    return correlation / (np.max(np.abs(correlation)) + 1e-8)
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--legacy-max-minutes", type=float, default=10)
+    args = parser.parse_args()
+
+    pattern = make_pattern(5.0, SR)
+    print(f"{'target':>7} {'path':>7} {'time s':>8} {'peak MB':>9} {'min planted score':>18}")
+
+    for minutes in TARGET_MINUTES:
+        target, offsets = make_target(pattern, minutes * 60, SR, n_copies=5)
+        planted = [int(round(t * SR)) for t in offsets]
+
+        paths = [("ncc", normalized_cross_correlation)]
+        if minutes <= args.legacy_max_minutes:
+            paths.insert(0, ("legacy", legacy_correlate))
+
+        for name, fn in paths:
+            scores, elapsed, peak = measure(fn, target, pattern)
+            weakest = min(scores[p] for p in planted)
+            print(f"{minutes:>5}m {name:>8} {elapsed:>8.2f} {peak:>9.0f} {weakest:>18.3f}")
+            del scores
+
+        if minutes > args.legacy_max_minutes:
+            print(f"{minutes:>5}m {'legacy':>8} {'skipped':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Decodes per request and latency of AudioProcessor.detect_pattern.
+
+Compares the shared DecodedAudio path against the previous call pattern, where
+each of the three detectors re-ran librosa.load on both files. Inputs are
+44.1 kHz MP3s so decode and resample costs are realistic.
+
+    cd backend && python -m benchmarks.bench_decode
+"""
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import librosa
+
+from app import decoded_audio
+from app.audio_processor import AudioProcessor
+from app.decoded_audio import DecodedAudio
+from benchmarks.synthetic import make_pattern, make_target, write_audio
+
+SR = 44100
+TARGET_DURATIONS = [30, 120, 600]
+
+
+class DecodeCounter:
+    """Wraps librosa.load as seen by decoded_audio and counts calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self._load = librosa.load
+
+    def __enter__(self):
+        def counting_load(*args, **kwargs):
+            self.calls += 1
+            return self._load(*args, **kwargs)
+        decoded_audio.librosa.load = counting_load
+        return self
+
+    def __exit__(self, *exc):
+        decoded_audio.librosa.load = self._load
+
+
+def legacy_detect(processor: AudioProcessor, pattern_path: str, target_path: str):
+    """Replays the old decode pattern: one load per file per detector"""
+    pattern = DecodedAudio.from_file(pattern_path)
+    target = DecodedAudio.from_file(target_path)
+    corr = processor.cross_correlation_detection(target.samples, pattern.samples, target.sr)
+    chroma_pattern, chroma_target = DecodedAudio.from_file(pattern_path), DecodedAudio.from_file(target_path)
+    chroma = processor.chroma_feature_detection(chroma_pattern.chroma, chroma_target.chroma, target.sr)
+    spectral_pattern, spectral_target = DecodedAudio.from_file(pattern_path), DecodedAudio.from_file(target_path)
+    spectral = processor.spectral_contrast_detection(
+        spectral_pattern.spectral_contrast, spectral_target.spectral_contrast, target.sr
+    )
+    return processor.combine_detection_methods(
+        {"correlation": corr, "chroma": chroma, "spectral": spectral}, target.samples, pattern.samples, target.sr
+    )
+
+
+def main():
+    processor = AudioProcessor()
+    pattern = make_pattern(5.0, SR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pattern_path = write_audio(os.path.join(tmp, "pattern.mp3"), pattern, SR)
+
+        # Pay numba JIT and resampler setup before timing anything
+        warmup_target, _ = make_target(pattern, 10, SR)
+        warmup_path = write_audio(os.path.join(tmp, "warmup.mp3"), warmup_target, SR)
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.detect_pattern(pattern_path, warmup_path)
+
+        print(f"{'target':>8} {'legacy decodes':>15} {'legacy s':>9} {'shared decodes':>15} {'shared s':>9} {'speedup':>8}")
+
+        for duration in TARGET_DURATIONS:
+            target, _ = make_target(pattern, duration, SR)
+            target_path = write_audio(os.path.join(tmp, f"target_{duration}.mp3"), target, SR)
+
+            with DecodeCounter() as legacy_count, contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                legacy_detect(processor, pattern_path, target_path)
+                legacy_time = time.perf_counter() - start
+
+            with DecodeCounter() as shared_count, contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                processor.detect_pattern(pattern_path, target_path)
+                shared_time = time.perf_counter() - start
+
+            print(f"{duration:>7}s {legacy_count.calls:>15} {legacy_time:>9.2f} "
+                  f"{shared_count.calls:>15} {shared_time:>9.2f} {legacy_time / shared_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Feature-domain matching time against target length.
+
+Compares the previous per-band ``np.correlate(mode='same')`` loop with the
+batched FFT matcher on chroma-shaped (12 bands) and spectral-contrast-shaped
+(7 bands) matrices at the default 512-sample hop, for a 10 second pattern.
+
+    cd backend && python -m benchmarks.bench_features
+"""
+import time
+
+import numpy as np
+
+from app.correlation import feature_similarity
+
+SR = 22050
+HOP = 512
+PATTERN_SECONDS = 10
+TARGET_MINUTES = [1, 10, 60, 180]
+
+
+def legacy_similarity(target_features: np.ndarray, pattern_features: np.ndarray) -> np.ndarray:
+    """The previous chroma/spectral matcher: direct correlation band by band"""
+    similarity = np.array([
+        np.correlate(target_features[i], pattern_features[i], mode='same')
+        for i in range(pattern_features.shape[0])
+    ])
+    similarity = np.mean(similarity, axis=0)
+    return similarity / (np.max(np.abs(similarity)) + 1e-8)
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    rng = np.random.default_rng(0)
+    pattern_frames = PATTERN_SECONDS * SR // HOP
+    print(f"{'target':>7} {'bands':>6} {'frames':>8} {'legacy s':>9} {'batched s':>10} {'speedup':>8}")
+
+    for minutes in TARGET_MINUTES:
+        frames = minutes * 60 * SR // HOP
+        for bands in (12, 7):
+            target = rng.random((bands, frames), dtype=np.float32)
+            pattern = target[:, frames // 2:frames // 2 + pattern_frames].copy()
+
+            legacy = timed(legacy_similarity, target, pattern)
+            batched = timed(feature_similarity, target, pattern, center_bands=bands == 7)
+            print(f"{minutes:>6}m {bands:>6} {frames:>8} {legacy:>9.3f} {batched:>10.3f} {legacy / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Fingerprint recall and query latency as the archive grows.
+
+Every landmark comes from ``extract_landmarks`` run on synthetic audio. Each
+query pattern is planted once, with background noise, in its own recording;
+the rest of the archive is filler recordings of other jingles in noise.
+Extracting a filler recording is the slow part, so a pool of
+``--distinct`` filler recordings is extracted once and re-ingested under
+new ids to reach the larger sizes. At each size every pattern is extracted
+on its own and queried; a query counts towards recall when its top match is
+the recording it was planted in, at the planted offset (within one frame).
+
+    cd backend && python -m benchmarks.bench_fingerprint [--sizes 100 1000 10000] [--noise 0.1 0.3]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app.decoded_audio import DecodedAudio
+from app.fingerprint import FingerprintIndex, extract_landmarks
+from benchmarks.synthetic import make_pattern, make_target
+
+SR = 22050
+HOP_LENGTH = 512
+RECORDING_SECONDS = 30
+QUERIES = 10
+
+
+def landmarks(samples):
+    audio = DecodedAudio(samples, SR)
+    return extract_landmarks(audio.stft)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--noise", type=float, nargs="+", default=[0.1, 0.3])
+    parser.add_argument("--pattern-seconds", type=float, default=3.0)
+    parser.add_argument("--distinct", type=int, default=100)
+    args = parser.parse_args()
+
+    fillers = []
+    start = time.perf_counter()
+    for k in range(args.distinct):
+        jingle = make_pattern(2.0, SR, seed=1000 + k)
+        samples, _ = make_target(jingle, RECORDING_SECONDS, SR, n_copies=4, noise=0.1, seed=2000 + k)
+        fillers.append(landmarks(samples))
+    print(f"Extracted {args.distinct} filler recordings in {time.perf_counter() - start:.1f}s, "
+          f"{statistics.mean(len(h) for h, _ in fillers):.0f} landmarks each")
+
+    print(f"{'noise':>6} {'recordings':>10} {'postings':>10} {'extract ms':>11} "
+          f"{'query ms p50':>13} {'query ms max':>13} {'recall':>7}")
+    for noise in args.noise:
+        patterns = [make_pattern(args.pattern_seconds, SR, seed=q) for q in range(QUERIES)]
+        with tempfile.TemporaryDirectory() as tmp:
+            index = FingerprintIndex(os.path.join(tmp, "index.db"))
+            postings = 0
+
+            planted = []
+            for q, pattern in enumerate(patterns):
+                samples, offsets = make_target(pattern, RECORDING_SECONDS, SR, n_copies=1, noise=noise, seed=100 + q)
+                hashes, frames = landmarks(samples)
+                recording_id = index.add(f"planted-{q}", hashes, frames, RECORDING_SECONDS, SR, HOP_LENGTH)
+                planted.append((recording_id, round(offsets[0] * SR / HOP_LENGTH)))
+                postings += len(hashes)
+
+            ingested = len(patterns)
+            for size in args.sizes:
+                while ingested < size:
+                    hashes, frames = fillers[ingested % len(fillers)]
+                    index.add(f"filler-{ingested}", hashes, frames, RECORDING_SECONDS, SR, HOP_LENGTH)
+                    postings += len(hashes)
+                    ingested += 1
+
+                extract_times, latencies, found = [], [], 0
+                for pattern, (recording_id, offset) in zip(patterns, planted):
+                    start = time.perf_counter()
+                    hashes, frames = landmarks(pattern)
+                    extract_times.append((time.perf_counter() - start) * 1000)
+                    start = time.perf_counter()
+                    matches = index.query(hashes, frames, top_k=1)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    if (matches and matches[0]["recording_id"] == recording_id
+                            and abs(matches[0]["offset_frames"] - offset) <= 1):
+                        found += 1
+
+                print(f"{noise:>6.2f} {ingested:>10} {postings:>10} {statistics.median(extract_times):>11.1f} "
+                      f"{statistics.median(latencies):>13.1f} {max(latencies):>13.1f} {found / QUERIES:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
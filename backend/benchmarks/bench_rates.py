@@ -0,0 +1,99 @@
+"""
+Accuracy and time of each analysis rate and resampler.
+
+Writes the regression cases as MP3s at ``--source-sr`` and runs the full
+``AudioProcessor.detect_pattern`` at every analysis rate (the file's native
+rate, 22050, 16000 and 8000 Hz) with both resamplers. For each mode it reports
+decode time, total time, speedup over the 22050 Hz soxr default and, per
+method and for the combined result, recall and false positives against the
+planted offsets, scored with the regression suite's tolerances.
+
+    cd backend && python -m benchmarks.bench_rates [--cases 1m 10m] [--source-sr 44100 48000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import warnings
+from typing import Dict, Optional
+
+from app.audio_processor import AudioProcessor
+from benchmarks.regression import CASES, TOLERANCE_SECONDS, score
+from benchmarks.synthetic import make_pattern, make_target, write_audio
+
+# (label, analysis rate, resampler); the first is the reference for speedups
+MODES = [
+    ("22050/soxr", 22050, "soxr_hq"),
+    ("22050/poly", 22050, "poly"),
+    ("native", None, "soxr_hq"),
+    ("16000/soxr", 16000, "soxr_hq"),
+    ("16000/poly", 16000, "poly"),
+    ("8000/soxr", 8000, "soxr_hq"),
+    ("8000/poly", 8000, "poly"),
+]
+
+
+def run_mode(sample_rate: Optional[int], resampler: str, pattern_path: str, target_path: str) -> Dict:
+    processor = AudioProcessor(sample_rate=sample_rate, resampler=resampler)
+    detections = {}
+
+    def progress(stage: str, payload: Dict):
+        if stage in processor.stages:
+            detections[stage] = payload["detections"]
+
+    # The processor prints progress and librosa warns about short CQT inputs; keep the table readable
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = processor.detect_pattern(pattern_path, target_path, progress)
+    detections["combined"] = result["detections"]
+    spans = result["timings"]["spans"]
+    return {"sr": result["sample_rate"], "decode": spans["decode"], "total": sum(spans.values()),
+            "detections": detections}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=["1m", "10m"])
+    parser.add_argument("--source-sr", type=int, nargs="+", default=[44100])
+    args = parser.parse_args()
+
+    # Pays librosa's one-time setup before anything is timed
+    with contextlib.redirect_stdout(io.StringIO()):
+        AudioProcessor().warm_up()
+
+    methods = ["correlation", "chroma", "spectral", "combined"]
+    print(f"{'case':>5} {'source':>7} {'mode':>11} {'sr':>6} {'decode s':>9} {'total s':>8} {'speedup':>8}  "
+          + " ".join(f"{method:>12}" for method in methods))
+    print(f"{'':>68}" + " ".join(f"{'recall/fp':>12}" for _ in methods))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for source_sr in args.source_sr:
+            for name in args.cases:
+                spec = CASES[name]
+                pattern_samples = make_pattern(spec["pattern_seconds"], source_sr)
+                target_samples, offsets = make_target(
+                    pattern_samples, spec["target_seconds"], source_sr,
+                    n_copies=spec["copies"], noise=spec["noise"], drift=spec["drift"]
+                )
+                pattern_path = write_audio(os.path.join(tmp, f"{name}_{source_sr}_pattern.mp3"),
+                                           pattern_samples, source_sr)
+                target_path = write_audio(os.path.join(tmp, f"{name}_{source_sr}_target.mp3"),
+                                          target_samples, source_sr)
+                del pattern_samples, target_samples
+
+                reference = None
+                for label, sample_rate, resampler in MODES:
+                    measured = run_mode(sample_rate, resampler, pattern_path, target_path)
+                    reference = reference or measured["total"]
+                    accuracy = []
+                    for method in methods:
+                        scored = score(measured["detections"].get(method, []), offsets, TOLERANCE_SECONDS[method])
+                        accuracy.append(f"{scored['recall']:.2f}/{scored['false_positives']}")
+                    print(f"{name:>5} {source_sr:>7} {label:>11} {measured['sr']:>6} {measured['decode']:>9.3f} "
+                          f"{measured['total']:>8.2f} {reference / measured['total']:>7.1f}x  "
+                          + " ".join(f"{value:>12}" for value in accuracy))
+
+
+if __name__ == "__main__":
+    main()
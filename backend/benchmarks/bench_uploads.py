@@ -0,0 +1,80 @@
+"""
+Peak RSS of saving concurrent uploads: whole-file reads vs chunked streaming.
+
+Each mode runs in a fresh subprocess. Uploads are Starlette ``UploadFile``
+objects over spooled temp files, as FastAPI hands them to the endpoints, and
+all of them are saved concurrently into a scratch directory.
+
+    cd backend && python -m benchmarks.bench_uploads [--uploads 50] [--size-mb 20]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ["legacy", "streaming"]
+
+
+async def legacy_save_upload(upload, path: str):
+    """The previous save_upload: the whole upload read into memory, then written"""
+    with open(path, "wb") as buffer:
+        content = await upload.read()
+        buffer.write(content)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(mode: str, uploads: int, size_mb: int):
+    from starlette.datastructures import UploadFile
+    from app.main import save_upload
+
+    save = legacy_save_upload if mode == "legacy" else save_upload
+    block = os.urandom(1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        files = []
+        for i in range(uploads):
+            spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+            for _ in range(size_mb):
+                spool.write(block)
+            spool.seek(0)
+            files.append(UploadFile(file=spool, filename=f"upload{i}.wav", size=size_mb * 1024 * 1024))
+
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            save(upload, os.path.join(scratch, upload.filename)) for upload in files
+        ])
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>10} {elapsed:>8.2f} {peak_rss_mb():>12.0f} {peak_rss_mb() - baseline:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        asyncio.run(run(args.mode, args.uploads, args.size_mb))
+        return
+
+    print(f"{args.uploads} concurrent uploads of {args.size_mb} MB")
+    print(f"{'mode':>10} {'time s':>8} {'peak RSS MB':>12} {'growth MB':>14}")
+    for mode in MODES:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_uploads", "--mode", mode,
+             "--uploads", str(args.uploads), "--size-mb", str(args.size_mb)],
+            check=True, stderr=subprocess.DEVNULL
+        )
+
+
+if __name__ == "__main__":
+    main()
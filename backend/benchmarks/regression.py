@@ -0,0 +1,213 @@
+"""
+Per-stage timing, memory and accuracy of the detection pipeline, checked against baselines.
+
+Each case writes a synthetic 44.1 kHz MP3 target with planted pattern copies,
+background noise, per-copy gains and slow gain drift, then runs the stages
+of ``AudioProcessor`` one at a time: decode, correlation, chroma, spectral,
+combine. Every stage is timed (best of ``--repeat``) and its peak traced
+memory recorded; detections of each method and of the combined result are
+scored against the planted offsets.
+
+Results are compared with ``benchmarks/baselines.json``. A stage slower than
+its baseline by more than ``--time-tolerance`` (and 50 ms), memory above it
+by more than ``--memory-tolerance``, lower recall or extra false positives
+fail the run with exit status 1. Baselines are machine-specific timings;
+record them with ``--update`` on the machine that runs the suite.
+
+    cd backend && python -m benchmarks.regression [--cases 10s 1m 10m 1h] [--update]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from typing import Callable, Dict, List, Tuple
+
+from app.audio_processor import AudioProcessor
+from app.decoded_audio import DecodedAudio
+from benchmarks.synthetic import make_pattern, make_target, write_audio
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# Files are written at a typical upload rate so decode includes resampling
+SOURCE_SR = 44100
+
+CASES = {
+    "10s": {"target_seconds": 10, "pattern_seconds": 1.0, "copies": 2, "noise": 0.05, "drift": 0.0},
+    "1m": {"target_seconds": 60, "pattern_seconds": 3.0, "copies": 3, "noise": 0.1, "drift": 0.3},
+    "10m": {"target_seconds": 600, "pattern_seconds": 5.0, "copies": 5, "noise": 0.2, "drift": 0.5},
+    "1h": {"target_seconds": 3600, "pattern_seconds": 10.0, "copies": 8, "noise": 0.2, "drift": 0.5},
+}
+DEFAULT_CASES = ["10s", "1m", "10m"]
+
+# How far a detection may be from a planted copy, in seconds. Combined times
+# average every method in a 0.5 s group, so they get the loosest bound
+TOLERANCE_SECONDS = {"correlation": 0.02, "chroma": 0.1, "spectral": 0.1, "combined": 0.25}
+
+# Stage time changes below this are noise, whatever the relative change
+MIN_TIME_REGRESSION_SECONDS = 0.05
+
+
+def score(detections: List[Dict], offsets: List[float], tolerance: float) -> Dict:
+    """Recall of the planted offsets and the count of detections matching none of them"""
+    times = [d["time"] for d in detections]
+    found = sum(any(abs(t - offset) <= tolerance for t in times) for offset in offsets)
+    false_positives = sum(all(abs(t - offset) > tolerance for offset in offsets) for t in times)
+    return {"recall": round(found / len(offsets), 3), "false_positives": false_positives}
+
+
+def measure(fn: Callable, repeat: int) -> Tuple[object, float, float]:
+    """(result, best wall time, peak traced MB above the starting level) of ``fn``"""
+    best = float("inf")
+    for attempt in range(repeat):
+        tracemalloc.reset_peak()
+        floor = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+        if attempt == 0:
+            peak = (tracemalloc.get_traced_memory()[1] - floor) / 1e6
+    return result, best, peak
+
+
+def run_case(processor: AudioProcessor, name: str, spec: Dict, tmp: str, repeat: int) -> Dict:
+    pattern_samples = make_pattern(spec["pattern_seconds"], SOURCE_SR)
+    target_samples, offsets = make_target(
+        pattern_samples, spec["target_seconds"], SOURCE_SR,
+        n_copies=spec["copies"], noise=spec["noise"], drift=spec["drift"]
+    )
+    pattern_path = write_audio(os.path.join(tmp, f"{name}_pattern.mp3"), pattern_samples, SOURCE_SR)
+    target_path = write_audio(os.path.join(tmp, f"{name}_target.mp3"), target_samples, SOURCE_SR)
+    del pattern_samples, target_samples
+
+    stages = {}
+    (pattern, target), stages["decode"], decode_peak = measure(
+        lambda: (DecodedAudio.from_file(pattern_path), DecodedAudio.from_file(target_path)), repeat
+    )
+    peaks = {"decode": decode_peak}
+
+    results = {}
+    for method, stage in processor.stages.items():
+        # Fresh instances so features cached by the first attempt don't flatter later ones
+        def run_stage():
+            return stage(DecodedAudio(pattern.samples, pattern.sr), DecodedAudio(target.samples, target.sr))
+        results[method], stages[method], peaks[method] = measure(run_stage, repeat)
+
+    combined, stages["combine"], peaks["combine"] = measure(
+        lambda: processor.combine_detection_methods(results, target.samples, pattern.samples, target.sr), repeat
+    )
+
+    accuracy = {
+        method: score(result["detections"], offsets, TOLERANCE_SECONDS[method])
+        for method, result in results.items()
+    }
+    accuracy["combined"] = score(combined["detections"], offsets, TOLERANCE_SECONDS["combined"])
+
+    return {
+        "stages": {
+            stage: {"seconds": round(stages[stage], 4), "peak_mb": round(peaks[stage], 1)} for stage in stages
+        },
+        "accuracy": accuracy
+    }
+
+
+def compare(name: str, measured: Dict, baseline: Dict, time_tolerance: float, memory_tolerance: float) -> List[str]:
+    """Regressions of one case against its baseline, as readable messages"""
+    failures = []
+    for stage, values in measured["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        slower = values["seconds"] - base["seconds"]
+        if values["seconds"] > base["seconds"] * (1 + time_tolerance) and slower > MIN_TIME_REGRESSION_SECONDS:
+            failures.append(f"{name}/{stage}: {values['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        if values["peak_mb"] > base["peak_mb"] * (1 + memory_tolerance) + 1:
+            failures.append(f"{name}/{stage}: {values['peak_mb']:.0f} MB vs baseline {base['peak_mb']:.0f} MB")
+
+    for method, values in measured["accuracy"].items():
+        base = baseline.get("accuracy", {}).get(method)
+        if not base:
+            continue
+        if values["recall"] < base["recall"]:
+            failures.append(f"{name}/{method}: recall {values['recall']} vs baseline {base['recall']}")
+        if values["false_positives"] > base["false_positives"]:
+            failures.append(
+                f"{name}/{method}: {values['false_positives']} false positives vs baseline {base['false_positives']}"
+            )
+    return failures
+
+
+def print_case(name: str, measured: Dict, baseline: Dict):
+    for stage, values in measured["stages"].items():
+        base = baseline.get("stages", {}).get(stage, {})
+        base_time = f"{base['seconds']:.3f}" if base else "-"
+        base_peak = f"{base['peak_mb']:.0f}" if base else "-"
+        print(f"{name:>5} {stage:>12} {values['seconds']:>9.3f} {base_time:>9} {values['peak_mb']:>8.0f} {base_peak:>8}")
+    for method, values in measured["accuracy"].items():
+        base = baseline.get("accuracy", {}).get(method, {})
+        print(f"{name:>5} {method:>12}   recall {values['recall']:.2f} (baseline {base.get('recall', '-')})"
+              f"   false positives {values['false_positives']} (baseline {base.get('false_positives', '-')})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=DEFAULT_CASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    parser.add_argument("--update", action="store_true", help="record these results as the new baselines")
+    args = parser.parse_args()
+
+    baselines = {"cases": {}}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+    processor = AudioProcessor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor.warm_up()
+
+    print(f"{'case':>5} {'stage':>12} {'time s':>9} {'base s':>9} {'peak MB':>8} {'base MB':>8}")
+    measured, failures = {}, []
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.cases:
+            # The processor prints progress and librosa warns about short CQT inputs;
+            # keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                measured[name] = run_case(processor, name, CASES[name], tmp, args.repeat)
+            baseline = baselines["cases"].get(name, {})
+            print_case(name, measured[name], baseline)
+            if baseline:
+                failures.extend(compare(name, measured[name], baseline, args.time_tolerance, args.memory_tolerance))
+            else:
+                print(f"{name:>5} no baseline recorded")
+    tracemalloc.stop()
+
+    if args.update:
+        baselines["cases"].update(measured)
+        baselines["machine"] = {"platform": platform.platform(), "processor": platform.processor(),
+                                "cpus": os.cpu_count(), "python": platform.python_version()}
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2)
+            f.write("\n")
+        print(f"Baselines updated for {', '.join(measured)}")
+        return
+
+    if failures:
+        print("\nRegressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Synthetic pattern/target generators shared by the benchmarks"""
+import os
+import numpy as np
+import soundfile as sf
+from typing import List, Tuple
+
+
+def make_pattern(duration: float, sr: int, seed: int = 0) -> np.ndarray:
+    """A jingle-like pattern: a few harmonic tones with an amplitude envelope plus noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    signal = np.zeros_like(t)
+    for freq in rng.uniform(220, 880, size=4):
+        signal += np.sin(2 * np.pi * freq * t) * (0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(1, 4) * t))
+    signal += 0.2 * rng.standard_normal(len(t))
+    return (signal / np.max(np.abs(signal))).astype(np.float32)
+
+
+def make_target(pattern: np.ndarray, duration: float, sr: int, n_copies: int = 3,
+                noise: float = 0.1, seed: int = 1, drift: float = 0.0) -> Tuple[np.ndarray, List[float]]:
+    """
+    Plant ``n_copies`` of the pattern with random gains into background noise.
+
+    ``drift`` in [0, 1) adds a slow overall gain change: the mix is scaled by
+    an envelope swinging between ``1 - drift`` and ``1 + drift`` about once
+    a minute.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    target = (noise * rng.standard_normal(n)).astype(np.float32)
+    slots = np.linspace(0, n - len(pattern), n_copies + 2)[1:-1].astype(int)
+    for start in slots:
+        target[start:start + len(pattern)] += rng.uniform(0.3, 1.0) * pattern
+    if drift:
+        t = np.arange(n, dtype=np.float32) / sr
+        target *= 1 + drift * np.sin(2 * np.pi * t / 60 + rng.uniform(0, 2 * np.pi)).astype(np.float32)
+    return target, sorted(float(s / sr) for s in slots)
+
+
+def write_audio(path: str, samples: np.ndarray, sr: int) -> str:
+    """Write a WAV (float) or MP3 file depending on the extension"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".mp3"):
+        sf.write(path, samples, sr, format="MP3", subtype="MPEG_LAYER_III")
+    else:
+        sf.write(path, samples, sr, subtype="FLOAT")
+    return path
@@ -0,0 +1,22 @@
+-- The backend writes analysis rows as upserts on analysis_id (on_conflict=analysis_id),
+-- so a retried queue job replaces its earlier row. PostgREST only accepts that when
+-- analysis_id carries a unique constraint.
+
+-- Keep one row per analysis_id before adding the constraint
+delete from public.audio_analysis a
+using public.audio_analysis b
+where a.analysis_id = b.analysis_id
+  and a.ctid < b.ctid;
+
+do $$
+begin
+    if not exists (
+        select 1 from pg_constraint
+        where conrelid = 'public.audio_analysis'::regclass
+          and conname = 'audio_analysis_analysis_id_key'
+    ) then
+        alter table public.audio_analysis
+            add constraint audio_analysis_analysis_id_key unique (analysis_id);
+    end if;
+end
+$$;